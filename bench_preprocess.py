@@ -0,0 +1,66 @@
+import sys
+import time
+import tracemalloc
+import numpy as np
+from PIL import Image, ImageEnhance
+from preprocess import DEFAULT_PROFILES, Preprocessor
+
+# Micro-benchmark: legacy per-step PIL preprocessing vs the fused NumPy engine.
+# Usage: python bench_preprocess.py [iterations]
+
+# (name, width, height, profile) - sizes taken from typical dashboard regions
+REGIONS = [
+    ("Title", 34, 24, "default"),
+    ("AWS", 35, 25, "default"),
+    ("TAP", 42, 26, "default"),
+    ("F", 12, 18, "digit"),
+    ("M", 12, 18, "digit"),
+]
+
+def legacy_pipeline(crop, profile):
+    w, h = crop.size
+    gray = crop.convert('L')
+    resized = gray.resize((w * profile['scale'], h * profile['scale']), Image.Resampling.LANCZOS)
+    final = ImageEnhance.Contrast(resized).enhance(profile['contrast'])
+    return np.array(final)
+
+def measure(label, fn, crops, iterations):
+    for crop, profile, name in crops:  # warm-up (weight matrices, buffers)
+        fn(crop, profile, name)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for crop, profile, name in crops:
+            fn(crop, profile, name)
+    elapsed = time.perf_counter() - start
+    per_region_us = elapsed / (iterations * len(crops)) * 1e6
+
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    for crop, profile, name in crops:
+        fn(crop, profile, name)
+    snapshot_after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = snapshot_after.compare_to(snapshot_before, 'filename')
+    blocks = sum(max(s.count_diff, 0) for s in stats) / len(crops)
+    size_kb = sum(max(s.size_diff, 0) for s in stats) / len(crops) / 1024
+
+    print(f"{label:<18} {per_region_us:10.1f} us/region   {blocks:8.1f} blocks/region   {size_kb:8.1f} KiB/region")
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = np.random.default_rng(0)
+    crops = []
+    for name, w, h, profile_name in REGIONS:
+        pixels = (rng.random((h, w, 3)) * 255).astype(np.uint8)
+        crops.append((Image.fromarray(pixels), DEFAULT_PROFILES[profile_name], name))
+
+    engine = Preprocessor()
+    print(f"=== Preprocessing benchmark ({iterations} iterations x {len(crops)} regions) ===")
+    measure("PIL (legacy)", lambda c, p, n: legacy_pipeline(c, p), crops, iterations)
+    measure("NumPy engine", lambda c, p, n: engine.run(c, p, slot=n), crops, iterations)
+    print(f"NumPy engine buffers/weight matrices allocated in total: {engine.allocations}")
+    print("Note: tracemalloc sees NumPy buffers but not PIL's internal image memory.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import os
+import time
+import threading
+from PIL import Image, ImageChops, ImageStat
+from screenshot_store import read_manifest
+
+# --- Screen Capture Backends ---
+# job() grabs frames through one of these instead of calling pyautogui.screenshot()
+# directly, so OCR only touches the pixels it needs and the pipeline can be fed from
+# saved screenshots on machines without Windows.
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp')
+
+
+def recorded_origins(paths):
+    """
+    {path: (x, y)} screen origin of saved captures, from their partitions' manifests
+    (see ScreenshotStore.record). Files without a recorded origin are left out.
+    """
+    origins, manifests = {}, {}
+    for path in paths:
+        directory, file_name = os.path.split(os.path.abspath(path))
+        if directory not in manifests:
+            manifests[directory] = read_manifest(directory)
+        origin = manifests[directory].get(file_name, {}).get('origin')
+        if origin is not None:
+            origins[path] = tuple(origin)
+    return origins
+
+
+def list_images(directory):
+    """Image paths in directory and its date partitions (see screenshot_store.py), in name order."""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        paths.extend(os.path.join(dirpath, f) for f in filenames if f.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths, key=lambda p: (os.path.dirname(p), os.path.basename(p)))
+
+
+class Frame:
+    """A captured image plus the screen coordinates of its top-left pixel."""
+
+    def __init__(self, image, origin=(0, 0), source=None):
+        self.image = image
+        self.origin = origin
+        self.source = source
+
+    def crop_box(self, box):
+        """Crops a (left, top, right, bottom) box given in screen coordinates."""
+        ox, oy = self.origin
+        left, top, right, bottom = box
+        return self.image.crop((left - ox, top - oy, right - ox, bottom - oy))
+
+    def crop_region(self, region):
+        x, y = region['x'], region['y']
+        return self.crop_box((x, y, x + region['width'], y + region['height']))
+
+
+def regions_bbox(regions, padding=0):
+    """Union bounding box (left, top, right, bottom) of the configured regions."""
+    left = min(r['x'] for r in regions) - padding
+    top = min(r['y'] for r in regions) - padding
+    right = max(r['x'] + r['width'] for r in regions) + padding
+    bottom = max(r['y'] + r['height'] for r in regions) + padding
+    return (left, top, right, bottom)
+
+
+def grab_screen_area(bbox=None):
+    """
+    Grabs a screen area in virtual-desktop coordinates (None = primary screen).
+    Uses mss when installed, which only copies the requested pixels; otherwise
+    falls back to PIL's ImageGrab.
+    """
+    if bbox is not None:
+        try:
+            import mss
+            left, top, right, bottom = bbox
+            with mss.mss() as sct:
+                shot = sct.grab({"left": left, "top": top, "width": right - left, "height": bottom - top})
+                return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+        except ImportError:
+            pass
+    from PIL import ImageGrab
+    if bbox is None:
+        return ImageGrab.grab()
+    return ImageGrab.grab(bbox=bbox, all_screens=True)
+
+
+class CaptureBackend:
+    name = "base"
+    needs_window = True  # Whether job() must activate the target window first
+
+    def grab(self, regions, hwnd=None):
+        """Returns a Frame covering at least the given regions."""
+        raise NotImplementedError
+
+    def grab_preview(self, regions, hwnd=None):
+        """Image of just the regions' bounding box, for readiness checks (see wait_until_ready)."""
+        return self.grab(regions, hwnd).crop_box(regions_bbox(regions))
+
+
+class WindowCapture(CaptureBackend):
+    """Captures the whole target window (primary screen if no window handle is known)."""
+    name = "window"
+
+    def grab_preview(self, regions, hwnd=None):
+        return grab_screen_area(regions_bbox(regions))
+
+    def grab(self, regions, hwnd=None):
+        if hwnd:
+            import win32gui
+            bbox = win32gui.GetWindowRect(hwnd)
+            return Frame(grab_screen_area(bbox), origin=bbox[:2], source="window")
+        return Frame(grab_screen_area(), origin=(0, 0), source="screen")
+
+
+class RegionCapture(CaptureBackend):
+    """Captures only the bounding box around all configured regions."""
+    name = "regions"
+
+    def __init__(self, padding=0):
+        self.padding = padding
+
+    def grab(self, regions, hwnd=None):
+        bbox = regions_bbox(regions, self.padding)
+        return Frame(grab_screen_area(bbox), origin=bbox[:2], source="regions")
+
+    def grab_preview(self, regions, hwnd=None):
+        return grab_screen_area(regions_bbox(regions))
+
+
+class ReplayCapture(CaptureBackend):
+    """
+    Replays saved screenshots (a single file or a directory, in name order) as if they
+    had just been captured. Works on any OS. Each frame gets the screen origin recorded
+    in the store's manifest when it was captured, else origin (default (0, 0)).
+    """
+    name = "replay"
+    needs_window = False
+
+    def __init__(self, path, loop=True, origin=None):
+        self.path = path
+        self.loop = loop
+        self.origin = tuple(origin) if origin else (0, 0)
+        self._index = 0
+        self._lock = threading.Lock()
+        if os.path.isdir(path):
+            files = list_images(path)
+            # In the bot's screenshot folder, only replay the full captures (not debug crops)
+            full_captures = [f for f in files if os.path.basename(f).startswith('full_')]
+            self.files = full_captures or files
+        else:
+            self.files = [path]
+        if not self.files:
+            raise FileNotFoundError(f"No images to replay in: {path}")
+        self.origins = recorded_origins(self.files)
+
+    def grab(self, regions, hwnd=None):
+        with self._lock:
+            if self._index >= len(self.files):
+                if not self.loop:
+                    raise StopIteration("Replay source exhausted")
+                self._index = 0
+            file_path = self.files[self._index]
+            self._index += 1
+        return self._load(file_path)
+
+    def _load(self, file_path):
+        with Image.open(file_path) as img:
+            image = img.convert('RGB')
+        return Frame(image, origin=self.origins.get(file_path, self.origin), source=file_path)
+
+    def grab_preview(self, regions, hwnd=None):
+        # Saved screenshots never change; peek at the next one without consuming it
+        file_path = self.files[self._index % len(self.files)]
+        return self._load(file_path).crop_box(regions_bbox(regions))
+
+
+# --- Readiness Detection ---
+# Instead of fixed sleeps after activating the window, cheap low-resolution previews of
+# the regions' bounding box are compared until consecutive ones stop changing, i.e. the
+# dashboard has finished rendering. Works with every backend through grab_preview().
+DEFAULT_READINESS = {
+    "mode": "fixed",          # "fixed": sleep capture_delay_seconds; "adaptive": wait for stable frames
+    "interval_seconds": 0.1,  # Pause between previews
+    "stable_frames": 2,       # Consecutive previews that must match the one before
+    "threshold": 2.0,         # Max mean pixel difference (0-255) that still counts as unchanged
+    "min_contrast": 2.0,      # Min pixel std deviation; a blank (still loading) area is not ready
+    "timeout_seconds": 5.0,   # Capture anyway after this long
+    "preview_width": 96,      # Previews are downscaled to this width before comparing
+}
+
+
+def readiness_settings(job_config):
+    s = dict(DEFAULT_READINESS)
+    s.update(job_config.get('readiness') or {})
+    return s
+
+
+def preview_signature(image, width):
+    """Small grayscale copy of a preview image, used for frame-to-frame comparison."""
+    gray = image.convert('L')
+    if gray.width > width:
+        gray = gray.resize((width, max(1, round(gray.height * width / gray.width))), Image.BILINEAR)
+    return gray
+
+
+def frame_difference(a, b):
+    """Mean absolute pixel difference (0-255) of two signatures."""
+    if a.size != b.size:
+        return 255.0
+    return ImageStat.Stat(ImageChops.difference(a, b)).mean[0]
+
+
+def wait_until_ready(backend, regions, hwnd=None, settings=None, sleep=time.sleep, clock=time.monotonic):
+    """
+    Grabs previews until stable_frames consecutive ones differ by at most threshold
+    (and show some contrast), or until timeout_seconds.
+    Returns (ready, previews grabbed, last difference or None).
+    """
+    s = dict(DEFAULT_READINESS)
+    s.update(settings or {})
+    deadline = clock() + s['timeout_seconds']
+    previous, stable, count, diff = None, 0, 0, None
+    while True:
+        current = preview_signature(backend.grab_preview(regions, hwnd), s['preview_width'])
+        count += 1
+        if previous is not None:
+            diff = frame_difference(previous, current)
+            blank = ImageStat.Stat(current).stddev[0] < s['min_contrast']
+            stable = stable + 1 if diff <= s['threshold'] and not blank else 0
+            if stable >= s['stable_frames']:
+                return True, count, diff
+        previous = current
+        if clock() >= deadline:
+            return False, count, diff
+        sleep(s['interval_seconds'])
+
+
+def create_backend(settings):
+    """Builds a capture backend from the 'capture' config section."""
+    settings = settings or {}
+    backend = settings.get('backend', 'window')
+    if backend == 'window':
+        return WindowCapture()
+    if backend == 'regions':
+        return RegionCapture(settings.get('padding', 0))
+    if backend == 'replay':
+        return ReplayCapture(settings['replay_path'], settings.get('loop', True), settings.get('origin'))
+    raise ValueError(f"Unknown capture backend: {backend}")
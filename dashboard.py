@@ -1,13 +1,27 @@
+import argparse
 import json
 import os
-import requests
-from flask import Flask, render_template, request, jsonify
+import threading
+import time
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from wpp_client import WPPConnectClient, get_http_session, get_token_store
+from session_monitor import DEFAULT_SETTINGS as MONITOR_DEFAULTS, SessionMonitor, UpstreamTimeout
+from logs import DEFAULT_SETTINGS as LOG_DEFAULTS, Logger, level_of, tail_records
+from metrics import DEFAULT_SETTINGS as METRICS_DEFAULTS, aggregate, read_records, resolve_path
+from history import BUCKETS, ReadingHistory
+from report import DEFAULT_JOB
+from datetime import datetime
 
 app = Flask(__name__)
 
 CONFIG_FILE = 'config.json'
-# In-memory token cache: {session_name: token}
-TOKEN_CACHE = {}
+# Shared clients keyed by (base_url, session, secret_key); tokens live in the shared
+# on-disk token store so main.py and get_groups.py reuse them too.
+CLIENTS = {}
+# One status monitor (background poller + cache) per client key
+MONITORS = {}
+# Guards CLIENTS and MONITORS: concurrent first requests must not build duplicates
+REGISTRY_LOCK = threading.Lock()
 
 def load_config():
     if os.path.exists(CONFIG_FILE):
@@ -15,29 +29,49 @@ def load_config():
             return json.load(f)
     return {}
 
-def get_access_token(base_url, session, secret_key):
-    """Generates an access token using the secret key."""
-    if not secret_key:
-        return None
-    
-    # Check cache first
-    if session in TOKEN_CACHE:
-        return TOKEN_CACHE[session]
-
-    url = f"{base_url.rstrip('/')}/api/{session}/{secret_key}/generate-token"
-    print(f"DEBUG: Generating token for '{session}' at {url}")
-    try:
-        response = requests.post(url, timeout=10)
-        if response.status_code == 201 or response.status_code == 200:
-            data = response.json()
-            token = data.get('token')
-            if token:
-                TOKEN_CACHE[session] = token
-                return token
-        print(f"DEBUG: Token generation failed: {response.status_code} - {response.text}")
-    except Exception as e:
-        print(f"DEBUG: Token exception: {e}")
-    return None
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+log = Logger.from_settings("dashboard", load_config().get('logging'), BASE_DIR)
+
+# Production server (python dashboard.py; --dev runs Flask's debug server with the reloader)
+SERVER_DEFAULTS = {
+    "host": "0.0.0.0",
+    "port": 5000,
+    "threads": 32,        # Request threads (waitress)
+    "max_streams": 16,    # Concurrent /api/session/events streams; each holds a thread
+    "stream_seconds": 300,  # Streams end after this long and the browser reconnects
+}
+
+def dashboard_settings():
+    s = dict(MONITOR_DEFAULTS)
+    s.update(SERVER_DEFAULTS)
+    s.update(load_config().get('dashboard') or {})
+    return s
+
+SETTINGS = dashboard_settings()
+STREAM_SLOTS = threading.BoundedSemaphore(SETTINGS['max_streams'])
+
+def get_client(base_url, session, secret_key):
+    """Returns a pooled WPPConnect client for the given connection parameters."""
+    key = (base_url.rstrip('/'), session, secret_key)
+    with REGISTRY_LOCK:
+        if key not in CLIENTS:
+            http_settings = load_config().get('wpp_http', {})
+            http = get_http_session(http_settings.get('pool_size', 10), http_settings.get('retries', 2))
+            CLIENTS[key] = WPPConnectClient(*key, http=http, token_store=get_token_store(), logger=log)
+        return CLIENTS[key]
+
+def get_monitor(base_url, session, secret_key):
+    """Returns the shared status monitor of a session (settings from config 'dashboard')."""
+    key = (base_url.rstrip('/'), session, secret_key)
+    client = get_client(*key)
+    with REGISTRY_LOCK:
+        if key not in MONITORS:
+            MONITORS[key] = SessionMonitor(client, load_config().get('dashboard'), logger=log)
+        return MONITORS[key]
+
+@app.errorhandler(UpstreamTimeout)
+def upstream_timeout(e):
+    return jsonify({"success": False, "message": str(e)}), 504
 
 @app.route('/')
 def index():
@@ -54,87 +88,103 @@ def start_session():
     if not session or not base_url:
         return jsonify({"success": False, "message": "Missing session or base_url"}), 400
 
+    client = get_client(base_url, session, secret_key)
+    monitor = get_monitor(base_url, session, secret_key)
+
     # Force token regeneration on Manual Start
-    if session in TOKEN_CACHE:
-        print(f"DEBUG: Clearing token cache for '{session}' to force restart")
-        del TOKEN_CACHE[session]
-
-    token = get_access_token(base_url, session, secret_key)
-    
-    url = f"{base_url}/api/{session}/start-session"
-    headers = {"Content-Type": "application/json"}
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
-
-    print(f"DEBUG: Starting session '{session}' at {url}")
+    log(f"Clearing token cache for '{session}' to force restart", "DEBUG")
+    client.ensure_token(force=True)
+
+    log(f"Starting session '{session}' at {base_url}", "DEBUG")
     try:
-        response = requests.post(url, headers=headers, json={"waitQrCode": True}, timeout=15)
-        print(f"DEBUG: Start response: {response.status_code} - {response.text}")
+        response = client.request("POST", "start-session", json={"waitQrCode": True},
+                                  timeout=monitor.timeout("start"))
+        log(f"Start response: {response.status_code} - {response.text}", "DEBUG")
+        monitor.invalidate()
         return jsonify(response.json()), response.status_code
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+def session_params(args):
+    return args.get('session'), args.get('base_url', '').rstrip('/'), args.get('secret_key', '')
+
 @app.route('/api/session/status', methods=['GET'])
 def get_status():
-    session = request.args.get('session')
-    base_url = request.args.get('base_url', '').rstrip('/')
-    secret_key = request.args.get('secret_key', '')
-
+    """Session status from the shared monitor (cached for a few seconds, one upstream call at a time)."""
+    session, base_url, secret_key = session_params(request.args)
     if not session or not base_url:
         return jsonify({"success": False, "message": "Missing parameters"}), 400
-
-    token = get_access_token(base_url, session, secret_key)
-    
-    url = f"{base_url}/api/{session}/status-session"
-    headers = {"Content-Type": "application/json"}
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
-
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        return jsonify(response.json()), response.status_code
-    except Exception as e:
-        return jsonify({"success": False, "message": str(e)}), 500
+    body, status_code = get_monitor(base_url, session, secret_key).status()
+    return jsonify(body), status_code
 
 @app.route('/api/session/qr', methods=['GET'])
 def get_qr():
-    session = request.args.get('session')
-    base_url = request.args.get('base_url', '').rstrip('/')
-    secret_key = request.args.get('secret_key', '')
-
+    """QR code as JSON ({"base64": data URL}); prefer /api/session/qr.png, which supports ETags."""
+    session, base_url, secret_key = session_params(request.args)
     if not session or not base_url:
         return jsonify({"success": False, "message": "Missing parameters"}), 400
+    qr = get_monitor(base_url, session, secret_key).qr()
+    if qr.image is not None:
+        return jsonify({"base64": qr.data_url()})
+    return jsonify(qr.body), qr.status_code
 
-    token = get_access_token(base_url, session, secret_key)
-    
-    url = f"{base_url}/api/{session}/qrcode-session"
-    headers = {"Content-Type": "application/json"}
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
+@app.route('/api/session/qr.png', methods=['GET'])
+def get_qr_image():
+    """
+    The cached QR image as binary, with an ETag of its content: a request whose
+    If-None-Match matches gets 304 without a body. Upstream is only asked again once
+    the cached entry is older than the cache TTL.
+    """
+    session, base_url, secret_key = session_params(request.args)
+    if not session or not base_url:
+        return jsonify({"success": False, "message": "Missing parameters"}), 400
+    qr = get_monitor(base_url, session, secret_key).qr()
+    if qr.image is None:
+        status_code = qr.status_code if qr.status_code >= 400 else 404
+        return jsonify(qr.body or {"success": False, "message": "No QR code"}), status_code
+    # Cached by the browser but revalidated on each use; a matching If-None-Match gets 304
+    response = Response(qr.image, mimetype=qr.mime, headers={"Cache-Control": "no-cache"})
+    response.set_etag(qr.etag)
+    return response.make_conditional(request)
 
-    print(f"DEBUG: Fetching QR for '{session}' at {url}")
-    try:
-        response = requests.get(url, headers=headers, timeout=15)
-        print(f"DEBUG: QR response status: {response.status_code}")
-        print(f"DEBUG: QR content type: {response.headers.get('Content-Type')}")
-        
-        # If the response is an image, we should probably encode it to base64 for the frontend
-        if 'image' in response.headers.get('Content-Type', ''):
-            import base64
-            img_base64 = base64.b64encode(response.content).decode('utf-8')
-            return jsonify({"base64": f"data:image/png;base64,{img_base64}"})
+@app.route('/api/session/events', methods=['GET'])
+def session_events():
+    """
+    Server-Sent Events stream of the session state ({version, status_code, status, state, qr_etag}),
+    sent whenever it changes; a comment line every 15 s keeps idle connections open.
+    Streams end after stream_seconds (the browser reconnects). Past max_streams open
+    streams the answer is 503 and the page polls /api/session/status instead.
+    """
+    session, base_url, secret_key = session_params(request.args)
+    if not session or not base_url:
+        return jsonify({"success": False, "message": "Missing parameters"}), 400
+    monitor = get_monitor(base_url, session, secret_key)
+    if not STREAM_SLOTS.acquire(blocking=False):
+        return jsonify({"success": False, "message": "Too many open streams"}), 503
+    deadline = time.monotonic() + SETTINGS['stream_seconds']
 
-        # Try to parse as JSON
+    def stream():
+        monitor.subscribe()
         try:
-            return jsonify(response.json()), response.status_code
-        except Exception:
-            # If not JSON and not image, return raw text or error
-            print(f"DEBUG: QR Raw text: {response.text[:100]}...")
-            return jsonify({"success": False, "message": "Unexpected response format", "raw": response.text[:200]}), 500
-            
-    except Exception as e:
-        print(f"DEBUG: QR exception: {e}")
-        return jsonify({"success": False, "message": str(e)}), 500
+            version = 0
+            while time.monotonic() < deadline:
+                snapshot = monitor.wait_for_change(version, timeout=15)
+                if snapshot['version'] == version:
+                    yield ": keep-alive\n\n"
+                    continue
+                version = snapshot['version']
+                yield f"data: {json.dumps(snapshot)}\n\n"
+        finally:
+            monitor.unsubscribe()
+
+    try:
+        response = Response(stream_with_context(stream()), mimetype='text/event-stream',
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        response.call_on_close(STREAM_SLOTS.release)
+    except Exception:
+        STREAM_SLOTS.release()  # The slot is only released on close once the response exists
+        raise
+    return response
 
 @app.route('/api/session/logout', methods=['POST'])
 def logout_session():
@@ -146,29 +196,160 @@ def logout_session():
     if not session or not base_url:
         return jsonify({"success": False, "message": "Missing parameters"}), 400
 
-    token = get_access_token(base_url, session, secret_key)
-    
-    url = f"{base_url}/api/{session}/logout-session"
-    headers = {"Content-Type": "application/json"}
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
+    client = get_client(base_url, session, secret_key)
+    monitor = get_monitor(base_url, session, secret_key)
 
-    print(f"DEBUG: Logging out session '{session}' at {url}")
+    log(f"Logging out session '{session}' at {base_url}", "DEBUG")
     try:
-        response = requests.post(url, headers=headers, timeout=10)
+        response = client.request("POST", "logout-session", timeout=monitor.timeout("logout"))
         # Clear token from cache on logout
-        if session in TOKEN_CACHE:
-            del TOKEN_CACHE[session]
+        client.tokens.invalidate(client.base_url, client.session)
+        monitor.invalidate()
         
         # Even if 404/401, we want to return success to the dashboard so it can proceed with restart
         if response.status_code in [200, 201, 404, 401]:
             return jsonify({"success": True, "message": "Session closed or already gone"}), 200
         return jsonify(response.json()), response.status_code
     except Exception as e:
-        print(f"DEBUG: Logout error (ignoring for refresh): {e}")
+        log(f"Logout error (ignoring for refresh): {e}", "DEBUG")
         # Return success anyway to allow refresh-cycle to continue
         return jsonify({"success": True, "message": "Proceeding despite error"}), 200
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Stage timings (ms) and counters recorded by main.py over the last ?hours= (default 24)."""
+    settings = load_config().get('metrics', {})
+    path = resolve_path(settings, BASE_DIR)
+    try:
+        hours = float(request.args.get('hours', 24))
+        recent = int(request.args.get('recent', 20))
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid hours or recent"}), 400
+    since = time.time() - hours * 3600
+    backups = settings.get('backups', METRICS_DEFAULTS['backups'])
+    summary = aggregate(read_records(path, since, backups), recent=recent)
+    summary.update({"since": since, "hours": hours})
+    return jsonify(summary)
+
+@app.route('/api/logs', methods=['GET'])
+def get_logs():
+    """
+    Structured log records of ?source= (bot, dashboard, get_groups) appended after byte
+    ?offset=, optionally filtered by ?level= (minimum) and ?job=. Pass the returned
+    offset back to receive only newer records.
+    """
+    source = request.args.get('source', 'bot')
+    if source not in ("bot", "dashboard", "get_groups"):
+        return jsonify({"success": False, "message": "Unknown source"}), 400
+    try:
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid offset"}), 400
+    settings = dict(LOG_DEFAULTS)
+    settings.update(load_config().get('logging') or {})
+    directory = settings['dir'] if os.path.isabs(settings['dir']) else os.path.join(BASE_DIR, settings['dir'])
+    records, offset = tail_records(os.path.join(directory, f"{source}.jsonl"), offset)
+    min_level = level_of(request.args.get('level', 'DEBUG'))
+    job = request.args.get('job')
+    records = [r for r in records if level_of(r.get('level')) >= min_level and (not job or r.get('job') == job)]
+    return jsonify({"records": records, "offset": offset})
+
+# --- Readings History (written by main.py) ---
+HISTORY_STORES = {}
+
+def get_history():
+    """The readings history store for the current config (None when 'history' is disabled)."""
+    settings = load_config().get('history')
+    key = json.dumps(settings, sort_keys=True)
+    if key not in HISTORY_STORES:
+        HISTORY_STORES[key] = ReadingHistory.from_settings(settings, BASE_DIR)
+    return HISTORY_STORES[key]
+
+def parse_time(value, default):
+    """Query time: epoch seconds or ISO date/time ('2026-01-31', '2026-01-31T08:00')."""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def history_query():
+    """Common ?job=&name=&from=&to= arguments (default: last 24 hours of the default job)."""
+    now = time.time()
+    names = [n for n in request.args.get('name', '').split(',') if n]
+    return (request.args.get('job', DEFAULT_JOB), names,
+            parse_time(request.args.get('from'), now - 86400), parse_time(request.args.get('to'), now + 1))
+
+@app.route('/api/history/series', methods=['GET'])
+def get_history_series():
+    """Reading names with numeric history, per job."""
+    history = get_history()
+    if history is None:
+        return jsonify({"success": False, "message": "History is disabled"}), 404
+    return jsonify(history.names(request.args.get('job')))
+
+@app.route('/api/history/readings', methods=['GET'])
+def get_history_readings():
+    """
+    Raw readings of ?name= (comma-separated) for ?job= between ?from= and ?to=, at most
+    ?limit= (default 5000, newest kept) per name. ?invalid=1 includes rejected runs, ?test=1 test runs.
+    """
+    history = get_history()
+    if history is None:
+        return jsonify({"success": False, "message": "History is disabled"}), 404
+    try:
+        job, names, since, until = history_query()
+        limit = min(int(request.args.get('limit', 5000)), 100000)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid from, to or limit"}), 400
+    if not names:
+        return jsonify({"success": False, "message": "name is required"}), 400
+    include_invalid = request.args.get('invalid') == '1'
+    include_test = request.args.get('test') == '1'
+    series = {name: [{"ts": ts, "value": value, "text": text, "confidence": conf}
+                     for ts, value, text, conf in history.readings(job, name, since, until, limit, include_invalid,
+                                                                       include_test)]
+              for name in names}
+    return jsonify({"job": job, "from": since, "to": until, "series": series})
+
+@app.route('/api/history/aggregate', methods=['GET'])
+def get_history_aggregate():
+    """
+    Hourly or daily (?bucket=hour|day, local days) count/min/mean/max of ?name=
+    (comma-separated) for ?job= between ?from= and ?to=. Served from the hourly rollup.
+    """
+    history = get_history()
+    if history is None:
+        return jsonify({"success": False, "message": "History is disabled"}), 404
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in BUCKETS:
+        return jsonify({"success": False, "message": "bucket must be hour or day"}), 400
+    try:
+        job, names, since, until = history_query()
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid from or to"}), 400
+    if not names:
+        return jsonify({"success": False, "message": "name is required"}), 400
+    utc_offset = time.localtime().tm_gmtoff
+    series = {name: [{"ts": ts, "count": n, "min": lo, "mean": mean, "max": hi}
+                     for ts, n, lo, mean, hi in history.aggregate(job, name, since, until, bucket, utc_offset)]
+              for name in names}
+    return jsonify({"job": job, "bucket": bucket, "from": since, "to": until, "series": series})
+
+@app.route('/api/history/runs', methods=['GET'])
+def get_history_runs():
+    """Recent runs of ?job= (all jobs if omitted) between ?from= and ?to=: readings, timings, delivery status."""
+    history = get_history()
+    if history is None:
+        return jsonify({"success": False, "message": "History is disabled"}), 404
+    try:
+        _job, _names, since, until = history_query()
+        limit = min(int(request.args.get('limit', 200)), 5000)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid from, to or limit"}), 400
+    return jsonify({"runs": history.runs(request.args.get('job'), since, until, limit)})
+
 @app.route('/api/save-config', methods=['POST'])
 def save_config_api():
     data = request.json
@@ -178,5 +359,32 @@ def save_config_api():
         json.dump(config, f, indent=4, ensure_ascii=False)
     return jsonify({"success": True})
 
+def serve(host, port, threads):
+    """
+    Runs app on a production WSGI server until interrupted: waitress with a fixed
+    pool of threads when installed, otherwise werkzeug's thread-per-request server.
+    """
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        waitress_serve = None
+    if waitress_serve is not None:
+        log(f"Dashboard on http://{host}:{port} (waitress, {threads} threads)", "INFO")
+        waitress_serve(app, host=host, port=port, threads=threads, ident="dashboard")
+    else:
+        from werkzeug.serving import make_server
+        log(f"Dashboard on http://{host}:{port} (werkzeug, threaded; pip install waitress for a thread pool)",
+            "INFO")
+        make_server(host, port, app, threaded=True).serve_forever()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    parser = argparse.ArgumentParser(description="WPPConnect session dashboard.")
+    parser.add_argument("--dev", action="store_true", help="Flask debug server with the reloader")
+    parser.add_argument("--host", default=SETTINGS['host'])
+    parser.add_argument("--port", type=int, default=SETTINGS['port'])
+    parser.add_argument("--threads", type=int, default=SETTINGS['threads'])
+    args = parser.parse_args()
+    if args.dev:
+        app.run(host=args.host, port=args.port, debug=True, threaded=True)  # Threads keep event streams open
+    else:
+        serve(args.host, args.port, args.threads)
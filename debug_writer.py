@@ -0,0 +1,148 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+# --- Asynchronous Debug Image Writer ---
+# Debug crops and archived screenshots are encoded and written on a background thread
+# so PNG compression and disk I/O stay off the capture -> OCR -> send critical path.
+
+DEBUG_MODES = ("off", "failure", "always")
+
+# format -> (PIL format name, file extension)
+FORMATS = {
+    "png": ("PNG", ".png"),
+    "webp": ("WEBP", ".webp"),
+    "jpeg": ("JPEG", ".jpg"),
+    "jpg": ("JPEG", ".jpg"),
+}
+
+DEFAULT_SETTINGS = {"mode": "failure", "format": "png", "compress_level": 1, "quality": 85, "max_queue": 32}
+
+
+def resolve_settings(settings):
+    resolved = dict(DEFAULT_SETTINGS)
+    resolved.update(settings or {})
+    if resolved['mode'] not in DEBUG_MODES:
+        raise ValueError(f"Unknown debug_images mode: {resolved['mode']}")
+    if resolved['format'].lower() not in FORMATS:
+        raise ValueError(f"Unknown debug_images format: {resolved['format']}")
+    return resolved
+
+
+def save_options(settings):
+    """PIL save() keyword arguments for the configured format."""
+    pil_format, _ext = FORMATS[settings['format'].lower()]
+    if pil_format == "PNG":
+        return {"format": "PNG", "compress_level": settings['compress_level']}
+    if pil_format == "WEBP":
+        return {"format": "WEBP", "quality": settings['quality'], "method": 4}
+    return {"format": "JPEG", "quality": settings['quality']}
+
+
+class DebugImageWriter:
+    """Single background thread writing images from a bounded queue."""
+
+    def __init__(self, max_queue=32, logger=None, metrics=None, on_saved=None):
+        self.log = logger or (lambda message, type="INFO": print(message))
+        self.metrics = metrics
+        self.on_saved = on_saved  # Called with each written path and its meta (e.g. ScreenshotStore.record)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="debug-writer", daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        while True:
+            image, path, options, meta, future = self._queue.get()
+            try:
+                start = time.perf_counter()
+                if image.mode not in ("RGB", "L") and options['format'] == "JPEG":
+                    image = image.convert("RGB")
+                image.save(path, **options)
+                if self.metrics is not None:
+                    self.metrics.timing("debug.save", time.perf_counter() - start, format=options['format'])
+                if self.on_saved is not None:
+                    self.on_saved(path, meta)
+                future.set_result(path)
+            except Exception as e:
+                self.log(f"Debug image write error ({os.path.basename(path)}): {e}", "DEBUG")
+                future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, image, base_path, settings, required=False, meta=None):
+        """
+        Queues an image for writing to base_path + the format's extension; meta (a dict)
+        is handed to on_saved with the path. Returns a Future resolving to the written
+        path. Optional images are dropped (future resolves to None) when the queue is
+        full; required ones wait for room.
+        """
+        settings = resolve_settings(settings)
+        _pil_format, ext = FORMATS[settings['format'].lower()]
+        future = Future()
+        item = (image, base_path + ext, save_options(settings), meta, future)
+        self._ensure_started()
+        if required:
+            self._queue.put(item)
+            return future
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            if self.metrics is not None:
+                self.metrics.incr("debug_images_dropped")
+            self.log(f"Debug writer queue full, dropped {os.path.basename(base_path)}.", "DEBUG")
+            future.set_result(None)
+        return future
+
+    def begin_run(self, settings):
+        return DebugRun(self, resolve_settings(settings))
+
+    def flush(self, timeout=None):
+        """Waits until every queued image has been written."""
+        if timeout is None:
+            self._queue.join()
+            return True
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        return done.wait(timeout)
+
+
+class DebugRun:
+    """
+    Debug images of one job run. In 'always' mode they are queued immediately; in
+    'failure' mode they are held in memory and only written if the run fails.
+    """
+
+    def __init__(self, writer, settings):
+        self.writer = writer
+        self.settings = settings
+        self.mode = settings['mode']
+        self._pending = []
+        self._finished = False
+
+    def add(self, image, base_path):
+        if self.mode == "off":
+            return
+        if self.mode == "always":
+            self.writer.submit(image, base_path, self.settings)
+        else:
+            self._pending.append((image, base_path))
+
+    def finish(self, success):
+        """Ends the run; only the first call has an effect."""
+        if self._finished:
+            return
+        self._finished = True
+        if self.mode == "failure" and not success:
+            for image, base_path in self._pending:
+                self.writer.submit(image, base_path, self.settings)
+        self._pending = []
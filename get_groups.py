@@ -1,35 +1,31 @@
-import requests
 import json
 import os
 import sys
+from wpp_client import WPPConnectClient
+from logs import Logger
 
-def log(message, type="INFO"):
-    colors = {
-        "INFO": "\033[94m",    # Blue
-        "SUCCESS": "\033[92m", # Green
-        "ERROR": "\033[91m",   # Red
-        "ACTION": "\033[93m",  # Yellow
-        "DEBUG": "\033[95m",   # Magenta
-        "END": "\033[0m"
-    }
-    prefixes = {
-        "INFO": "[*]",
-        "SUCCESS": "[+]",
-        "ERROR": "[-]",
-        "ACTION": "[>]",
-        "DEBUG": "[#]"
-    }
-    print(f"{colors.get(type, '')}{prefixes.get(type, '[ ]')} {message}{colors.get('END', '')}")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(BASE_DIR, 'config.json')
+
+def load_config():
+    """config.json as a dict, or None when it does not exist yet."""
+    if not os.path.exists(CONFIG_PATH):
+        return None
+    with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+CONFIG = load_config()
+
+# Colored [+]/[-] console view; records also go to the config 'logging' directory
+# (logs/get_groups.jsonl by default)
+log = Logger.from_settings("get_groups", (CONFIG or {}).get('logging'), BASE_DIR, console="ansi")
 
 def get_groups():
-    config_path = os.path.join(os.path.dirname(__file__), 'config.json')
-    if not os.path.exists(config_path):
+    config = CONFIG
+    if config is None:
         log("config.json not found!", "ERROR")
         return
 
-    with open(config_path, 'r') as f:
-        config = json.load(f)
-
     base_url = config.get('wpp_base_url', '').rstrip('/')
     session = config.get('wpp_session')
     secret_key = config.get('wpp_secret_key')
@@ -38,26 +34,18 @@ def get_groups():
         log("Missing configuration in config.json", "ERROR")
         return
 
-    # First, get token
+    # First, get token (reused from the shared token store when still valid)
     log(f"Fetching token for session '{session}'...", "ACTION")
-    token_url = f"{base_url}/api/{session}/{secret_key}/generate-token"
-    try:
-        res = requests.post(token_url, timeout=15)
-        if res.status_code not in [200, 201]:
-            log(f"Auth failed: {res.text}", "ERROR")
-            return
-        token = res.json().get('token')
-    except Exception as e:
-        log(f"Network error: {e}", "ERROR")
+    client = WPPConnectClient(base_url, session, secret_key, logger=log)
+    if not client.ensure_token():
+        log("Auth failed: could not obtain a token.", "ERROR")
         return
 
     # Get All Groups
     log("Fetching all groups...", "ACTION")
-    groups_url = f"{base_url}/api/{session}/all-groups"
-    headers = {"Authorization": f"Bearer {token}"}
     
     try:
-        res = requests.get(groups_url, headers=headers, timeout=30)
+        res = client.request("GET", "all-groups", timeout=30)
         if res.status_code != 200:
             log(f"Failed to fetch groups: {res.text}", "ERROR")
             return
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import sqlite3
+import contextlib
+
+# --- Readings History ---
+# Every job run is appended here: the OCR readings (text, numeric value, confidence),
+# the computed fields, stage timings, validation outcome and per-recipient delivery
+# status. Readings are indexed by (job, name, ts) for range queries, and an hourly
+# rollup (count/sum/min/max per job, reading and hour) is kept up to date on insert,
+# so hourly and daily aggregates over years of data only touch the rollup rows.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    job TEXT NOT NULL,
+    is_test INTEGER NOT NULL DEFAULT 0,
+    valid INTEGER NOT NULL,
+    error TEXT,
+    report_id TEXT,
+    timings TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_job_ts ON runs (job, ts);
+CREATE INDEX IF NOT EXISTS idx_runs_report ON runs (report_id);
+CREATE TABLE IF NOT EXISTS readings (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    ts REAL NOT NULL,
+    job TEXT NOT NULL,
+    name TEXT NOT NULL,
+    text TEXT,
+    value REAL,
+    confidence REAL
+);
+CREATE INDEX IF NOT EXISTS idx_readings_series ON readings (job, name, ts);
+CREATE INDEX IF NOT EXISTS idx_readings_run ON readings (run_id);
+CREATE TABLE IF NOT EXISTS readings_hourly (
+    job TEXT NOT NULL,
+    name TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    total REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (job, name, hour)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS deliveries (
+    report_id TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    error TEXT,
+    PRIMARY KEY (report_id, recipient)
+) WITHOUT ROWID;
+"""
+
+DEFAULT_SETTINGS = {"enabled": True, "path": "history.db"}
+BUCKETS = {"hour": 3600, "day": 86400}
+
+
+def parse_value(text):
+    """Numeric value of a reading ('6.1' -> 6.1), or None."""
+    try:
+        return float(str(text).strip().replace(',', '.'))
+    except ValueError:
+        return None
+
+
+class ReadingHistory:
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            columns = [row[1] for row in db.execute("PRAGMA table_info(deliveries)")]
+            if "error" not in columns:  # History files created before delivery errors were kept
+                db.execute("ALTER TABLE deliveries ADD COLUMN error TEXT")
+
+    @classmethod
+    def from_settings(cls, settings, base_dir):
+        """Returns None when history is disabled."""
+        s = dict(DEFAULT_SETTINGS)
+        s.update(settings or {})
+        if not s['enabled']:
+            return None
+        return cls(s['path'] if os.path.isabs(s['path']) else os.path.join(base_dir, s['path']))
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Short-lived connection per operation (safe across threads), committed on success."""
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # --- Writing (main.py) ---
+    def record_run(self, job, ts, valid, readings=None, confidences=None, timings=None, error=None,
+                   report_id=None, recipients=(), is_test=False):
+        """
+        Appends one run. readings: {name: text}; confidences: {name: 0..1}; timings:
+        {stage: seconds}. Only readings of valid, non-test runs enter the hourly rollup.
+        Returns the run id.
+        """
+        readings, confidences = readings or {}, confidences or {}
+        timings_ms = {stage: round(seconds * 1000, 3) for stage, seconds in (timings or {}).items()}
+        hour = int(ts // 3600)
+        with self._connect() as db:
+            cur = db.execute("INSERT INTO runs (ts, job, is_test, valid, error, report_id, timings) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (ts, job, int(is_test), int(valid), error, report_id, json.dumps(timings_ms)))
+            run_id = cur.lastrowid
+            for name, text in readings.items():
+                value = parse_value(text)
+                db.execute("INSERT INTO readings (run_id, ts, job, name, text, value, confidence) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (run_id, ts, job, name, str(text), value, confidences.get(name)))
+                if valid and not is_test and value is not None:
+                    db.execute(
+                        "INSERT INTO readings_hourly (job, name, hour, n, total, min, max) VALUES (?, ?, ?, 1, ?, ?, ?) "
+                        "ON CONFLICT (job, name, hour) DO UPDATE SET n = n + 1, total = total + excluded.total, "
+                        "min = MIN(min, excluded.min), max = MAX(max, excluded.max)",
+                        (job, name, hour, value, value, value))
+            for recipient in recipients:
+                db.execute("INSERT OR IGNORE INTO deliveries (report_id, recipient, status, updated_at) "
+                           "VALUES (?, ?, 'pending', ?)", (report_id, recipient, ts))
+        return run_id
+
+    def update_delivery(self, report_id, recipient, status, error=None):
+        """Delivery outcome and last error from the outbox worker (DeliveryWorker on_status callback)."""
+        with self._connect() as db:
+            db.execute("INSERT INTO deliveries (report_id, recipient, status, updated_at, error) VALUES (?, ?, ?, ?, ?) "
+                       "ON CONFLICT (report_id, recipient) DO UPDATE SET status = excluded.status, "
+                       "updated_at = excluded.updated_at, error = excluded.error",
+                       (report_id, recipient, status, time.time(), error))
+
+    # --- Queries (dashboard.py) ---
+    def names(self, job=None):
+        """{job: [reading names]} present in the rollup."""
+        sql = "SELECT DISTINCT job, name FROM readings_hourly"
+        args = ()
+        if job:
+            sql, args = sql + " WHERE job = ?", (job,)
+        result = {}
+        with self._connect() as db:
+            for row_job, name in db.execute(sql + " ORDER BY job, name", args):
+                result.setdefault(row_job, []).append(name)
+        return result
+
+    def readings(self, job, name, since, until, limit=5000, include_invalid=False, include_test=False):
+        """
+        [(ts, value, text, confidence)] of one series in [since, until), oldest first, at most
+        limit (the newest). Invalid and test runs (--test, --test-22h) are left out unless asked for.
+        """
+        sql = ("SELECT r.ts, r.value, r.text, r.confidence FROM readings r "
+               "JOIN runs ON runs.id = r.run_id "
+               "WHERE r.job = ? AND r.name = ? AND r.ts >= ? AND r.ts < ?")
+        if not include_invalid:
+            sql += " AND runs.valid = 1"
+        if not include_test:
+            sql += " AND runs.is_test = 0"
+        with self._connect() as db:
+            rows = db.execute(sql + " ORDER BY r.ts DESC LIMIT ?", (job, name, since, until, limit)).fetchall()
+        return rows[::-1]
+
+    def aggregate(self, job, name, since, until, bucket="hour", utc_offset=0):
+        """
+        [(bucket start ts, count, min, mean, max)] per hour or day in [since, until).
+        utc_offset (seconds) aligns day buckets to local midnight.
+        """
+        size = BUCKETS[bucket] // 3600
+        utc_offset = utc_offset if bucket == "day" else 0
+        offset_hours = utc_offset / 3600
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT CAST((hour + ?) / ? AS INTEGER) AS b, SUM(n), MIN(min), SUM(total) / SUM(n), MAX(max) "
+                "FROM readings_hourly WHERE job = ? AND name = ? AND hour >= ? AND hour < ? "
+                "GROUP BY b ORDER BY b",
+                (offset_hours, size, job, name, int(since // 3600), int(-(-until // 3600)))).fetchall()
+        return [(b * size * 3600 - utc_offset, n, lo, mean, hi) for b, n, lo, mean, hi in rows]
+
+    def runs(self, job=None, since=0, until=None, limit=200):
+        """Most recent runs in [since, until), newest first, with their readings and delivery status."""
+        until = time.time() + 1 if until is None else until
+        sql = "SELECT id, ts, job, is_test, valid, error, report_id, timings FROM runs WHERE ts >= ? AND ts < ?"
+        args = [since, until]
+        if job:
+            sql += " AND job = ?"
+            args.append(job)
+        result = []
+        with self._connect() as db:
+            for run_id, ts, run_job, is_test, valid, error, report_id, timings in db.execute(
+                    sql + " ORDER BY ts DESC LIMIT ?", args + [limit]).fetchall():
+                readings = {name: {"text": text, "value": value, "confidence": conf} for name, text, value, conf in
+                            db.execute("SELECT name, text, value, confidence FROM readings WHERE run_id = ?", (run_id,))}
+                rows = db.execute("SELECT recipient, status, error FROM deliveries WHERE report_id = ?",
+                                  (report_id,)).fetchall() if report_id else []
+                deliveries = {recipient: status for recipient, status, _error in rows}
+                delivery_errors = {recipient: error for recipient, _status, error in rows if error}
+                result.append({"id": run_id, "ts": ts, "job": run_job, "is_test": bool(is_test), "valid": bool(valid),
+                               "error": error, "report_id": report_id, "timings_ms": json.loads(timings or "{}"),
+                               "readings": readings, "deliveries": deliveries,
+                               "delivery_errors": delivery_errors})
+        return result
@@ -0,0 +1,276 @@
+import io
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+from PIL import Image
+
+# Load test for the dashboard's production server. Starts a fake WPPConnect server
+# (configurable latency, every session waiting for a QR scan) and the dashboard on
+# local ports, then lets many concurrent clients poll /api/session/status and
+# revalidate /api/session/qr.png (If-None-Match) while optional SSE streams stay open.
+# Reports throughput, latency percentiles and the calls that reached WPPConnect.
+# Clients and server share one interpreter here; start the dashboard separately and
+# pass --url (with --wpp-port for the fake server it should talk to) to measure it alone.
+#
+# Usage: python load_test.py [--clients 100] [--duration 10] [--sessions 1] [--latency 0.2]
+#                            [--streams 8] [--url http://host:5000] [--json report.json]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+# --- Fake WPPConnect Server ---
+class FakeWPPConnect:
+    """Answers generate-token, status-session (QRCODE), qrcode-session (PNG) and start/logout after latency seconds."""
+
+    def __init__(self, latency=0.2, port=None):
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        buffer = io.BytesIO()
+        Image.new("L", (264, 264), 255).save(buffer, format="PNG")
+        self.qr_png = buffer.getvalue()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port or free_port()), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, body, content_type="application/json"):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _endpoint(self):
+                endpoint = self.path.rstrip('/').rsplit('/', 1)[-1]
+                with fake._lock:
+                    fake.calls[endpoint] += 1
+                return endpoint
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                endpoint = self._endpoint()
+                if endpoint == "generate-token":
+                    return self._send(201, {"status": "success", "token": "load-test"})
+                time.sleep(fake.latency)
+                self._send(201, {"status": "success"})
+
+            def do_GET(self):
+                endpoint = self._endpoint()
+                time.sleep(fake.latency)
+                if endpoint == "qrcode-session":
+                    return self._send(200, fake.qr_png, "image/png")
+                self._send(200, {"status": "QRCODE"})
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-wpp", daemon=True).start()
+
+
+# --- Dashboard Under Test ---
+def start_dashboard(wpp_url, sessions, threads, verbose=False):
+    """Serves dashboard.py in this process (production server) and returns its URL."""
+    import dashboard
+    from wpp_client import TokenStore, WPPConnectClient, get_http_session
+    if not verbose:
+        dashboard.log.console = None
+        dashboard.log.min_level = 30
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        logging.getLogger("waitress").setLevel(logging.ERROR)  # Queue depth warnings under load
+    # Pre-register the clients with a throwaway token store, so the real one stays untouched
+    tokens = TokenStore(os.path.join(tempfile.mkdtemp(prefix="load_test_"), "tokens.json"))
+    for session in sessions:
+        key = (wpp_url, session, "secret")
+        dashboard.CLIENTS[key] = WPPConnectClient(*key, http=get_http_session(), token_store=tokens,
+                                                  logger=dashboard.log)
+    port = free_port()
+    threading.Thread(target=dashboard.serve, args=("127.0.0.1", port, threads), name="dashboard",
+                     daemon=True).start()
+    if not wait_for_port(port):
+        sys.exit("Dashboard did not start")
+    return f"http://127.0.0.1:{port}", dashboard
+
+
+# --- Clients ---
+def client_loop(url, wpp_url, sessions, qr_share, deadline, results, lock):
+    http = requests.Session()
+    etags = {}
+    local = []
+    while time.monotonic() < deadline:
+        session = random.choice(sessions)
+        params = {"session": session, "base_url": wpp_url, "secret_key": "secret"}
+        if random.random() < qr_share:
+            route = "qr.png"
+            headers = {"If-None-Match": etags[session]} if session in etags else {}
+        else:
+            route, headers = "status", {}
+        start = time.perf_counter()
+        try:
+            response = http.get(f"{url}/api/session/{route}", params=params, headers=headers, timeout=30)
+            code = response.status_code
+            if route == "qr.png" and code == 200:
+                etags[session] = response.headers.get("ETag")
+        except requests.RequestException:
+            code = "error"
+        local.append((route, code, time.perf_counter() - start))
+    with lock:
+        results.extend(local)
+
+
+def stream_loop(url, wpp_url, session, deadline, events, lock):
+    params = {"session": session, "base_url": wpp_url, "secret_key": "secret"}
+    try:
+        with requests.get(f"{url}/api/session/events", params=params, stream=True,
+                          timeout=(5, max(1.0, deadline - time.monotonic()))) as response:
+            if response.status_code != 200:
+                with lock:
+                    events[f"refused ({response.status_code})"] += 1
+                return
+            for line in response.iter_lines():
+                if line.startswith(b"data:"):
+                    with lock:
+                        events["events"] += 1
+                if time.monotonic() >= deadline:
+                    break
+    except requests.RequestException:
+        pass  # Read timeout at the deadline
+
+
+def summarize(results, duration):
+    summary = {}
+    routes = sorted({route for route, _, _ in results})
+    for route in routes + ["all"]:
+        rows = [r for r in results if route == "all" or r[0] == route]
+        latencies = sorted(seconds * 1000 for _, _, seconds in rows)
+        summary[route] = {
+            "requests": len(rows),
+            "per_second": round(len(rows) / duration, 1),
+            "status": dict(Counter(str(code) for _, code, _ in rows)),
+            **{f"p{p}_ms": round(percentile(latencies, p), 2) for p in PERCENTILES},
+            "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the dashboard against a local fake WPPConnect server.")
+    parser.add_argument("--clients", type=int, default=100, help="concurrent polling clients")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load")
+    parser.add_argument("--sessions", type=int, default=1, help="distinct WPPConnect sessions polled")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake WPPConnect response time (s)")
+    parser.add_argument("--qr-share", type=float, default=0.2, help="share of requests for qr.png")
+    parser.add_argument("--streams", type=int, default=8, help="SSE streams held open during the test")
+    parser.add_argument("--threads", type=int, default=32, help="dashboard server threads")
+    parser.add_argument("--url", default=None, help="test an already running dashboard instead")
+    parser.add_argument("--wpp-port", type=int, default=None, help="fake WPPConnect port (with --url)")
+    parser.add_argument("--json", default=None, help="write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the dashboard's log lines")
+    args = parser.parse_args()
+
+    fake = FakeWPPConnect(args.latency, args.wpp_port)
+    fake.start()
+    sessions = [f"load{i}" for i in range(args.sessions)]
+    dashboard = None
+    url = args.url
+    if url is None:
+        url, dashboard = start_dashboard(fake.url, sessions, args.threads, args.verbose)
+    print(f"Dashboard {url}, fake WPPConnect {fake.url} ({args.latency * 1000:.0f} ms per call)")
+    print(f"{args.clients} clients, {args.streams} streams, {len(sessions)} session(s), {args.duration:.0f} s")
+
+    # Warm-up: token generation and the first upstream answer per session
+    for session in sessions:
+        requests.get(f"{url}/api/session/status", timeout=30,
+                     params={"session": session, "base_url": fake.url, "secret_key": "secret"})
+    fake.calls.clear()
+
+    results, events, lock = [], Counter(), threading.Lock()
+    deadline = time.monotonic() + args.duration
+    workers = [threading.Thread(target=stream_loop, args=(url, fake.url, sessions[i % len(sessions)], deadline,
+                                                          events, lock), daemon=True)
+               for i in range(args.streams)]
+    workers += [threading.Thread(target=client_loop, args=(url, fake.url, sessions, args.qr_share, deadline,
+                                                           results, lock), daemon=True)
+                for _ in range(args.clients)]
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(args.duration + 35)
+    elapsed = time.monotonic() - started
+
+    report = {"clients": args.clients, "streams": args.streams, "sessions": len(sessions),
+              "latency_ms": args.latency * 1000, "duration_s": round(elapsed, 2),
+              "routes": summarize(results, elapsed), "stream_events": dict(events),
+              "upstream_calls": dict(fake.calls)}
+    if dashboard is not None:
+        report["server"] = "waitress" if _has_waitress() else "werkzeug"
+
+    print(f"\n{'route':<10} {'requests':>9} {'req/s':>8} " + " ".join(f"{'p%d' % p:>8}" for p in PERCENTILES)
+          + f" {'max':>8}  status")
+    for route, s in report["routes"].items():
+        print(f"{route:<10} {s['requests']:>9} {s['per_second']:>8} "
+              + " ".join(f"{s[f'p{p}_ms']:>8.1f}" for p in PERCENTILES) + f" {s['max_ms']:>8.1f}  {s['status']}")
+    print(f"\nSSE: {dict(events) or 'none'}")
+    print(f"Calls that reached WPPConnect: {dict(fake.calls) or 'none'}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+def _has_waitress():
+    try:
+        import waitress  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import os
+import bisect
+import json
+import mmap
+import threading
+
+# --- Log Store for Viewers ---
+# LogRing keeps the most recent log lines in memory under increasing sequence numbers;
+# a viewer remembers the last sequence number it showed and fetches only newer entries,
+# so polling costs O(new lines) and never disturbs other readers. LogHistory searches
+# the append-only JSONL log files on disk through mmap, using a sparse index of record
+# timestamps to jump straight to the requested time range.
+
+
+class LogRing:
+    """Fixed-capacity ring of (seq, entry); seq starts at 1 and never repeats."""
+
+    def __init__(self, capacity=5000):
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._next_seq = 1
+        self._lock = threading.Lock()
+
+    def append(self, entry):
+        with self._lock:
+            seq = self._next_seq
+            self._items[seq % self.capacity] = entry
+            self._next_seq += 1
+        return seq
+
+    @property
+    def last_seq(self):
+        return self._next_seq - 1
+
+    def since(self, seq, limit=None):
+        """
+        Entries newer than seq, oldest first: (entries [(seq, entry)], missed), where
+        missed counts entries after seq that were already overwritten.
+        """
+        with self._lock:
+            first = max(1, self._next_seq - self.capacity)
+            start = max(seq + 1, first)
+            end = self._next_seq
+            if limit is not None:
+                start = max(start, end - limit)
+            entries = [(s, self._items[s % self.capacity]) for s in range(start, end)]
+        return entries, max(0, first - (seq + 1))
+
+
+class _FileIndex:
+    """Sparse (ts, byte offset) index of one JSONL file, extended as the file grows."""
+
+    def __init__(self, path, every):
+        self.path = path
+        self.every = every
+        self.times = []
+        self.offsets = []
+        self.indexed_to = 0  # Bytes covered by the index
+        self._count = 0
+        self.identity = None
+
+    def update(self, mm):
+        size = len(mm)
+        pos = self.indexed_to
+        while pos < size:
+            end = mm.find(b"\n", pos)
+            if end < 0:
+                break  # Partially written last line
+            if self._count % self.every == 0:
+                ts = _record_ts(mm[pos:end])
+                if ts is not None:
+                    self.times.append(ts)
+                    self.offsets.append(pos)
+            self._count += 1
+            pos = end + 1
+        self.indexed_to = pos
+
+    def start_offset(self, since):
+        """Byte offset from which every record at or after since is found."""
+        if since is None or not self.times:
+            return 0
+        i = bisect.bisect_left(self.times, since) - 1
+        return self.offsets[i] if i >= 0 else 0
+
+
+def _record_ts(line):
+    # "ts" is the first key the logger writes; avoid a full JSON parse for the index
+    start = line.find(b'"ts": ')
+    if start < 0:
+        return None
+    start += 6
+    end = start
+    while end < len(line) and line[end:end + 1] in b"0123456789.eE+-":
+        end += 1
+    try:
+        return float(line[start:end])
+    except ValueError:
+        return None
+
+
+class LogHistory:
+    """
+    Time-range and text search over a rotated JSONL log (path.<backups> .. path.1, path).
+    Indexes are kept per file and only extended for bytes appended since the last search.
+    """
+
+    def __init__(self, path, backups=5, index_every=64):
+        self.path = path
+        self.backups = backups
+        self.index_every = index_every
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _files(self):
+        return [f"{self.path}.{i}" for i in range(self.backups, 0, -1)] + [self.path]
+
+    def search(self, since=None, until=None, text=None, min_level=None, limit=500):
+        """
+        Records with since <= ts < until whose message contains text (case-insensitive,
+        Unicode-aware) and whose level is at least min_level (numeric). Returns at most the last limit.
+        """
+        from logs import level_of
+        needle = text.casefold() if text else None
+        # Cheap byte prefilter for plain ASCII needles (JSON stores them unescaped);
+        # the decoded message is what actually has to match
+        plain = (needle is not None and needle.isascii() and needle.isprintable()
+                 and '"' not in needle and '\\' not in needle)
+        prefilter = needle.encode('ascii') if plain else None
+        found = []
+        with self._lock:
+            for file_path in self._files():
+                if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+                    continue
+                stat = os.stat(file_path)
+                if since is not None and stat.st_mtime < since:
+                    continue  # The whole file is older than the range
+                with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    index = self._index_for(file_path, stat, mm)
+                    pos = index.start_offset(since)
+                    while pos < index.indexed_to:
+                        end = mm.find(b"\n", pos)
+                        line = mm[pos:end]
+                        pos = end + 1
+                        if prefilter is not None and prefilter not in line.lower():
+                            continue
+                        ts = _record_ts(line)
+                        if ts is None or (since is not None and ts < since):
+                            continue
+                        if until is not None and ts >= until:
+                            break
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        if needle is not None and needle not in str(record.get('msg', '')).casefold():
+                            continue
+                        if min_level is not None and level_of(record.get('level')) < min_level:
+                            continue
+                        found.append(record)
+                        if len(found) > limit:
+                            del found[0]
+        return found
+
+    def _index_for(self, file_path, stat, mm):
+        # A file replaced by rotation (other file id, or shrunk) gets a fresh index
+        identity = stat.st_ino
+        index = self._indexes.get(file_path)
+        if index is None or index.identity != identity or len(mm) < index.indexed_to:
+            index = _FileIndex(file_path, self.index_every)
+            index.identity = identity
+            self._indexes[file_path] = index
+        index.update(mm)
+        return index
@@ -0,0 +1,215 @@
+import os
+import sys
+import atexit
+import json
+import time
+import queue
+import threading
+import contextlib
+from datetime import datetime
+
+# --- Structured Logging ---
+# One logging layer for main.py, get_groups.py and dashboard.py. A Logger is called
+# like the old log(message, type) helpers; each record (level, type, message, job,
+# stage, duration and extra fields) is appended as a JSON line to a size-rotated file
+# by a background thread, and optionally shown on the console. Records below the
+# configured level return before any formatting or I/O. tray_wrapper.py and the
+# dashboard read the JSONL records instead of parsing console text.
+
+# Message type -> level. The type keeps its own meaning (and console icon).
+LEVELS = {"DEBUG": 10, "OCR": 20, "INFO": 20, "ACTION": 20, "SUCCESS": 20, "WARNING": 30, "ERROR": 40}
+LEVEL_NAMES = {10: "DEBUG", 20: "INFO", 30: "WARNING", 40: "ERROR"}
+
+ICONS = {"INFO": "ℹ️", "SUCCESS": "✅", "ERROR": "❌", "ACTION": "🚀", "DEBUG": "🔍", "OCR": "👁️", "WARNING": "⚠️"}
+ANSI_COLORS = {"INFO": "\033[94m", "SUCCESS": "\033[92m", "ERROR": "\033[91m", "ACTION": "\033[93m",
+               "DEBUG": "\033[95m", "WARNING": "\033[93m"}
+ANSI_PREFIXES = {"INFO": "[*]", "SUCCESS": "[+]", "ERROR": "[-]", "ACTION": "[>]", "DEBUG": "[#]", "WARNING": "[!]"}
+
+DEFAULT_SETTINGS = {"dir": "logs", "level": "DEBUG", "console": True, "max_bytes": 5_000_000, "backups": 5}
+
+_context = threading.local()
+
+
+def level_of(name):
+    """Numeric level of a level or type name (unknown names count as INFO)."""
+    if isinstance(name, int):
+        return name
+    return LEVELS.get(str(name).upper(), 20)
+
+
+@contextlib.contextmanager
+def bind(**fields):
+    """Adds fields (e.g. job, stage) to every record logged by this thread inside the block."""
+    previous = getattr(_context, "fields", {})
+    _context.fields = {**previous, **fields}
+    try:
+        yield
+    finally:
+        _context.fields = previous
+
+
+def format_emoji(record):
+    """Console line as printed by the bot: [HH:MM:SS] icon message."""
+    timestamp = datetime.fromtimestamp(record['ts']).strftime("%H:%M:%S")
+    return f"[{timestamp}] {ICONS.get(record['type'], '🔹')} {record['msg']}"
+
+
+def format_ansi(record):
+    """Console line in the colored [+]/[-] style of the command-line tools."""
+    color = ANSI_COLORS.get(record['type'], '')
+    return f"{color}{ANSI_PREFIXES.get(record['type'], '[ ]')} {record['msg']}\033[0m"
+
+
+CONSOLE_STYLES = {"emoji": format_emoji, "ansi": format_ansi}
+
+
+class RotatingJSONL:
+    """Appends JSON lines to path, rotating to path.1 .. path.<backups> past max_bytes."""
+
+    def __init__(self, path, max_bytes=5_000_000, backups=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write_lines(self, lines):
+        data = "".join(lines)
+        with self._lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+                try:
+                    self._rotate()
+                except OSError:
+                    pass  # File briefly held open by a reader (Windows); rotate on a later write
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(data)
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class Logger:
+    """
+    Callable logger: log(message, type="INFO", job=None, stage=None, duration=None, **fields).
+    message may also be a zero-argument callable, only evaluated when the record is kept.
+    path=None disables the file; console=None disables the console view.
+    """
+
+    def __init__(self, name, path=None, level="DEBUG", console="emoji", max_bytes=5_000_000, backups=5):
+        self.name = name
+        self.min_level = level_of(level)
+        self.console = CONSOLE_STYLES.get(console) if console else None
+        self.file = RotatingJSONL(path, max_bytes, backups) if path else None
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flushed = threading.Event()
+        if self.file is not None:
+            atexit.register(self.flush)
+
+    @classmethod
+    def from_settings(cls, name, settings, base_dir, console="emoji"):
+        s = dict(DEFAULT_SETTINGS)
+        s.update(settings or {})
+        directory = s['dir'] if os.path.isabs(s['dir']) else os.path.join(base_dir, s['dir'])
+        return cls(name, os.path.join(directory, f"{name}.jsonl"), s['level'],
+                   console if s['console'] else None, s['max_bytes'], s['backups'])
+
+    def enabled(self, type="INFO"):
+        return level_of(type) >= self.min_level
+
+    def __call__(self, message, type="INFO", job=None, stage=None, duration=None, **fields):
+        level = LEVELS.get(type, 20)
+        if level < self.min_level:
+            return
+        if callable(message):
+            message = message()
+        record = {"ts": time.time(), "level": LEVEL_NAMES[level], "type": type, "logger": self.name,
+                  "msg": str(message)}
+        context = getattr(_context, "fields", None)
+        if context:
+            record.update(context)
+        if job is not None:
+            record["job"] = job
+        if stage is not None:
+            record["stage"] = stage
+        if duration is not None:
+            record["duration_ms"] = round(duration * 1000, 3)
+        if fields:
+            record.update(fields)
+
+        if self.console is not None:
+            try:
+                print(self.console(record))
+            except UnicodeEncodeError:
+                print(self.console(record).encode('ascii', 'replace').decode('ascii'))
+        if self.file is not None:
+            self._ensure_writer()
+            self._queue.put(record)
+
+    # --- Background file writer ---
+    def _ensure_writer(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._writer, name=f"log-{self.name}", daemon=True)
+                    self._thread.start()
+
+    def _writer(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:  # Write everything already queued in one go
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in batch if r is not None]
+            try:
+                if lines:
+                    self.file.write_lines(lines)
+            except OSError as e:
+                sys.stderr.write(f"Log write error: {e}\n")
+            for r in batch:
+                if r is None:
+                    self._flushed.set()
+
+    def flush(self, timeout=2.0):
+        """Waits until the records logged so far are on disk."""
+        if self.file is None or self._thread is None:
+            return True
+        self._flushed = threading.Event()
+        self._queue.put(None)
+        return self._flushed.wait(timeout)
+
+
+# --- Reading (tray, dashboard) ---
+def tail_records(path, offset=0):
+    """
+    Reads the complete records appended to path after byte offset.
+    Returns (records, new offset); the offset restarts at 0 when the file was rotated.
+    """
+    if not os.path.exists(path):
+        return [], 0
+    if os.path.getsize(path) < offset:
+        offset = 0
+    records = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1  # Leave a partially written last line for the next read
+    for line in data[:end].splitlines():
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records, offset + end
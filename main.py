@@ -1,29 +1,33 @@
+import time
+_T_START = time.perf_counter()
 import os
 import json
-import time
 import sys
-import random
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning)
-import base64
-import requests
-import schedule
-import pyautogui
-import numpy as np
-from PIL import Image, ImageEnhance
-import easyocr
-import pygetwindow as gw
-import win32gui
-import win32con
-import win32api
-import win32process
-from datetime import datetime, timedelta
+from datetime import datetime
+from capture import create_backend, readiness_settings, wait_until_ready
+from ocr_engine import OCREngine
+from report import DEFAULT_JOB, build_report, load_jobs, ValidationError
+from debug_writer import DebugImageWriter
+from screenshot_store import ScreenshotStore
+from wpp_client import (WPPConnectClient, encode_image_payload, get_http_session, get_token_store,
+                        recipient_caption, resolve_recipients, TOKEN_STORE_PATH, DEFAULT_TOKEN_TTL_HOURS)
+from outbox import Outbox, DeliveryWorker
+from history import ReadingHistory
+from scheduler import Scheduler, load_schedule
+from pipeline import Pipeline
+from metrics import Metrics
+from logs import Logger
+# Heavy modules (easyocr/torch, pyautogui, pygetwindow, win32*) are imported lazily
+# where they are used, so startup is not blocked by them.
+
+# --- Startup Timing ---
+STARTUP_TIMINGS = {"import light modules": time.perf_counter() - _T_START}
 
 # --- Configuration & Setup ---
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.json')
 SCREENSHOT_DIR = os.path.join(os.path.dirname(__file__), 'screenshots')
-if not os.path.exists(SCREENSHOT_DIR):
-    os.makedirs(SCREENSHOT_DIR)
 
 def load_config():
     if not os.path.exists(CONFIG_PATH):
@@ -35,95 +39,162 @@ def save_config(config):
     with open(CONFIG_PATH, 'w', encoding='utf-8') as f:
         json.dump(config, f, indent=4, ensure_ascii=False)
 
-CONFIG = load_config()
-
-
-# --- Logging Helper ---
-def log(message, type="INFO"):
-    icons = {"INFO": "ℹ️", "SUCCESS": "✅", "ERROR": "❌", "ACTION": "🚀", "DEBUG": "🔍", "OCR": "👁️"}
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    print(f"[{timestamp}] {icons.get(type, '🔹')} {message}")
-
-# --- Initialize OCR Engine ---
-log("Initializing EasyOCR Reader (English)...", "OCR")
-READER = easyocr.Reader(['en'], gpu=False) # Keep gpu=False for compatibility
+# Config, logger, metrics, OCR engine and screenshot store are built by init_runtime(),
+# only in the bot process itself: OCR pool workers spawned on Windows re-import this
+# module as __mp_main__ and must not open a second writer on logs/bot.jsonl or load
+# another engine.
+CONFIG = None
+
+# --- Logging ---
+# Structured JSONL records in logs/bot.jsonl (read by the tray and the dashboard), plus
+# the familiar emoji console view unless started with --no-console.
+log = None
+
+def log_startup_report():
+    """Logs where startup time went and warns when the main thread exceeds its budget."""
+    parts = ", ".join(f"{k}: {v * 1000:.0f} ms" for k, v in STARTUP_TIMINGS.items())
+    log(f"Startup timings -> {parts}", "DEBUG")
+    budget = CONFIG.get('startup_budget_seconds', 1.0)
+    main_thread = STARTUP_TIMINGS.get("main thread ready")
+    if main_thread is not None and main_thread > budget:
+        log(f"Startup took {main_thread:.2f}s before scheduling (budget {budget:.2f}s).", "WARNING")
+
+# --- Run Metrics (stage timers and counters, read by dashboard.py) ---
+METRICS = None
+
+# --- OCR Engine (shared by every job, background warm-up) ---
+ENGINE = None
+
+# --- Jobs ---
+class JobState:
+    """Per-job session state: the locked window handle and the capture backend."""
+
+    def __init__(self, name):
+        self.name = name
+        self.hwnd = None
+        self.capture_backend = None
+        self.capture_settings = None
+
+    def file_stem(self, ts):
+        """Screenshot name part: the timestamp, prefixed with the job name for named jobs."""
+        return ts if self.name == DEFAULT_JOB else f"{self.name.replace(' ', '_')}_{ts}"
+
+JOB_STATES = {}
+
+def get_job_state(name):
+    if name not in JOB_STATES:
+        JOB_STATES[name] = JobState(name)
+    return JOB_STATES[name]
+
+# --- Report Image ---
+def report_crop_box(settings, hwnd=None):
+    """
+    Screen box to crop the report image to: None (whole frame), the window, or [x, y, w, h].
+    The whole frame is what the capture backend grabbed: the window, or with the
+    'regions' backend only the regions' bounding box.
+    """
+    crop = (settings or {}).get('crop', 'frame')
+    if crop == 'frame':
+        return None
+    if crop == 'window':
+        if not hwnd:
+            return None
+        import win32gui
+        return win32gui.GetWindowRect(hwnd)
+    x, y, w, h = crop
+    return (x, y, x + w, y + h)
 
 # --- WPPConnect Client ---
-class WPPConnectClient:
-    def __init__(self, base_url, session, secret_key):
-        self.base_url = base_url.rstrip('/')
-        self.session = session
-        self.secret_key = secret_key
-        self.token = None
-        self.headers = {"Content-Type": "application/json"}
-
-    def _generate_token(self):
-        log(f"Generating access token for session: {self.session}...", "DEBUG")
-        url = f"{self.base_url}/api/{self.session}/{self.secret_key}/generate-token"
-        try:
-            response = requests.post(url, timeout=20)
-            if response.status_code in [200, 201]:
-                self.token = response.json().get('token')
-                self.headers["Authorization"] = f"Bearer {self.token}"
-                log("Token generated successfully.", "SUCCESS")
-                return True
-            log(f"Failed to generate token: {response.text}", "ERROR")
-        except Exception as e:
-            log(f"Token generation error: {e}", "ERROR")
-        return False
-
-    def send_image(self, phone_number, file_path, caption=""):
-        if not self.token:
-            if not self._generate_token():
-                return False
-
-        is_group = "@g.us" in phone_number
-        chat_id = phone_number if is_group else f"{phone_number.replace('+', '')}"
-        
-        try:
-            with open(file_path, "rb") as img:
-                b64 = base64.b64encode(img.read()).decode('utf-8')
-                base64_data = f"data:image/png;base64,{b64}"
-        except Exception as e:
-            log(f"Image encoding error: {e}", "ERROR")
-            return False
-
-        url = f"{self.base_url}/api/{self.session}/send-image"
-        payload = {
-            "phone": chat_id,
-            "base64": base64_data,
-            "caption": caption,
-            "isGroup": is_group
-        }
-        
-        log(f"Sending image to {phone_number}...", "ACTION")
-        try:
-            res = requests.post(url, headers=self.headers, json=payload, timeout=45)
-            if res.status_code == 401: # Token might be expired
-                if self._generate_token():
-                    res = requests.post(url, headers=self.headers, json=payload, timeout=45)
-            
-            if res.status_code in [200, 201]:
-                log("Message sent successfully!", "SUCCESS")
-                return True
-            log(f"Send failed: {res.status_code} - {res.text}", "ERROR")
-        except Exception as e:
-            log(f"WPPConnect exception: {e}", "ERROR")
-        return False
+WPP_CLIENT = None
+
+def get_wpp_client():
+    """Returns the shared WPPConnect client (pooled HTTP session + persisted token store)."""
+    global WPP_CLIENT
+    key = (CONFIG['wpp_base_url'].rstrip('/'), CONFIG['wpp_session'], CONFIG['wpp_secret_key'])
+    if WPP_CLIENT is None or (WPP_CLIENT.base_url, WPP_CLIENT.session, WPP_CLIENT.secret_key) != key:
+        http_settings = CONFIG.get('wpp_http', {})
+        WPP_CLIENT = WPPConnectClient(
+            *key,
+            http=get_http_session(http_settings.get('pool_size', 10), http_settings.get('retries', 2)),
+            token_store=get_token_store(TOKEN_STORE_PATH, CONFIG.get('wpp_token_ttl_hours', DEFAULT_TOKEN_TTL_HOURS)),
+            logger=log)
+    return WPP_CLIENT
+
+# --- Delivery Outbox ---
+OUTBOX = None
+DELIVERY_WORKER = None
+
+def get_outbox():
+    """Returns the durable outbox, starting its delivery worker on first use."""
+    global OUTBOX, DELIVERY_WORKER
+    if OUTBOX is None:
+        OUTBOX = Outbox.from_settings(CONFIG.get('outbox'), os.path.dirname(os.path.abspath(__file__)))
+        delivery = CONFIG.get('delivery', {})
+        DELIVERY_WORKER = DeliveryWorker(OUTBOX, get_wpp_client, log, metrics=METRICS,
+                                         max_workers=delivery.get('max_workers', 4),
+                                         rate_per_second=delivery.get('rate_per_second', 2.0),
+                                         on_status=record_delivery_status)
+        DELIVERY_WORKER.start()
+    return OUTBOX
+
+# --- Readings History ---
+HISTORY = None
+_HISTORY_LOADED = False
+
+def get_history():
+    """Returns the readings history store (None when config 'history' disables it)."""
+    global HISTORY, _HISTORY_LOADED
+    if not _HISTORY_LOADED:
+        HISTORY = ReadingHistory.from_settings(CONFIG.get('history'), os.path.dirname(os.path.abspath(__file__)))
+        _HISTORY_LOADED = True
+    return HISTORY
+
+def record_delivery_status(report_id, recipient, status, error=None):
+    if get_history() is not None:
+        get_history().update_delivery(report_id, recipient, status, error)
 
 # --- Global Session State ---
-SESSION_HWND = None
+SCREENSHOTS = None
+DEBUG_WRITER = None
+
+def init_runtime():
+    """Loads the config and builds the process-wide logger, metrics, OCR engine and screenshot store."""
+    global CONFIG, log, METRICS, ENGINE, SCREENSHOTS, DEBUG_WRITER
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    t = time.perf_counter()
+    CONFIG = load_config()
+    STARTUP_TIMINGS["load config"] = time.perf_counter() - t
+    log = Logger.from_settings("bot", CONFIG.get('logging'), base_dir,
+                               console=None if "--no-console" in sys.argv else "emoji")
+    METRICS = Metrics.from_settings(CONFIG.get('metrics'), base_dir, logger=log)
+    ENGINE = OCREngine(logger=log, timings=STARTUP_TIMINGS, on_ready=log_startup_report,
+                       pool_settings=CONFIG.get('ocr_pool'))
+    SCREENSHOTS = ScreenshotStore.from_settings(CONFIG.get('screenshots'), SCREENSHOT_DIR,
+                                               CONFIG.get('max_retention_days', 3), logger=log, metrics=METRICS)
+    DEBUG_WRITER = DebugImageWriter(CONFIG.get('debug_images', {}).get('max_queue', 32), logger=log,
+                                    metrics=METRICS, on_saved=SCREENSHOTS.record)
 
 # --- Automation Functions ---
-def activate_window(title_substring, keep_on_top=False):
-    global SESSION_HWND
+def activate_window(title_substring, keep_on_top=False, state=None, settle=True):
+    """
+    Focuses the job's window, asking the user to pick one if state has no valid handle yet.
+    settle=False skips the fixed waits (the caller waits for stable frames instead).
+    """
+    state = state or get_job_state(DEFAULT_JOB)
     if not title_substring: return True
     try:
+        import pyautogui
+        import pygetwindow as gw
+        import win32gui
+        import win32con
+        import win32api
+        import win32process
+
         # Find all matching windows
         all_windows = gw.getWindowsWithTitle(title_substring)
         if not all_windows:
             log(f"Window '{title_substring}' not found.", "ERROR")
-            SESSION_HWND = None
+            state.hwnd = None
             return False
         
         # Filter for valid UI windows
@@ -136,7 +207,7 @@ def activate_window(title_substring, keep_on_top=False):
         
         if not valid_candidates:
             log(f"No visible UI window matching '{title_substring}' found.", "ERROR")
-            SESSION_HWND = None
+            state.hwnd = None
             return False
             
         hwnd = None
@@ -144,9 +215,9 @@ def activate_window(title_substring, keep_on_top=False):
 
         # --- UNIFIED SELECTION LOGIC ---
         
-        # 1. Try to reuse SESSION_HWND if it's still valid
-        if SESSION_HWND:
-            matches = [v for v in valid_candidates if v[0] == SESSION_HWND]
+        # 1. Try to reuse the job's saved window if it's still valid
+        if state.hwnd:
+            matches = [v for v in valid_candidates if v[0] == state.hwnd]
             if matches:
                 hwnd, selected_title = matches[0]
                 log(f"Reusing session window: '{selected_title}'", "DEBUG")
@@ -173,7 +244,7 @@ def activate_window(title_substring, keep_on_top=False):
                 
                 # Create selection dialog
                 root = tk.Tk()
-                root.title("Select window to capture")
+                root.title(f"Select window to capture ({state.name})")
                 root.geometry("600x300")
                 root.resizable(False, False)
                 
@@ -226,8 +297,8 @@ def activate_window(title_substring, keep_on_top=False):
             else:
                 hwnd, selected_title = valid_candidates[0]
             
-            # Save to session for subsequent calls
-            SESSION_HWND = hwnd
+            # Save to the job's session for subsequent calls
+            state.hwnd = hwnd
             log(f"Window locked for this session: '{selected_title}'", "SUCCESS")
 
         log(f"Focusing window: '{selected_title}' (HWND: {hwnd})", "ACTION")
@@ -250,7 +321,9 @@ def activate_window(title_substring, keep_on_top=False):
         
         # 3. Maximize
         win32gui.ShowWindow(hwnd, win32con.SW_SHOWMAXIMIZED)
-        time.sleep(0.5)
+        if settle:
+            with METRICS.timer("window.maximize_wait"):
+                time.sleep(0.5)
         
         # 4. Force Foreground
         def force_foreground(h):
@@ -283,248 +356,284 @@ def activate_window(title_substring, keep_on_top=False):
                                   win32con.SWP_NOMOVE | win32con.SWP_NOSIZE)
             log("Window set to Always on Top.", "DEBUG")
             
-        time.sleep(1.5)
+        if settle:
+            with METRICS.timer("window.settle_wait"):
+                time.sleep(1.5)
         return True
     except Exception as e:
         log(f"Activation error: {e}", "ERROR")
         return False
 
-def reset_window_topmost(title_substring):
+def reset_window_topmost(title_substring, hwnd=None):
     if not title_substring: return
     try:
-        windows = gw.getWindowsWithTitle(title_substring)
-        if windows:
-            hwnd = windows[0]._hWnd
+        import pygetwindow as gw
+        import win32gui
+        import win32con
+        if hwnd is None:
+            windows = gw.getWindowsWithTitle(title_substring)
+            hwnd = windows[0]._hWnd if windows else None
+        if hwnd:
             win32gui.SetWindowPos(hwnd, win32con.HWND_NOTOPMOST, 0, 0, 0, 0, 
                                   win32con.SWP_NOMOVE | win32con.SWP_NOSIZE)
             log("Window topmost status reset.", "DEBUG")
     except Exception as e:
         log(f"Reset topmost error: {e}", "DEBUG")
 
-def perform_ocr(screenshot, timestamp_str):
+def get_capture_backend(job_config, state):
+    """Returns the job's capture backend from its 'capture' settings (reused while they are unchanged)."""
+    settings = dict(job_config.get('capture', {}))
+    if settings.get('replay_path') and not os.path.isabs(settings['replay_path']):
+        settings['replay_path'] = os.path.join(os.path.dirname(__file__), settings['replay_path'])
+    if state.capture_backend is None or settings != state.capture_settings:
+        state.capture_backend = create_backend(settings)
+        state.capture_settings = settings
+    return state.capture_backend
+
+def perform_ocr(frame, timestamp_str, debug_run=None, job_config=None, state=None, timings=None):
     """
-    EasyOCR Implementation with conditional allowlist:
-    - Title region: Alphanumeric (to capture "Overall Index")
-    - Other regions: Numeric only (0-9 and .)
-    - F and M regions: Special handling for small single-digit regions
+    Runs a job's regions through the shared OCR engine (see OCREngine.run) and records its
+    stage times (also into timings as 'ocr.<stage>', if given) and how many regions needed
+    more than the cheap OCR tier. Returns the OCRResult (texts with .confidences).
     """
-    results = {}
-    log("Starting EasyOCR Analysis...", "OCR")
-    
-    for region in CONFIG['regions']:
-        name, x, y, w, h = region['name'], region['x'], region['y'], region['width'], region['height']
-        is_title = "title" in name.lower()
-        is_single_digit = name.lower() in ['f', 'm']  # Special handling for F and M regions
-        
-        # 1. Take initial crop
-        roi_pil = screenshot.crop((x, y, x + w, y + h))
-        
-        # 2. Convert to Grayscale
-        gray_pil = roi_pil.convert('L')
-        
-        # 3. Resize based on region type
-        if is_single_digit:
-            # For F and M: use 10x upscale to help OCR recognize single digits
-            final_pil = gray_pil.resize((w * 10, h * 10), Image.Resampling.LANCZOS)
-        else:
-            # For other regions: use 3x upscale
-            final_pil = gray_pil.resize((w * 3, h * 3), Image.Resampling.LANCZOS)
-        
-        # 4. Contrast Enhancement (stronger for single digits)
-        enhancer = ImageEnhance.Contrast(final_pil)
-        if is_single_digit:
-            final_pil = enhancer.enhance(3.0)  # Higher contrast for small digits
-        else:
-            final_pil = enhancer.enhance(2.5)
-        
-        # 5. Save debug
-        debug_name = f"debug_{name.replace(' ', '_')}_{timestamp_str}.png"
-        debug_path = os.path.join(SCREENSHOT_DIR, debug_name)
-        final_pil.save(debug_path)
-        
-        # 6. Convert to format EasyOCR expects
-        img_np = np.array(final_pil)
-        
-        # 7. EasyOCR Recognition with dynamic allowlist
-        if is_title:
-            # For Title, we allow letters to capture "Overall Index"
-            ocr_results = READER.readtext(img_np, detail=0)
-            text = " ".join(ocr_results).strip()
-        elif is_single_digit:
-            # For F and M: use single digit allowlist with 10x upscale and contrast
-            ocr_results = READER.readtext(img_np, detail=0, allowlist='0123456789')
-            text = "".join(ocr_results).strip()
-        else:
-            # For data, we restrict to numbers and dots
-            ocr_results = READER.readtext(img_np, detail=0, allowlist='0123456789.')
-            text = "".join(ocr_results).strip()
-            text = text.replace(' ', '').replace(',', '.')
-             
-        log(f"OCR Result [{name}]: {text}", "OCR")
-        results[name] = text
-    
+    job_config = job_config or CONFIG
+    state = state or get_job_state(DEFAULT_JOB)
+    captured_at = datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
+    def debug_path(name):
+        return SCREENSHOTS.path_for(f"debug_{name.replace(' ', '_')}_{state.file_stem(timestamp_str)}", captured_at)
+    stage_times = {}
+    results = ENGINE.run(frame, job_config['regions'], job_config, os.path.dirname(__file__),
+                         debug_run=debug_run, debug_path=debug_path, slot_prefix=f"{state.name}:",
+                         stage_times=stage_times)
+    for stage, seconds in stage_times.items():
+        METRICS.timing(f"ocr.{stage}", seconds, job=state.name)
+        if timings is not None:
+            timings[f"ocr.{stage}"] = seconds
+    recognized = len(results) - len(results.cached)
+    if recognized:
+        METRICS.incr("ocr_regions", recognized, job=state.name)
+        METRICS.incr("ocr_escalations", len(results.escalated()), job=state.name)
     return results
 
-def cleanup_old_screenshots():
-    days = CONFIG.get('max_retention_days', 3)
-    cutoff = datetime.now() - timedelta(days=days)
-    log(f"Cleaning images older than {days} days...", "DEBUG")
-    count = 0
-    for f in os.listdir(SCREENSHOT_DIR):
-        file_path = os.path.join(SCREENSHOT_DIR, f)
-        if os.path.getmtime(file_path) < cutoff.timestamp():
-            os.remove(file_path)
-            count += 1
-    if count > 0: log(f"Deleted {count} old screenshots.", "SUCCESS")
-
-def job(is_test=False, override_hour=None):
-    global CONFIG, SESSION_HWND
+# --- Job Pipeline: capture -> OCR -> deliver ---
+PIPELINE = None
+
+def capture_stage(run):
+    """Activates the job's window, grabs the frame and releases the window right away."""
+    global CONFIG
     log("="*40, "INFO")
-    log("Starting scheduled job...", "ACTION")
-    
+    log(f"Starting scheduled job '{run.name}'...", "ACTION")
+    CONFIG = load_config()
+    run.job_config = load_jobs(CONFIG)[run.name]
+    SCREENSHOTS.update_limits(CONFIG.get('max_retention_days', 3), CONFIG.get('screenshots'))
+
+    window_title = run.job_config.get('window_title')
+    backend = get_capture_backend(run.job_config, run.state)
+    readiness = readiness_settings(run.job_config)
+    adaptive = readiness['mode'] == 'adaptive'
+    if backend.needs_window:
+        with METRICS.timer("window.activate", job=run.name):
+            activated = activate_window(window_title, keep_on_top=True, state=run.state, settle=not adaptive)
+        if not activated:
+            log("Window activation failed. Skipping this capture attempt.", "ERROR")
+            METRICS.incr("window_failures", job=run.name)
+            run.error = "window activation failed"
+            return False
+        if not adaptive:
+            with METRICS.timer("capture.delay", job=run.name):
+                time.sleep(run.job_config.get('capture_delay_seconds', 1))
+    if adaptive:
+        # Capture as soon as the dashboard stops changing
+        t = time.perf_counter()
+        ready, previews, diff = wait_until_ready(backend, run.job_config['regions'], run.state.hwnd, readiness)
+        elapsed = time.perf_counter() - t
+        METRICS.timing("capture.ready", elapsed, job=run.name, ready=ready, previews=previews)
+        if ready:
+            log(f"Window ready after {elapsed:.2f}s ({previews} previews).", "DEBUG")
+        else:
+            METRICS.incr("readiness_timeouts", job=run.name)
+            log(f"Window still changing after {readiness['timeout_seconds']}s "
+                f"(last difference {diff if diff is None else round(diff, 1)}). Capturing anyway.", "WARNING")
+    with METRICS.timer("capture.grab", job=run.name, backend=backend.name):
+        run.frame = backend.grab(run.job_config['regions'], hwnd=run.state.hwnd)
+    log(f"Captured {run.frame.image.size[0]}x{run.frame.image.size[1]} frame via '{backend.name}' backend.", "DEBUG")
+
+    # Immediately reset topmost to avoid annoying the user
+    if backend.needs_window:
+        reset_window_topmost(window_title, run.state.hwnd)
+
+    captured_at = datetime.now()
+    run.captured_at = captured_at.timestamp()
+    run.ts = captured_at.strftime("%Y%m%d_%H%M%S")
+    # The full screenshot is archived in the background while OCR runs (every run unless
+    # debug_images mode is 'off'), with its screen origin in the manifest so replays crop
+    # the regions at the same spot. Dropped rather than waited for when the writer is
+    # backed up, so a slow disk never stalls the capture stage.
+    run.debug_run = DEBUG_WRITER.begin_run(run.job_config.get('debug_images', {}))
+    if run.debug_run.mode != "off":
+        DEBUG_WRITER.submit(run.frame.image, SCREENSHOTS.path_for(f"full_{run.state.file_stem(run.ts)}", captured_at),
+                            run.debug_run.settings, meta={"origin": list(run.frame.origin)})
+    return run
+
+def ocr_stage(run):
+    """OCR of the captured frame, then validation and caption (per job 'validation' and 'caption')."""
+    ocr_res = perform_ocr(run.frame, run.ts, run.debug_run, run.job_config, run.state, run.timings)
+    run.readings = ocr_res
     try:
-        CONFIG = load_config()
-        cleanup_old_screenshots()
-        
-        window_title = CONFIG.get('window_title')
-        if activate_window(window_title, keep_on_top=True):
-            time.sleep(CONFIG.get('capture_delay_seconds', 1))
-            screenshot = pyautogui.screenshot()
-            
-            # Immediately reset topmost to avoid annoying the user
-            reset_window_topmost(window_title)
-            
-            ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-            main_ss_path = os.path.join(SCREENSHOT_DIR, f"full_{ts}.png")
-            screenshot.save(main_ss_path)
-            
-            ocr_res = perform_ocr(screenshot, ts)
-            
-            # --- Validation Logic ---
-            title_text = ocr_res.get("Title", "").lower()
-            dc = ocr_res.get("DC", "").strip()
-            aws = ocr_res.get("AWS", "").strip()
-            tap = ocr_res.get("TAP", "").strip()
-            f = ocr_res.get("F", "").strip()
-            m = ocr_res.get("M", "").strip()
-
-            # 1. Validate Title
-            if "overall index" not in title_text:
-                log(f"Stop sending: 'Overall Index' not found in Title (found '{title_text}').", "ERROR")
-                log("Screenshot is incorrect. Clearing saved window to reselect on next attempt.", "WARNING")
-                SESSION_HWND = None
-                return False
-
-            # 2. Validate Data Values (DC, AWS, TAP)
-            if not dc or not aws or not tap:
-                log(f"Stop sending: Missing or unrecognized data (DC='{dc}', AWS='{aws}', TAP='{tap}').", "ERROR")
-                log("One or more values could not be identified. Clearing saved window to reselect on next attempt.", "WARNING")
-                SESSION_HWND = None
-                return False
+        with METRICS.timer("report.validate", job=run.name):
+            run.caption, run.fields = build_report(ocr_res, run.job_config, run.options)
+    except ValidationError as e:
+        METRICS.incr("validation_failures", job=run.name)
+        run.error = str(e)
+        log(f"Stop sending: {e}", "ERROR")
+        log("Screenshot is incorrect. Clearing saved window to reselect on next attempt.", "WARNING")
+        run.state.hwnd = None
+        return False
 
-            # 3. Set default values for F and M (if not found, default to 0)
-            f_val = int(f) if f else 0
-            m_val = int(m) if m else 0
-            dc_val = int(dc) if dc else 0
-            active = dc_val - f_val - m_val
-
-            log(f"'Overall Index' and data values confirmed. Proceeding to send report...", "SUCCESS")
-            log(f"Calculated active devices: {active} (DC={dc_val}, F={f_val}, M={m_val})", "DEBUG")
-
-            # Format custom message
-            caption = (
-                f"BC BLĐ: Hiện tại {active} TB đang hoạt động, "
-                f"tốc độ gió {aws} m/s, "
-                f"công suất phát {tap} MW."
-            )
-
-            # Determine current hour (allow override for testing)
-            current_hour = override_hour if override_hour is not None else datetime.now().hour
-
-            # Additional logic for 22h report
-            if current_hour == 22:
-                deg = ocr_res.get("DEG", "").strip()
-                if not deg:
-                    log("Stop sending: 'DEG' value not found or empty at 22:00.", "ERROR")
-                    log("DEG is required for the 22:00 report. Clearing saved window to reselect.", "WARNING")
-                    SESSION_HWND = None
-                    return False
-                caption += f" Sản lượng đầu cực đến 22h đạt {deg} MWh."
-            
-            # Always send the report, even in test mode
-            client = WPPConnectClient(CONFIG['wpp_base_url'], CONFIG['wpp_session'], CONFIG['wpp_secret_key'])
-            if client.send_image(CONFIG['phone_number'], main_ss_path, caption):
-                if is_test:
-                    log(f"Test result sent via WhatsApp:\n{caption}", "DEBUG")
-                log("Job finished successfully.", "SUCCESS")
-                return True
-            else:
-                log("WhatsApp report delivery failed.", "ERROR")
-                return False
-        else:
-            log(f"Window activation failed. Skipping this capture attempt.", "ERROR")
+    log("Validation passed. Proceeding to send report...", "SUCCESS")
+    if 'active' in run.fields:
+        log(f"Calculated active devices: {run.fields['active']} "
+            f"(DC={run.fields['dc']}, F={run.fields['f']}, M={run.fields['m']})", "DEBUG")
+
+    # Validation passed: in 'failure' mode the debug crops are discarded
+    run.debug_run.finish(True)
+    return run
+
+def deliver_stage(run):
+    """Encodes the report image and hands the report to the durable outbox."""
+    # Always send the report, even in test mode (straight from memory)
+    report_settings = run.job_config.get('report_image', {})
+    crop_box = report_crop_box(report_settings, run.state.hwnd)
+    report_image = run.frame.crop_box(crop_box) if crop_box else run.frame.image
+    with METRICS.timer("report.encode", job=run.name):
+        payload = encode_image_payload(report_image, report_settings)
+    log(f"Report image encoded: {payload.image_size[0]}x{payload.image_size[1]} "
+        f"{payload.mime} ({len(payload.b64) * 3 / 4 / 1024:.0f} KiB)", "DEBUG")
+
+    # The delivery worker sends it and retries failed sends on its own,
+    # without another capture/OCR pass
+    sends = [(r['id'], recipient_caption(r, run.caption, run.fields)) for r in resolve_recipients(run.job_config)]
+    if run.is_test:
+        # One id per capture, so a retried test run is queued again instead of deduped
+        report_id = f"test_{run.name}_{run.ts}"
+    else:
+        # The hour of the scheduled slot (or of the capture), not of this queued stage:
+        # a 10:59 capture delivered at 11:00 must not take the 11:00 report's id
+        slot = run.slot or datetime.fromtimestamp(run.captured_at)
+        report_id = f"{run.name}_{slot.strftime('%Y%m%d_%H')}"
+    run.report_id, run.recipients = report_id, [recipient for recipient, _caption in sends]
+    outbox = get_outbox()
+    added = outbox.enqueue(report_id, payload, sends)
+    log(f"Report {report_id} queued for {added} recipient(s) ({len(sends) - added} already queued).", "ACTION")
+
+    if run.is_test:
+        wait_seconds = CONFIG.get('delivery', {}).get('test_wait_seconds', 120)
+        status = outbox.wait_for(report_id, wait_seconds)
+        if any(s != 'sent' for s in status.values()):
+            log(f"Test delivery incomplete: {status}", "ERROR")
             return False
-
-            
+        log(f"Test result sent via WhatsApp:\n{run.caption}", "DEBUG")
+    log(f"Job '{run.name}' finished successfully.", "SUCCESS")
+    return True
+
+def finish_run(run, result):
+    """Failed runs keep their debug crops (in 'failure' mode); every run goes into the history."""
+    if run.debug_run is not None:
+        run.debug_run.finish(result)
+    history = get_history()
+    if history is None:
+        return
+    readings = dict(run.readings or {})
+    if run.fields and 'active' in run.fields:
+        readings['active'] = run.fields['active']
+    valid = run.fields is not None
+    try:
+        history.record_run(run.name, run.captured_at or time.time(), valid, readings,
+                           confidences=getattr(run.readings, 'confidences', None), timings=run.timings,
+                           error=run.error or (None if result else "run failed"), report_id=run.report_id,
+                           recipients=run.recipients, is_test=run.is_test)
     except Exception as e:
-        log(f"Job failed: {e}", "ERROR")
-        return False
-    
-    return False
+        log(f"History write error: {e}", "WARNING")
+
+def get_pipeline():
+    """
+    Returns the job pipeline; queue capacities come from config 'pipeline', and its
+    'workers' entry sets worker threads per stage (e.g. {"ocr": 2} to OCR two frames at
+    once). Capture always has one worker: it needs the foreground window.
+    """
+    global PIPELINE
+    if PIPELINE is None:
+        settings = dict(CONFIG.get('pipeline') or {})
+        workers = settings.pop('workers', None) or {}
+        workers['capture'] = 1
+        PIPELINE = Pipeline([("capture", capture_stage), ("ocr", ocr_stage), ("deliver", deliver_stage)],
+                            log, settings, on_finish=finish_run, metrics=METRICS, workers=workers)
+    return PIPELINE
+
+def submit_job(is_test=False, options=None, name=DEFAULT_JOB, slot=None):
+    """
+    Queues one capture -> OCR -> validate -> deliver run of the named job and returns
+    a Future resolving to its success. options come from the schedule entry:
+    require_deg (fail without a DEG value) and caption_suffix (appended, formatted
+    with the report fields). slot: the entry's scheduled time, which names the report.
+    """
+    return get_pipeline().submit(name, name=name, is_test=is_test, options=options or {}, slot=slot,
+                                 state=get_job_state(name), debug_run=None, captured_at=None, readings=None,
+                                 fields=None, error=None, report_id=None, recipients=())
+
+def job(is_test=False, options=None, name=DEFAULT_JOB):
+    """Runs one job through the pipeline and waits for its result."""
+    return submit_job(is_test, options, name).result()
+
+def selected_jobs(jobs):
+    """Job names to run: the one given with --job NAME, otherwise all of them."""
+    if "--job" in sys.argv:
+        name = sys.argv[sys.argv.index("--job") + 1]
+        if name not in jobs:
+            raise SystemExit(f"Unknown job '{name}'. Configured jobs: {', '.join(jobs)}")
+        return [name]
+    return list(jobs)
 
 # --- Main Logic ---
 if __name__ == "__main__":
+    init_runtime()
+    # Load the OCR model in the background while the windows are selected and scheduled
+    ENGINE.start_warmup()
+    SCREENSHOTS.start()  # Migrates old flat screenshots, then prunes in the background
+    # Resume deliveries still pending from a previous run
+    get_outbox()
+    JOBS = load_jobs(CONFIG)
+    STARTUP_TIMINGS["main thread ready"] = time.perf_counter() - _T_START
+
     if "--test" in sys.argv:
         log("Running in NORMAL TEST mode with auto-retry...", "ACTION")
-        while True:
-            if job(is_test=True): break
-            log("Test run failed. Retrying in 10 seconds...", "WARNING")
-            time.sleep(10)
+        for name in selected_jobs(JOBS):
+            while True:
+                if job(is_test=True, name=name): break
+                log("Test run failed. Retrying in 10 seconds...", "WARNING")
+                time.sleep(10)
     elif "--test-22h" in sys.argv:
         log("Running in 22:00 TEST mode with auto-retry...", "ACTION")
-        while True:
-            if job(is_test=True, override_hour=22): break
-            log("Test run failed. Retrying in 10 seconds...", "WARNING")
-            time.sleep(10)
+        for name in selected_jobs(JOBS):
+            evening = next((e for e in load_schedule(JOBS[name], name) if e.options.get('require_deg')), None)
+            while True:
+                if job(is_test=True, options=evening.options if evening else {"require_deg": True}, name=name): break
+                log("Test run failed. Retrying in 10 seconds...", "WARNING")
+                time.sleep(10)
     else:
-        log("Bot started. Interactive setup...", "SUCCESS")
-        
-        # 1. Immediate setup: Ask user to select window
-        window_title = CONFIG.get('window_title')
-        activate_window(window_title)
+        log(f"Bot started with {len(JOBS)} job(s): {', '.join(JOBS)}. Interactive setup...", "SUCCESS")
         
-        def pick_next_run(hour_offset=0, force_random=True):
-            """Picks a random minute between 0-10 for the target hour."""
-            target_time = datetime.now() + timedelta(hours=hour_offset)
-            random_minute = random.randint(0, 10)
-            return target_time.replace(minute=random_minute, second=0, microsecond=0)
+        # 1. Immediate setup: Ask user to select each job's window
+        for name, job_config in JOBS.items():
+            activate_window(job_config.get('window_title'), state=get_job_state(name))
         
-        # 2. Determine first run (Random minute 0-10)
-        now = datetime.now()
-        if now.minute < 10:
-            # Pick a minute between now+1 and 10
-            start_min = now.minute + 1
-            random_minute = random.randint(start_min, 10)
-            next_run = now.replace(minute=random_minute, second=0, microsecond=0)
-        else:
-            # Too late for this hour, pick next hour (0-10)
-            next_run = pick_next_run(1)
-
-        log(f"First run scheduled at: {next_run.strftime('%H:%M:%S')}", "INFO")
-
-        while True:
-            now = datetime.now()
-            if now >= next_run:
-                success = job()
-                
-                if success:
-                    # Successful run, schedule for next hour
-                    next_run = pick_next_run(1)
-                    log(f"Success! Next scheduled run at: {next_run.strftime('%H:%M:%S')}", "SUCCESS")
-                else:
-                    # Failed (Window missing or OCR error), retry in 5 minutes
-                    next_run = now + timedelta(minutes=5)
-                    log(f"Job failed (Window missing or OCR error). Retrying in 5 minutes at: {next_run.strftime('%H:%M:%S')}", "WARNING")
-            
-            # Sleep 30 seconds between checks
-            time.sleep(30)
+        # 2. Event-driven scheduling: sleeps until the next due entry, retries per entry.
+        # Due runs are handed to the pipeline; captures happen one at a time on its
+        # capture stage (window activation needs the foreground) and overlap the
+        # previous frame's OCR and delivery.
+        entries = [entry for name, job_config in JOBS.items() for entry in load_schedule(job_config, name)]
+        scheduler = Scheduler(entries, lambda entry: submit_job(options=entry.options, name=entry.job,
+                                                                slot=entry.slot_for(datetime.now())),
+                              log, metrics=METRICS)
+        scheduler.schedule_initial()
+        scheduler.run_forever()
@@ -0,0 +1,126 @@
+import os
+import json
+import math
+import time
+import threading
+import contextlib
+from collections import deque
+from logs import RotatingJSONL
+
+# --- Run Metrics ---
+# Timers around every stage of a run (window activation and its fixed sleeps, capture,
+# preprocessing, recognition, validation, encoding, debug image saves, uploads) and
+# counters for retries and failures. Each measurement is appended as one JSON line to
+# a size-rotated file (metrics.jsonl, metrics.jsonl.1, ...) that dashboard.py reads.
+
+DEFAULT_SETTINGS = {"enabled": True, "path": "metrics.jsonl", "max_bytes": 2_000_000, "backups": 3}
+
+
+def resolve_path(settings, base_dir):
+    s = dict(DEFAULT_SETTINGS)
+    s.update(settings or {})
+    return s['path'] if os.path.isabs(s['path']) else os.path.join(base_dir, s['path'])
+
+
+class Metrics:
+    """
+    Thread-safe metrics recorder. Records are {"ts", "kind": "timing", "stage", "ms", ...tags}
+    or {"ts", "kind": "counter", "name", "n", ...tags}. With path=None nothing is written
+    (the in-memory totals still work).
+    """
+
+    def __init__(self, path=None, max_bytes=2_000_000, backups=3, logger=None):
+        self.path = path
+        self.file = RotatingJSONL(path, max_bytes, backups) if path else None
+        self.log = logger or (lambda message, type="INFO": print(message))
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings, base_dir, logger=None):
+        s = dict(DEFAULT_SETTINGS)
+        s.update(settings or {})
+        path = resolve_path(s, base_dir) if s['enabled'] else None
+        return cls(path, s['max_bytes'], s['backups'], logger)
+
+    def _write(self, record):
+        if self.file is None:
+            return
+        try:
+            self.file.write_lines([json.dumps(record, ensure_ascii=False) + "\n"])
+        except OSError as e:
+            self.log(f"Metrics write error: {e}", "DEBUG")
+
+    def timing(self, stage, seconds, **tags):
+        self._write({"ts": time.time(), "kind": "timing", "stage": stage, "ms": round(seconds * 1000, 3), **tags})
+
+    @contextlib.contextmanager
+    def timer(self, stage, **tags):
+        """Times the with-block; failed blocks are recorded with ok=false."""
+        start = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            self.timing(stage, time.perf_counter() - start, ok=ok, **tags)
+
+    def incr(self, name, n=1, **tags):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        self._write({"ts": time.time(), "kind": "counter", "name": name, "n": n, **tags})
+
+
+# --- Reading (dashboard) ---
+def read_records(path, since=None, backups=3):
+    """Yields the records of the rotated files, oldest file first, newer than since (epoch)."""
+    files = [f"{path}.{i}" for i in range(backups, 0, -1)] + [path]
+    for file_path in files:
+        if not os.path.exists(file_path):
+            continue
+        # Skip whole rotated files that end before the window
+        if since is not None and os.path.getmtime(file_path) < since:
+            continue
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Partially written last line
+                if since is None or record.get('ts', 0) >= since:
+                    yield record
+
+
+def _percentile(ordered, p):
+    return ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1] if ordered else 0.0
+
+
+def aggregate(records, recent=20):
+    """
+    Summary for the metrics endpoint: per-stage count/mean/p50/p95/max/last in ms,
+    counter totals, and the most recent job runs.
+    """
+    stages, counters = {}, {}
+    runs = deque(maxlen=recent)
+    for record in records:
+        if record.get('kind') == 'timing':
+            stages.setdefault(record['stage'], []).append(record['ms'])
+            if record['stage'] == 'job.total':
+                runs.append(record)
+        elif record.get('kind') == 'counter':
+            counters[record['name']] = counters.get(record['name'], 0) + record.get('n', 1)
+
+    summary = {}
+    for stage, values in sorted(stages.items()):
+        ordered = sorted(values)
+        summary[stage] = {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 3),
+            "p50": _percentile(ordered, 50),
+            "p95": _percentile(ordered, 95),
+            "max": ordered[-1],
+            "last": values[-1],
+        }
+    return {"stages": summary, "counters": counters, "recent_runs": list(runs)}
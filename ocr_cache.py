@@ -0,0 +1,90 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class OCRCache:
+    """
+    Bounded LRU cache of OCR text, keyed by a fingerprint of a region's raw crop
+    pixels plus the preprocessing/recognition parameters applied to it.
+    Identical crops then cost a hash lookup instead of a neural-net inference.
+    """
+
+    def __init__(self, max_entries=512, persist_path=None):
+        self.max_entries = max(1, int(max_entries))
+        self.persist_path = persist_path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._dirty = False
+        self._lock = threading.Lock()
+        if persist_path:
+            self.load()
+
+    @staticmethod
+    def fingerprint(image, params):
+        """Hash of a PIL crop's pixels and the parameters that turn it into text."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{image.mode}:{image.size[0]}x{image.size[1]}|".encode())
+        h.update(json.dumps(params, sort_keys=True).encode())
+        h.update(image.tobytes())
+        return h.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    def load(self):
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+        except (OSError, ValueError):
+            return  # A corrupt cache file is simply rebuilt
+        with self._lock:
+            # Stored oldest-first, so the LRU order survives a restart
+            for key, entry in items[-self.max_entries:]:
+                # Bare strings are entries from before the tiered engine ([text, confidence, tier])
+                if isinstance(entry, list):
+                    self._entries[key] = entry
+
+    def save(self):
+        """Writes the cache to disk (atomically) if it changed since the last save."""
+        if not self.persist_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            items = list(self._entries.items())
+            self._dirty = False
+        tmp_path = self.persist_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(items, f, ensure_ascii=False)
+        os.replace(tmp_path, self.persist_path)
@@ -0,0 +1,398 @@
+import os
+import re
+import time
+import threading
+import numpy as np
+from PIL import Image
+from ocr_cache import OCRCache
+from report import validation_settings
+from capture import Frame
+from preprocess import Preprocessor, resolve_profile
+from ocr_pool import OCRPool
+
+# --- Shared OCR Engine ---
+# One EasyOCR Reader, preprocessing engine and result cache per process. Every job
+# (one per monitored dashboard) runs its regions through the same warm engine, so
+# adding a plant costs a few crops per run instead of another model in memory.
+#
+# Recognition is tiered: every region first goes through a cheap pass (small upscale,
+# no contrast step). Only regions whose confidence is below their threshold, or whose
+# text fails the region's format check, are preprocessed again with the region's full
+# profile and then with alternative binarizations, until one is accepted.
+
+DEFAULT_TIERS = {
+    "enabled": True,
+    # Cheap first pass, overlaid on each region's profile
+    "fast": {"scale": 2, "contrast": None, "resampler": "bilinear"},
+    # Escalation steps, each overlaid on the region's full profile ({} = the profile itself)
+    "escalate": [{}, {"threshold": "otsu"}],
+    "min_confidence": 0.6,  # Regions may override it with 'min_confidence'
+}
+
+
+class OCRResult(dict):
+    """
+    {region name: text} of one run. confidences: {name: 0..1}; tiers: {name: index of
+    the tier that produced the text (0 = cheap pass)}; cached: names answered from the cache.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.confidences = {}
+        self.tiers = {}
+        self.cached = set()
+
+    def escalated(self):
+        """Regions recognized in this run that needed more than the cheap pass."""
+        return [name for name, tier in self.tiers.items() if tier > 0 and name not in self.cached]
+
+
+def tier_settings(config):
+    """The job's 'ocr_tiers' settings merged over DEFAULT_TIERS."""
+    s = dict(DEFAULT_TIERS)
+    s.update(config.get('ocr_tiers') or {})
+    return s
+
+
+def region_tiers(region, profile, tiers):
+    """Preprocessing profiles to try for a region, cheapest first."""
+    if not tiers['enabled']:
+        return [profile]
+    fast = dict(profile)
+    fast.update(tiers['fast'])
+    fast.update(region.get('fast_preprocess', {}))
+    steps = [fast]
+    for overrides in tiers['escalate']:
+        step = dict(profile)
+        step.update(overrides)
+        if step not in steps:
+            steps.append(step)
+    return steps
+
+
+def region_allowlist(region):
+    """Returns the recognizer allowlist for a region (None = any character)."""
+    if 'allowlist' in region:
+        return region['allowlist'] or None
+    name = region['name'].lower()
+    if "title" in name:
+        return None  # Title needs letters to capture "Overall Index"
+    if name in ['f', 'm']:
+        return '0123456789'
+    return '0123456789.'
+
+
+def region_pattern(region, allowlist, validation=None):
+    """
+    Format check for a region's text: its 'pattern' (a regex), else one derived from the
+    allowlist, or for the validated title region from its 'title_contains' text.
+    Other free-text regions must set a 'pattern'.
+    """
+    if region.get('pattern'):
+        return re.compile(region['pattern'])
+    if allowlist == '0123456789':
+        return re.compile(r"\d+")
+    if allowlist == '0123456789.':
+        return re.compile(r"\d+(\.\d+)?")
+    validation = validation or {}
+    if region['name'] == validation.get('title_region') and validation.get('title_contains'):
+        return re.compile(f".*{re.escape(validation['title_contains'])}.*", re.IGNORECASE | re.DOTALL)
+    raise ValueError(f"Region '{region['name']}' reads free text; set a 'pattern' for it.")
+
+
+def clean_text(text, allowlist):
+    text = text.strip()
+    if allowlist and '.' in allowlist:
+        # For data, we restrict to numbers and dots
+        text = text.replace(' ', '').replace(',', '.')
+    return text
+
+
+def recognize_batched(crops, reader):
+    """
+    Recognizer-only OCR pass over already-preprocessed crops.
+    The region boxes come from config, so EasyOCR's CRAFT text detector is skipped:
+    crops sharing an allowlist are stacked onto one canvas and sent through a single
+    reader.recognize call with one box per crop.
+    crops: list of (name, img_np, allowlist). Returns {name: (text, confidence)}.
+    """
+    groups = {}
+    for name, img_np, allowlist in crops:
+        groups.setdefault(allowlist, []).append((name, img_np))
+
+    texts = {}
+    for allowlist, items in groups.items():
+        width = max(img.shape[1] for _, img in items)
+        height = sum(img.shape[0] for _, img in items)
+        canvas = np.full((height, width), 255, dtype=np.uint8)
+
+        # Stack crops vertically; each crop's top row identifies it in the results
+        boxes, name_by_top, top = [], {}, 0
+        for name, img in items:
+            h, w = img.shape[:2]
+            canvas[top:top + h, :w] = img
+            boxes.append([0, w, top, top + h])
+            name_by_top[top] = name
+            top += h
+
+        ocr_results = reader.recognize(canvas, horizontal_list=boxes, free_list=[],
+                                      allowlist=allowlist, batch_size=len(boxes), detail=1)
+        for box, text, conf in ocr_results:
+            name = name_by_top.get(int(box[0][1]))
+            if name is not None:
+                texts[name] = (text, float(conf))
+    return texts
+
+
+def recognize_detect(crops, reader):
+    """
+    Full readtext (detection + recognition) per crop. The pieces found in a crop are
+    joined; its confidence is the lowest piece's (0 when nothing was found).
+    crops: list of (name, img_np, allowlist). Returns {name: (text, confidence)}.
+    """
+    texts = {}
+    for name, img_np, allowlist in crops:
+        ocr_results = reader.readtext(img_np, detail=1, allowlist=allowlist)
+        text = (" " if allowlist is None else "").join(piece for _, piece, _ in ocr_results)
+        texts[name] = (text, min((float(conf) for _, _, conf in ocr_results), default=0.0))
+    return texts
+
+
+class OCREngine:
+    """
+    Process-wide EasyOCR Reader (built on a background thread), preprocessor and
+    OCR result cache. timings: optional dict receiving warm-up durations;
+    on_ready: optional callback run once the Reader has been built.
+    pool_settings ('ocr_pool' config): workers > 0 recognizes in a pool of worker
+    processes instead of the in-process Reader; torch_threads limits torch's
+    intra-op threads (per worker in pool mode).
+    """
+
+    def __init__(self, logger=None, timings=None, on_ready=None, pool_settings=None):
+        self.log = logger or (lambda message, type="INFO": print(message))
+        self.timings = timings if timings is not None else {}
+        self.on_ready = on_ready
+        self.preprocessor = Preprocessor()
+        self.reader = None
+        self.cache = None
+        pool_settings = pool_settings or {}
+        self.torch_threads = pool_settings.get('torch_threads')
+        self.pool = None
+        if pool_settings.get('workers', 0) > 0:
+            self.pool = OCRPool(pool_settings['workers'], self.torch_threads, logger=self.log)
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._error = None
+
+    # --- Reader warm-up ---
+    def _warm_up(self):
+        try:
+            if self.pool is not None:
+                t = time.perf_counter()
+                self.pool.start()
+                self.timings["start OCR worker pool"] = time.perf_counter() - t
+                if self.on_ready:
+                    self.on_ready()
+                return
+
+            t = time.perf_counter()
+            import easyocr
+            self.timings["import easyocr/torch"] = time.perf_counter() - t
+            if self.torch_threads:
+                import torch
+                torch.set_num_threads(int(self.torch_threads))
+
+            t = time.perf_counter()
+            self.reader = easyocr.Reader(['en'], gpu=False) # Keep gpu=False for compatibility
+            self.timings["build EasyOCR Reader"] = time.perf_counter() - t
+            self.log("EasyOCR Reader ready.", "OCR")
+            if self.on_ready:
+                self.on_ready()
+        except Exception as e:
+            self._error = e
+            self.log(f"EasyOCR initialization failed: {e}", "ERROR")
+        finally:
+            self._ready.set()
+
+    def start_warmup(self):
+        """Starts building the EasyOCR Reader on a background thread (no-op if already started)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.log("Initializing EasyOCR Reader (English) in background...", "OCR")
+            self._thread = threading.Thread(target=self._warm_up, name="ocr-warmup", daemon=True)
+            self._thread.start()
+
+    def get_reader(self):
+        """Returns the shared Reader, waiting for the background warm-up only if it is still running."""
+        self.start_warmup()
+        if not self._ready.is_set():
+            self.log("Waiting for EasyOCR Reader to finish loading...", "OCR")
+            t = time.perf_counter()
+            self._ready.wait()
+            self.timings["wait for Reader (first OCR)"] = time.perf_counter() - t
+        if self.reader is None:
+            error = self._error
+            # Allow the next job to retry the initialization
+            with self._lock:
+                self._thread, self._error = None, None
+                self._ready.clear()
+            raise RuntimeError(f"EasyOCR Reader unavailable: {error}")
+        return self.reader
+
+    # --- Result cache ---
+    def get_cache(self, settings, base_dir):
+        """Returns the shared OCR result cache, or None when disabled in 'ocr_cache' settings."""
+        settings = settings or {}
+        if not settings.get('enabled', True):
+            return None
+        if self.cache is None:
+            path = settings.get('path', 'ocr_cache.json') if settings.get('persist', False) else None
+            if path and not os.path.isabs(path):
+                path = os.path.join(base_dir, path)
+            self.cache = OCRCache(settings.get('max_entries', 512), path)
+        return self.cache
+
+    # --- Recognition ---
+    def recognize(self, prepared, batched=True):
+        """prepared: list of (name, img_np, allowlist) -> {name: (text, confidence)}."""
+        if not prepared:
+            return {}
+        if self.pool is not None:
+            return self.pool.recognize(prepared, batched)
+        reader = self.get_reader()
+        return recognize_batched(prepared, reader) if batched else recognize_detect(prepared, reader)
+
+    def run(self, frame, regions, config, base_dir, debug_run=None, debug_path=None, slot_prefix="",
+            stage_times=None):
+        """
+        EasyOCR Implementation with conditional allowlist:
+        - Title region: Alphanumeric (to capture "Overall Index")
+        - Other regions: Numeric only (0-9 and .)
+        - Preprocessing (scale, contrast, threshold, resampler) comes from each region's
+          profile in config 'preprocess_profiles' (F and M default to the 'digit' profile)
+        - Tiers ('ocr_tiers'): a cheap pass first; regions below their confidence threshold
+          or failing their format check are retried with the heavier profiles
+        ocr_mode 'batched' (default) runs the recognizer only, once per allowlist group;
+        ocr_mode 'detect' runs full readtext (detection + recognition) per region.
+        Regions whose crop pixels were already seen are answered from the OCR cache.
+        frame: a capture.Frame (a bare PIL image is treated as a full screen at 0,0).
+        debug_run: optional debug_writer.DebugRun collecting the preprocessed crops
+        (of the tier whose text was kept), written to debug_path(region name).
+        slot_prefix keeps preprocessing buffers of different jobs apart.
+        stage_times: optional dict receiving the 'preprocess' and 'recognize' seconds
+        (all tiers) and 'escalate' (tiers after the first).
+        Returns an OCRResult.
+        """
+        if not isinstance(frame, Frame):
+            frame = Frame(frame)
+        results = OCRResult()
+        ocr_mode = config.get('ocr_mode', 'batched')
+        batched = ocr_mode == 'batched'
+        cache = self.get_cache(config.get('ocr_cache'), base_dir)
+        tiers = tier_settings(config)
+        validation = validation_settings(config)
+        self.log(f"Starting EasyOCR Analysis ({'batched recognizer' if batched else 'per-region detect'})...", "OCR")
+
+        t = time.perf_counter()
+        pending = {}  # name -> (crop, allowlist, profiles per tier, pattern, min confidence)
+        found = {}    # name -> (text, confidence, tier)
+        cache_keys = {}
+        profiles = config.get('preprocess_profiles', {})
+        for region in regions:
+            name = region['name']
+            allowlist = region_allowlist(region)
+            steps = region_tiers(region, resolve_profile(region, profiles), tiers)
+            pattern = region_pattern(region, allowlist, validation)
+            min_confidence = region.get('min_confidence', tiers['min_confidence'])
+
+            # 1. Take initial crop
+            roi_pil = frame.crop_region(region)
+
+            # 2. Skip preprocessing and OCR entirely for unchanged pixels
+            if cache is not None:
+                key = cache.fingerprint(roi_pil, {"tiers": steps, "allowlist": allowlist, "ocr_mode": ocr_mode,
+                                                  "pattern": pattern.pattern, "min_confidence": min_confidence})
+                hit = cache.get(key)
+                if isinstance(hit, list):
+                    found[name] = tuple(hit)
+                    results.cached.add(name)
+                    continue
+                cache_keys[name] = key
+            pending[name] = (roi_pil, allowlist, steps, pattern, min_confidence)
+        preprocess_time, recognize_time, escalate_time = time.perf_counter() - t, 0.0, 0.0
+
+        # 3. Cheap tier for every region, then heavier tiers for the ones not yet accepted
+        best = {}  # name -> ((accepted, format ok, confidence), text, tier)
+        debug_images = {}
+        for tier in range(max((len(p[2]) for p in pending.values()), default=0)):
+            todo = [name for name, p in pending.items()
+                    if tier < len(p[2]) and not (name in best and best[name][0][0])]
+            if not todo:
+                break
+            tier_start = t = time.perf_counter()
+            prepared = []
+            for name in todo:
+                roi_pil, allowlist, steps, _pattern, _min = pending[name]
+                # Grayscale -> resize -> contrast -> threshold per the tier's profile
+                img_np = self.preprocessor.run(roi_pil, steps[tier], slot=slot_prefix + name)
+                prepared.append((name, img_np, allowlist))
+            preprocess_time += time.perf_counter() - t
+
+            # EasyOCR Recognition with dynamic allowlist (only for cache misses)
+            t = time.perf_counter()
+            raw = self.recognize(prepared, batched)
+            recognize_time += time.perf_counter() - t
+
+            for name, img_np, allowlist in prepared:
+                _roi, _allowlist, _steps, pattern, min_confidence = pending[name]
+                text, confidence = raw.get(name, ("", 0.0))
+                text = clean_text(text, allowlist)
+                format_ok = pattern.fullmatch(text) is not None
+                rank = (format_ok and confidence >= min_confidence, format_ok, confidence)
+                if name not in best or rank > best[name][0]:
+                    best[name] = (rank, text, tier)
+                    if debug_run is not None and debug_path is not None:
+                        debug_images[name] = img_np.copy()
+            if tier > 0:
+                escalate_time += time.perf_counter() - tier_start
+                self.log(f"OCR tier {tier}: retried {', '.join(todo)}", "DEBUG")
+
+        if stage_times is not None:
+            stage_times['preprocess'] = preprocess_time
+            stage_times['recognize'] = recognize_time
+            if escalate_time:
+                stage_times['escalate'] = escalate_time
+
+        for name, ((accepted, _format_ok, confidence), text, tier) in best.items():
+            found[name] = (text, confidence, tier)
+            # Rejected readings are not cached, so the next capture gets another try
+            if accepted and name in cache_keys:
+                cache.put(cache_keys[name], [text, confidence, tier])
+            if not accepted and tiers['enabled']:
+                self.log(f"OCR [{name}]: no tier passed the confidence/format check, keeping '{text}'", "WARNING")
+
+        # 4. Queue debug images (written in the background, per debug_images mode)
+        for name, image in debug_images.items():
+            debug_run.add(Image.fromarray(image), debug_path(name))
+
+        for region in regions:
+            name = region['name']
+            text, confidence, tier = found[name]
+            results[name], results.confidences[name], results.tiers[name] = text, confidence, tier
+            source = ", cached" if name in results.cached else f", tier {tier}" if tier else ""
+            self.log(f"OCR Result [{name}]: {text} ({confidence:.2f}{source})", "OCR")
+        if pending:
+            self.log(f"OCR tiers: {len(pending) - len(results.escalated())}/{len(pending)} region(s) "
+                     f"settled on the cheap pass", "DEBUG")
+
+        if cache is not None:
+            stats = cache.stats()
+            self.log(f"OCR cache: {stats['hits']} hits / {stats['misses']} misses ({stats['size']} entries)", "DEBUG")
+            try:
+                cache.save()
+            except OSError as e:
+                self.log(f"OCR cache save error: {e}", "DEBUG")
+
+        return results
@@ -0,0 +1,134 @@
+import os
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+# --- OCR Worker Pool ---
+# Optional multi-process recognition. Each worker process builds its own EasyOCR
+# Reader once (in the pool initializer) with torch limited to a share of the cores,
+# and a run's preprocessed crops are spread across the workers. The crops are
+# written once into a shared memory block; workers read them through NumPy views
+# instead of receiving pickled copies.
+
+_READER = None  # The worker process's own Reader
+
+
+def _init_worker(torch_threads):
+    global _READER
+    # Must be set before torch creates its thread pools
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    os.environ["MKL_NUM_THREADS"] = str(torch_threads)
+    import torch
+    torch.set_num_threads(torch_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Already fixed by an earlier parallel call
+    import easyocr
+    _READER = easyocr.Reader(['en'], gpu=False)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _attach(name):
+    """Opens the parent's block without taking ownership (the parent unlinks it)."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _recognize_chunk(shm_name, items, batched):
+    """
+    Worker side: recognizes the crops described by items [(name, offset, shape, allowlist)].
+    Returns {name: (text, confidence)}.
+    """
+    from ocr_engine import recognize_batched, recognize_detect
+    shm = _attach(shm_name)
+    crops = []
+    try:
+        crops = [(name, np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset), allowlist)
+                 for name, offset, shape, allowlist in items]
+        return recognize_batched(crops, _READER) if batched else recognize_detect(crops, _READER)
+    finally:
+        del crops  # Views must be released before the block is closed
+        shm.close()
+
+
+def split_balanced(crops, parts):
+    """Splits crops into at most parts chunks of similar total pixel count (largest first)."""
+    chunks = [[] for _ in range(max(1, min(parts, len(crops))))]
+    loads = [0] * len(chunks)
+    for crop in sorted(crops, key=lambda c: c[1].size, reverse=True):
+        i = loads.index(min(loads))
+        chunks[i].append(crop)
+        loads[i] += crop[1].size
+    return chunks
+
+
+class OCRPool:
+    """
+    Process pool of EasyOCR workers. torch_threads defaults to an equal share of the
+    CPU cores per worker, so the workers together do not oversubscribe the machine.
+    """
+
+    def __init__(self, workers, torch_threads=None, logger=None):
+        self.workers = max(1, int(workers))
+        self.torch_threads = int(torch_threads or max(1, (os.cpu_count() or 1) // self.workers))
+        self.log = logger or (lambda message, type="INFO": print(message))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Starts the workers and waits until every one has built its Reader. Returns the executor."""
+        with self._lock:
+            if self._executor is None:
+                self.log(f"Starting {self.workers} OCR worker process(es) "
+                         f"({self.torch_threads} torch thread(s) each)...", "OCR")
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                     initargs=(self.torch_threads,))
+            executor = self._executor
+        pids = {f.result() for f in [executor.submit(_ping) for _ in range(self.workers)]}
+        self.log(f"OCR worker pool ready ({len(pids)} process(es) warmed up).", "OCR")
+        return executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def recognize(self, crops, batched=True):
+        """crops: list of (name, img_np, allowlist) -> {name: (text, confidence)}, spread across the workers."""
+        executor = self._executor or self.start()
+        chunks = split_balanced(crops, self.workers)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, sum(img.nbytes for _, img, _ in crops)))
+        try:
+            futures, offset = [], 0
+            for chunk in chunks:
+                items = []
+                for name, img_np, allowlist in chunk:
+                    view = np.ndarray(img_np.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+                    view[...] = img_np
+                    del view
+                    items.append((name, offset, img_np.shape, allowlist))
+                    offset += img_np.nbytes
+                futures.append(executor.submit(_recognize_chunk, shm.name, items, batched))
+            texts = {}
+            for future in futures:
+                texts.update(future.result())
+            return texts
+        except Exception:
+            # A crashed worker breaks the pool; the next run starts a fresh one
+            self.shutdown()
+            raise
+        finally:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,276 @@
+import os
+import time
+import random
+import sqlite3
+import threading
+import contextlib
+from wpp_client import ImagePayload, send_concurrently
+
+# --- Durable Outbound Delivery Queue ---
+# job() stores each validated report here (encoded image + per-recipient captions) and
+# returns; a background worker delivers it, retrying failed sends with exponential
+# backoff and jitter. Pending deliveries survive restarts, and a failed send never
+# costs another window capture or OCR pass. Reports still undelivered max_age_seconds
+# after they were queued are given up, so an hourly report is never sent hours late.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_id TEXT PRIMARY KEY,
+    mime TEXT NOT NULL,
+    b64 BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    report_id TEXT NOT NULL REFERENCES reports(report_id),
+    recipient TEXT NOT NULL,
+    caption TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    delivered_at REAL,
+    UNIQUE (report_id, recipient)
+);
+CREATE INDEX IF NOT EXISTS idx_deliveries_due ON deliveries (status, next_attempt_at);
+"""
+
+DEFAULT_SETTINGS = {
+    "path": "outbox.db",
+    "max_attempts": 20,
+    "base_backoff_seconds": 15,
+    "max_backoff_seconds": 900,
+    "max_age_seconds": 3600,  # Give up on deliveries queued longer ago (0 = never)
+    "retention_days": 7,
+    "prune_interval_seconds": 3600,
+}
+
+
+def backoff_delay(attempts, base, cap):
+    """Exponential backoff with 'equal jitter': half fixed, half random."""
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class Outbox:
+    def __init__(self, path, max_attempts=20, base_backoff=15, max_backoff=900, retention_days=7, max_age=3600,
+                 prune_interval=3600):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retention_days = retention_days
+        self.max_age = max_age
+        self.prune_interval = prune_interval
+        self.wake = threading.Event()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @classmethod
+    def from_settings(cls, settings, base_dir):
+        s = dict(DEFAULT_SETTINGS)
+        s.update(settings or {})
+        path = s['path'] if os.path.isabs(s['path']) else os.path.join(base_dir, s['path'])
+        return cls(path, s['max_attempts'], s['base_backoff_seconds'], s['max_backoff_seconds'],
+                   s['retention_days'], s['max_age_seconds'], s['prune_interval_seconds'])
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Short-lived connection per operation (safe across threads), committed on success."""
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def enqueue(self, report_id, payload, sends):
+        """
+        Stores a report and its (recipient, caption) deliveries. Deliveries already
+        queued for the same report id and recipient are ignored (dedupe).
+        Returns the number of newly queued deliveries.
+        """
+        now = time.time()
+        with self._connect() as db:
+            db.execute("INSERT OR IGNORE INTO reports (report_id, mime, b64, created_at) VALUES (?, ?, ?, ?)",
+                       (report_id, payload.mime, payload.b64, now))
+            added = 0
+            for recipient, caption in sends:
+                cur = db.execute(
+                    "INSERT OR IGNORE INTO deliveries (report_id, recipient, caption, next_attempt_at, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)", (report_id, recipient, caption, now, now))
+                added += cur.rowcount
+        self.wake.set()
+        return added
+
+    def due(self, limit=20):
+        with self._connect() as db:
+            return db.execute(
+                "SELECT id, report_id, recipient, caption, attempts, created_at FROM deliveries "
+                "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (time.time(), limit)).fetchall()
+
+    def next_due_at(self):
+        with self._connect() as db:
+            row = db.execute("SELECT MIN(next_attempt_at) FROM deliveries WHERE status = 'pending'").fetchone()
+        return row[0]
+
+    def load_payload(self, report_id):
+        with self._connect() as db:
+            row = db.execute("SELECT mime, b64 FROM reports WHERE report_id = ?", (report_id,)).fetchone()
+        return ImagePayload(row[0], bytes(row[1])) if row else None
+
+    def mark_sent(self, delivery_id):
+        with self._connect() as db:
+            db.execute("UPDATE deliveries SET status = 'sent', attempts = attempts + 1, delivered_at = ?, "
+                       "last_error = NULL WHERE id = ?", (time.time(), delivery_id))
+
+    def mark_failed(self, delivery_id, attempts, error, created_at=None):
+        """
+        Schedules a retry, or gives up after max_attempts or when the retry would fall
+        past max_age after created_at. Returns (new status, next attempt time).
+        """
+        attempts += 1
+        next_at = time.time() + backoff_delay(attempts, self.base_backoff, self.max_backoff)
+        too_old = self.max_age and created_at is not None and next_at > created_at + self.max_age
+        if attempts >= self.max_attempts or too_old:
+            status, next_at = 'failed', time.time()
+        else:
+            status = 'pending'
+        with self._connect() as db:
+            db.execute("UPDATE deliveries SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? "
+                       "WHERE id = ?", (status, attempts, next_at, error, delivery_id))
+        return status, next_at
+
+    def expire_stale(self):
+        """Gives up pending deliveries queued more than max_age ago. Returns their [(report_id, recipient)]."""
+        if not self.max_age:
+            return []
+        cutoff = time.time() - self.max_age
+        with self._connect() as db:
+            rows = db.execute("SELECT report_id, recipient FROM deliveries WHERE status = 'pending' AND created_at < ?",
+                              (cutoff,)).fetchall()
+            db.execute("UPDATE deliveries SET status = 'failed', last_error = ? WHERE status = 'pending' "
+                       "AND created_at < ?", (f"expired: not delivered within {self.max_age:.0f}s", cutoff))
+        return rows
+
+    def report_status(self, report_id):
+        """{recipient: status} for one report."""
+        with self._connect() as db:
+            rows = db.execute("SELECT recipient, status FROM deliveries WHERE report_id = ?", (report_id,)).fetchall()
+        return dict(rows)
+
+    def wait_for(self, report_id, timeout):
+        """Waits until no delivery of the report is pending. Returns its final {recipient: status}."""
+        deadline = time.monotonic() + timeout
+        while True:
+            status = self.report_status(report_id)
+            if 'pending' not in status.values() or time.monotonic() >= deadline:
+                return status
+            time.sleep(0.5)
+
+    def prune(self):
+        """Drops image blobs of old reports that have nothing left to deliver."""
+        cutoff = time.time() - self.retention_days * 86400
+        with self._connect() as db:
+            db.execute("DELETE FROM deliveries WHERE created_at < ? AND status != 'pending'", (cutoff,))
+            db.execute("DELETE FROM reports WHERE created_at < ? AND report_id NOT IN "
+                       "(SELECT report_id FROM deliveries)", (cutoff,))
+
+
+class DeliveryWorker:
+    """Background thread draining the outbox through the shared WPPConnect client."""
+
+    def __init__(self, outbox, get_client, logger, max_workers=4, rate_per_second=2.0, metrics=None,
+                 on_status=None):
+        self.outbox = outbox
+        self.get_client = get_client
+        self.log = logger
+        self.metrics = metrics
+        self.on_status = on_status  # Called with (report_id, recipient, status, error) after each attempt
+        self.max_workers = max_workers
+        self.rate_per_second = rate_per_second
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="delivery-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.outbox.wake.set()
+
+    def _run(self):
+        next_prune = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.time() >= next_prune:
+                    self.outbox.prune()
+                    next_prune = time.time() + self.outbox.prune_interval
+                self.deliver_due()
+                next_at = self.outbox.next_due_at()
+            except Exception as e:
+                self.log(f"Delivery worker error: {e}", "ERROR")
+                next_at = time.time() + 30
+            # Sleep until the next retry or pruning is due, or until a new report is queued
+            next_at = next_prune if next_at is None else min(next_at, next_prune)
+            timeout = max(0.0, next_at - time.time())
+            self.outbox.wake.wait(timeout)
+            self.outbox.wake.clear()
+
+    def deliver_due(self):
+        for report_id, recipient in self.outbox.expire_stale():
+            if self.metrics is not None:
+                self.metrics.incr("delivery_expired")
+            self.log(f"Report {report_id} for {recipient} is too old to send; giving up.", "ERROR")
+            self._notify(report_id, recipient, 'failed', "expired")
+        rows = self.outbox.due()
+        if not rows:
+            return
+        payloads = {}
+        sends, meta = [], []
+        for delivery_id, report_id, recipient, caption, attempts, created_at in rows:
+            if report_id not in payloads:
+                payloads[report_id] = self.outbox.load_payload(report_id)
+            if payloads[report_id] is None:
+                self.outbox.mark_failed(delivery_id, self.outbox.max_attempts, "report image missing")
+                self._notify(report_id, recipient, 'failed', "report image missing")
+                continue
+            sends.append((recipient, payloads[report_id], caption))
+            meta.append((delivery_id, report_id, attempts, created_at))
+
+        results = send_concurrently(self.get_client(), sends, self.max_workers, self.rate_per_second)
+        for (delivery_id, report_id, attempts, created_at), result in zip(meta, results):
+            if self.metrics is not None:
+                self.metrics.timing("wpp.send", result.elapsed, ok=result.success, attempt=attempts + 1)
+                self.metrics.incr("send_success" if result.success else "send_failures")
+                if attempts:
+                    self.metrics.incr("delivery_retries")
+            if result.success:
+                self.outbox.mark_sent(delivery_id)
+                self._notify(report_id, result.recipient, 'sent')
+                self.log(f"Report {report_id} delivered to {result.recipient} ({result.elapsed:.1f}s).", "SUCCESS")
+                continue
+            status, next_at = self.outbox.mark_failed(delivery_id, attempts, result.error or "send failed", created_at)
+            self._notify(report_id, result.recipient, status, result.error)
+            if status == 'failed':
+                if self.metrics is not None:
+                    self.metrics.incr("delivery_gave_up")
+                self.log(f"Giving up on report {report_id} for {result.recipient} after {attempts + 1} attempts "
+                         f"({result.error}).", "ERROR")
+            else:
+                self.log(f"Delivery of {report_id} to {result.recipient} failed ({result.error}); retrying in "
+                         f"{next_at - time.time():.0f}s.", "WARNING")
+
+    def _notify(self, report_id, recipient, status, error=None):
+        if self.on_status is None:
+            return
+        try:
+            self.on_status(report_id, recipient, status, error)
+        except Exception as e:
+            self.log(f"Delivery status hook error: {e}", "DEBUG")
@@ -0,0 +1,140 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from logs import bind
+
+# --- Staged Job Pipeline ---
+# A job run travels capture -> OCR -> deliver. Each stage is a worker thread fed by a
+# bounded queue, so the next capture can start while the previous frame is still in
+# OCR or being queued for upload. A full queue blocks the stage feeding it
+# (backpressure), which is logged together with the queue depths.
+
+DEFAULT_QUEUE_SIZES = {"capture": 2, "ocr": 2, "deliver": 4}
+
+
+class PipelineRun:
+    """One item travelling through the stages; future resolves to the run's result (bool)."""
+
+    def __init__(self, label, **fields):
+        self.label = label
+        self.__dict__.update(fields)
+        self.future = Future()
+        self.queued_at = time.perf_counter()
+        self.timings = {}  # Stage name -> seconds spent in its handler
+
+    def finish(self, result):
+        """Ends the run; only the first call has an effect."""
+        if not self.future.done():
+            self.future.set_result(result)
+
+
+class Stage:
+    """
+    Worker thread applying handler(run) to each queued run. The handler returns the
+    run to pass it on to the next stage (or finish it successfully after the last
+    stage), or a bool to end the run with that result.
+    """
+
+    def __init__(self, pipeline, name, handler, maxsize, workers=1):
+        self.pipeline = pipeline
+        self.name = name
+        self.handler = handler
+        self.maxsize = maxsize
+        self.next = None
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._threads = [None] * workers
+
+    def start(self):
+        for i, thread in enumerate(self._threads):
+            if thread is None or not thread.is_alive():
+                name = f"stage-{self.name}" if len(self._threads) == 1 else f"stage-{self.name}-{i + 1}"
+                self._threads[i] = threading.Thread(target=self._worker, name=name, daemon=True)
+                self._threads[i].start()
+
+    def put(self, run):
+        log = self.pipeline.log
+        run.queued_at = time.perf_counter()
+        try:
+            self.queue.put_nowait(run)
+        except queue.Full:
+            log(f"Backpressure: '{self.name}' queue full ({self.maxsize}), '{run.label}' waiting...", "WARNING")
+            t = time.perf_counter()
+            self.queue.put(run)
+            log(f"'{run.label}' entered '{self.name}' queue after {time.perf_counter() - t:.2f}s.", "WARNING")
+        log(f"Queue depths -> {self.pipeline.depths_text()}", "DEBUG")
+
+    def _worker(self):
+        while True:
+            run = self.queue.get()
+            started = time.perf_counter()
+            waited = started - run.queued_at
+            if waited >= 1:
+                self.pipeline.log(f"'{run.label}' waited {waited:.1f}s in '{self.name}' queue.", "DEBUG")
+            ok = True
+            try:
+                with bind(job=run.label, stage=self.name):
+                    result = self.handler(run)
+            except Exception as e:
+                self.pipeline.log(f"Job '{run.label}' failed in {self.name} stage: {e}", "ERROR")
+                result, ok = False, False
+            finally:
+                self.queue.task_done()
+            run.timings[self.name] = time.perf_counter() - started
+            metrics = self.pipeline.metrics
+            if metrics is not None:
+                metrics.timing(f"pipeline.{self.name}.wait", waited, job=run.label)
+                metrics.timing(f"pipeline.{self.name}", run.timings[self.name], job=run.label, ok=ok)
+            if result is run and self.next is not None:
+                self.next.put(run)
+            else:
+                self.pipeline.finish(run, True if result is run else bool(result))
+
+
+class Pipeline:
+    """
+    Chain of stages built from [(name, handler), ...]. queue_sizes maps stage names
+    to queue capacities (DEFAULT_QUEUE_SIZES, or 2 for unknown stages), workers maps
+    them to worker thread counts (default 1). A stage with several workers must have a
+    thread-safe handler, and its runs may finish out of order.
+    on_finish(run, result) is called when a run ends, before its future resolves.
+    metrics: optional metrics.Metrics receiving stage, queue wait and run timings.
+    """
+
+    def __init__(self, stages, logger, queue_sizes=None, on_finish=None, metrics=None, workers=None):
+        self.log = logger
+        self.on_finish = on_finish
+        self.metrics = metrics
+        sizes = dict(DEFAULT_QUEUE_SIZES)
+        sizes.update(queue_sizes or {})
+        workers = workers or {}
+        self.stages = [Stage(self, name, handler, max(1, int(sizes.get(name, 2))), max(1, int(workers.get(name, 1))))
+                       for name, handler in stages]
+        for stage, following in zip(self.stages, self.stages[1:]):
+            stage.next = following
+        for stage in self.stages:
+            stage.start()
+
+    def submit(self, label, **fields):
+        """Queues a run at the first stage (blocking while it is full). Returns its Future."""
+        run = PipelineRun(label, **fields)
+        run.started_at = time.perf_counter()
+        self.stages[0].put(run)
+        return run.future
+
+    def finish(self, run, result):
+        if self.on_finish is not None:
+            try:
+                self.on_finish(run, result)
+            except Exception as e:
+                self.log(f"Pipeline finish hook error for '{run.label}': {e}", "ERROR")
+        if self.metrics is not None:
+            self.metrics.timing("job.total", time.perf_counter() - run.started_at, job=run.label, ok=result)
+            self.metrics.incr("job_success" if result else "job_failures", job=run.label)
+        run.finish(result)
+
+    def depths(self):
+        return {stage.name: stage.queue.qsize() for stage in self.stages}
+
+    def depths_text(self):
+        return ", ".join(f"{s.name}: {s.queue.qsize()}/{s.maxsize}" for s in self.stages)
@@ -0,0 +1,177 @@
+import math
+import threading
+import numpy as np
+
+# --- OCR Preprocessing Engine ---
+# Grayscale -> resize -> contrast -> (optional) threshold, fused into one float32
+# NumPy pipeline. Resizing is two matrix products with cached PIL-compatible filter
+# weights, and every intermediate lives in a buffer reused across runs (one set per
+# thread, so several OCR stage workers can preprocess at the same time).
+
+# Built-in profiles; config.json 'preprocess_profiles' entries are merged over these.
+DEFAULT_PROFILES = {
+    "default": {"scale": 3, "contrast": 2.5, "threshold": None, "resampler": "lanczos"},
+    # Small single-digit regions need a bigger upscale and stronger contrast
+    "digit": {"scale": 10, "contrast": 3.0, "threshold": None, "resampler": "lanczos"},
+}
+
+# Regions without a 'profile' key keep their historical name-based treatment
+LEGACY_PROFILE_BY_NAME = {"f": "digit", "m": "digit"}
+
+# Same luma weights as PIL's RGB -> L conversion
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _box(x):
+    return ((x > -0.5) & (x <= 0.5)).astype(np.float64)
+
+def _triangle(x):
+    x = np.abs(x)
+    return np.where(x < 1.0, 1.0 - x, 0.0)
+
+def _bicubic(x, a=-0.5):
+    x = np.abs(x)
+    return np.where(x < 1.0, ((a + 2.0) * x - (a + 3.0)) * x * x + 1.0,
+                    np.where(x < 2.0, (((x - 5.0) * x + 8.0) * x - 4.0) * a, 0.0))
+
+def _lanczos(x, a=3.0):
+    return np.where(np.abs(x) < a, np.sinc(x) * np.sinc(x / a), 0.0)
+
+# name -> (filter, support), matching PIL's resampling filters
+RESAMPLERS = {
+    "nearest": (_box, 0.5),
+    "bilinear": (_triangle, 1.0),
+    "bicubic": (_bicubic, 2.0),
+    "lanczos": (_lanczos, 3.0),
+}
+
+
+def resolve_profile(region, profiles=None):
+    """
+    Returns the preprocessing profile for a region: the built-in 'default' profile,
+    overlaid with the named profile (region 'profile' key, or the legacy F/M mapping)
+    and finally any inline 'preprocess' overrides on the region itself.
+    """
+    profiles = profiles or {}
+    name = region.get('profile') or LEGACY_PROFILE_BY_NAME.get(region['name'].lower(), 'default')
+    profile = dict(DEFAULT_PROFILES['default'])
+    profile.update(profiles.get('default', {}))
+    if name != 'default':
+        if name not in DEFAULT_PROFILES and name not in profiles:
+            raise ValueError(f"Unknown preprocess profile '{name}' for region '{region['name']}'")
+        profile.update(DEFAULT_PROFILES.get(name, {}))
+        profile.update(profiles.get(name, {}))
+    profile.update(region.get('preprocess', {}))
+    if profile['resampler'] not in RESAMPLERS:
+        raise ValueError(f"Unknown resampler '{profile['resampler']}'")
+    return profile
+
+
+def resample_weights(in_size, out_size, resampler):
+    """Dense (out_size, in_size) resampling matrix using PIL's coefficient layout."""
+    kernel, support = RESAMPLERS[resampler]
+    scale = in_size / out_size
+    filterscale = max(scale, 1.0)
+    support *= filterscale
+
+    centers = (np.arange(out_size) + 0.5) * scale
+    weights = np.zeros((out_size, in_size), dtype=np.float64)
+    for i, center in enumerate(centers):
+        xmin = max(int(center - support + 0.5), 0)
+        xmax = min(int(center + support + 0.5), in_size)
+        taps = kernel((np.arange(xmin, xmax) - center + 0.5) / filterscale)
+        total = taps.sum()
+        if total:
+            weights[i, xmin:xmax] = taps / total
+    return weights.astype(np.float32)
+
+
+def otsu_threshold(gray):
+    """Otsu threshold of a 0..255 float image."""
+    hist = np.bincount(gray.astype(np.uint8).ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = weight_bg[-1] - weight_bg
+    sum_bg = np.cumsum(hist * levels)
+    mean_bg = sum_bg / np.maximum(weight_bg, 1)
+    mean_fg = (sum_bg[-1] - sum_bg) / np.maximum(weight_fg, 1)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+
+class Preprocessor:
+    """
+    Runs region crops through a preprocessing profile into reused buffers.
+    The returned uint8 array is owned by the preprocessor and is overwritten the next
+    time the same slot is processed on the same thread, so copy it if it must outlive that.
+    Filter weights are shared; scratch and output buffers are per thread.
+    """
+
+    def __init__(self):
+        self._weights = {}
+        self._local = threading.local()
+        self.allocations = 0  # Number of buffers/weight matrices created so far
+
+    def _buffer(self, key, shape, dtype):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buf = buffers.get(key)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=dtype)
+            buffers[key] = buf
+            self.allocations += 1
+        return buf
+
+    def _resample_matrix(self, in_size, out_size, resampler):
+        key = (in_size, out_size, resampler)
+        weights = self._weights.get(key)
+        if weights is None:
+            weights = resample_weights(in_size, out_size, resampler)
+            self._weights[key] = weights
+            self.allocations += 1
+        return weights
+
+    def run(self, image, profile, slot="default"):
+        """image: PIL image or HxW(x3) uint8 array. Returns a 2-D uint8 array."""
+        rgb = np.asarray(image)
+        h, w = rgb.shape[:2]
+        scale = profile['scale']
+        out_h, out_w = max(1, int(round(h * scale))), max(1, int(round(w * scale)))
+
+        # 1. Grayscale into a float32 scratch buffer
+        gray = self._buffer(('gray', h, w), (h, w), np.float32)
+        if rgb.ndim == 3:
+            np.matmul(rgb[..., :3], GRAY_WEIGHTS, out=gray)
+        else:
+            np.copyto(gray, rgb, casting='unsafe')
+
+        # 2. Separable resize as two matrix products: Wy @ gray @ Wx.T
+        wx = self._resample_matrix(w, out_w, profile['resampler'])
+        wy = self._resample_matrix(h, out_h, profile['resampler'])
+        tmp = self._buffer(('tmp', h, out_w), (h, out_w), np.float32)
+        np.matmul(gray, wx.T, out=tmp)
+        work = self._buffer(('work', out_h, out_w), (out_h, out_w), np.float32)
+        np.matmul(wy, tmp, out=work)
+        np.clip(work, 0, 255, out=work)
+
+        # 3. Contrast around the mean, like ImageEnhance.Contrast
+        contrast = profile.get('contrast')
+        if contrast and contrast != 1.0:
+            mean = math.floor(float(work.mean()) + 0.5)
+            work -= mean
+            work *= contrast
+            work += mean
+            np.clip(work, 0, 255, out=work)
+
+        # 4. Optional binarization (fixed level or 'otsu')
+        threshold = profile.get('threshold')
+        if threshold is not None:
+            level = otsu_threshold(work) if threshold == 'otsu' else float(threshold)
+            np.greater(work, level, out=work)
+            work *= 255
+
+        out = self._buffer(('out', slot), (out_h, out_w), np.uint8)
+        np.rint(work, out=work)
+        np.copyto(out, work, casting='unsafe')
+        return out
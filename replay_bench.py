@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import math
+import time
+import fnmatch
+import argparse
+from datetime import datetime
+from PIL import Image
+from capture import Frame, list_images, recorded_origins
+from ocr_engine import OCREngine
+from report import DEFAULT_JOB, build_report, load_jobs, ValidationError
+from scheduler import load_schedule
+
+# Offline replay harness: streams saved screenshots through the real preprocessing,
+# OCR, validation and caption code. No window is touched and nothing is sent, so it
+# runs headless on Linux. Reports per-stage latency percentiles, throughput,
+# per-region accuracy against an optional labels file and a diff against a baseline.
+#
+# Usage: python replay_bench.py [screenshots_dir] [--job NAME] [--labels labels.json]
+#                               [--baseline baseline.json [--save-baseline]]
+#
+# labels.json: {"full_20260101_080000.png": {"DC": "42", "AWS": "6.1", "valid": true}, ...}
+# (region names as in config; the optional "valid" is the expected validation outcome)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ("load", "preprocess", "recognize", "escalate", "validate", "total")
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(values):
+    """Latency summary in milliseconds."""
+    ordered = sorted(v * 1000 for v in values)
+    summary = {f"p{p}": percentile(ordered, p) for p in PERCENTILES}
+    summary["mean"] = sum(ordered) / len(ordered) if ordered else 0.0
+    summary["max"] = ordered[-1] if ordered else 0.0
+    return summary
+
+
+def default_pattern(job_name):
+    """File pattern of a job's archived full screenshots (see JobState.file_stem in main.py)."""
+    if job_name == DEFAULT_JOB:
+        return "full_[0-9]*"
+    return f"full_{job_name.replace(' ', '_')}_*"
+
+
+def list_screenshots(directory, pattern):
+    """Matching screenshots in directory and its date partitions, oldest partition first."""
+    return [p for p in list_images(directory) if fnmatch.fnmatch(os.path.basename(p), pattern)]
+
+
+def replay(files, job_config, engine, options, origin=None):
+    """
+    Runs every screenshot through OCR, validation and caption formatting, one at a time.
+    Each frame uses origin if given, else the origin recorded at capture time (or 0,0).
+    Returns ({file name: result}, {stage: [seconds]}).
+    """
+    results = {}
+    timings = {stage: [] for stage in STAGES}
+    origins = {} if origin else recorded_origins(files)
+    for path in files:
+        t_start = time.perf_counter()
+        with Image.open(path) as img:
+            image = img.convert('RGB')
+        frame = Frame(image, origin=origin or origins.get(path, (0, 0)), source=path)
+        timings["load"].append(time.perf_counter() - t_start)
+
+        stage_times = {}
+        texts = engine.run(frame, job_config['regions'], job_config, BASE_DIR, stage_times=stage_times)
+        timings["preprocess"].append(stage_times.get('preprocess', 0.0))
+        timings["recognize"].append(stage_times.get('recognize', 0.0))
+        timings["escalate"].append(stage_times.get('escalate', 0.0))
+
+        t = time.perf_counter()
+        result = {"texts": texts, "confidences": texts.confidences, "tiers": texts.tiers,
+                  "valid": True, "caption": None, "error": None}
+        try:
+            result["caption"], _fields = build_report(texts, job_config, options)
+        except (ValidationError, ValueError) as e:
+            result["valid"], result["error"] = False, str(e)
+        timings["validate"].append(time.perf_counter() - t)
+        timings["total"].append(time.perf_counter() - t_start)
+        results[os.path.basename(path)] = result
+    return results, timings
+
+
+def accuracy(results, labels, region_names):
+    """Per-region exact-match accuracy over the labelled screenshots: {name: [correct, total]}."""
+    scores = {name: [0, 0] for name in list(region_names) + ["valid"]}
+    for file_name, expected in labels.items():
+        result = results.get(file_name)
+        if result is None:
+            continue
+        for name, value in expected.items():
+            if name not in scores:
+                continue
+            actual = result["valid"] if name == "valid" else result["texts"].get(name, "")
+            if name != "valid":
+                value, actual = str(value).strip(), actual.strip()
+            scores[name][0] += int(actual == value)
+            scores[name][1] += 1
+    return {name: score for name, score in scores.items() if score[1]}
+
+
+def compare(report, baseline, max_slowdown):
+    """Returns (regressions, notes) comparing a report with a stored baseline report."""
+    regressions, notes = [], []
+    for name, (correct, total) in report["accuracy"].items():
+        if name not in baseline.get("accuracy", {}):
+            continue
+        base_correct, base_total = baseline["accuracy"][name]
+        now, before = correct / total, base_correct / base_total
+        if now < before:
+            regressions.append(f"accuracy [{name}] {before:.1%} -> {now:.1%}")
+        elif now > before:
+            notes.append(f"accuracy [{name}] {before:.1%} -> {now:.1%}")
+
+    for stage in ("recognize", "total"):
+        before = baseline.get("latency_ms", {}).get(stage, {}).get("p95")
+        now = report["latency_ms"][stage]["p95"]
+        if before:
+            change = now / before - 1
+            line = f"{stage} p95 {before:.1f} ms -> {now:.1f} ms ({change:+.0%})"
+            (regressions if change > max_slowdown else notes).append(line)
+
+    changed = 0
+    for file_name, result in report["results"].items():
+        old = baseline.get("results", {}).get(file_name)
+        if old is None:
+            continue
+        diffs = [f"{name}: '{old['texts'].get(name, '')}' -> '{text}'"
+                 for name, text in result["texts"].items() if old["texts"].get(name, "") != text]
+        if old["valid"] != result["valid"]:
+            diffs.append(f"valid: {old['valid']} -> {result['valid']}")
+        if diffs:
+            changed += 1
+            notes.append(f"{file_name}: " + ", ".join(diffs))
+    notes.append(f"{changed} screenshot(s) read differently than in the baseline.")
+    return regressions, notes
+
+
+def print_report(report):
+    count = report["frames"]
+    print(f"=== Replay benchmark: job '{report['job']}', {count} screenshot(s), ocr_mode {report['ocr_mode']} ===")
+    print(f"{'stage':<12}" + "".join(f"{f'p{p}':>10}" for p in PERCENTILES) + f"{'mean':>10}{'max':>10}   (ms)")
+    for stage in STAGES:
+        s = report["latency_ms"][stage]
+        print(f"{stage:<12}" + "".join(f"{s[f'p{p}']:10.1f}" for p in PERCENTILES) + f"{s['mean']:10.1f}{s['max']:10.1f}")
+    print(f"Throughput: {report['frames_per_second']:.2f} frames/s, "
+          f"{report['frames_per_second'] * report['regions']:.1f} regions/s")
+    valid = sum(1 for r in report["results"].values() if r["valid"])
+    print(f"Validation passed: {valid}/{count}")
+    tiers = [tier for r in report["results"].values() for tier in r.get("tiers", {}).values()]
+    if tiers:
+        cheap = sum(1 for r in report["results"].values() if not any(r.get("tiers", {}).values()))
+        print(f"Cheap OCR tier only: {cheap}/{count} screenshot(s), "
+              f"{tiers.count(0)}/{len(tiers)} region reading(s); escalated: {len(tiers) - tiers.count(0)}")
+    if report["accuracy"]:
+        print("Accuracy vs labels:")
+        for name, (correct, total) in report["accuracy"].items():
+            print(f"  {name:<10} {correct:>5}/{total:<5} {correct / total:7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay saved screenshots through the OCR and validation pipeline.")
+    parser.add_argument("directory", nargs="?", default=os.path.join(BASE_DIR, "screenshots"))
+    parser.add_argument("--config", default=os.path.join(BASE_DIR, "config.json"))
+    parser.add_argument("--job", default=None, help="job name from config 'jobs' (default: the first job)")
+    parser.add_argument("--pattern", default=None, help="file name pattern (default: the job's full_* captures)")
+    parser.add_argument("--limit", type=int, default=0, help="only replay the first N screenshots")
+    parser.add_argument("--origin", default=None,
+                        help="screen x,y of the screenshots' top-left pixel (default: as recorded at capture)")
+    parser.add_argument("--options", default=None, help="schedule entry whose options apply (e.g. 'evening')")
+    parser.add_argument("--cache", action="store_true", help="enable the OCR result cache (in memory only)")
+    parser.add_argument("--workers", type=int, default=None, help="OCR worker processes (overrides ocr_pool)")
+    parser.add_argument("--labels", default=None, help="ground-truth labels JSON")
+    parser.add_argument("--baseline", default=None, help="baseline report JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--max-slowdown", type=float, default=0.2, help="allowed p95 latency increase (0.2 = 20%%)")
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the OCR engine's log lines")
+    args = parser.parse_args()
+    if args.baseline and not args.save_baseline and not os.path.exists(args.baseline):
+        sys.exit(f"Baseline file not found: {args.baseline} (use --save-baseline to create it)")
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    jobs = load_jobs(config)
+    job_name = args.job or next(iter(jobs))
+    if job_name not in jobs:
+        sys.exit(f"Unknown job '{job_name}'. Configured jobs: {', '.join(jobs)}")
+    job_config = dict(jobs[job_name])
+    job_config['ocr_cache'] = {"enabled": args.cache, "persist": False}
+    options = {}
+    if args.options:
+        entry = next((e for e in load_schedule(job_config, job_name) if e.name.endswith(args.options)), None)
+        if entry is None:
+            sys.exit(f"Unknown schedule entry '{args.options}'")
+        options = entry.options
+
+    files = list_screenshots(args.directory, args.pattern or default_pattern(job_name))
+    if args.limit:
+        files = files[:args.limit]
+    if not files:
+        sys.exit(f"No screenshots to replay in {args.directory}")
+
+    def engine_log(message, type="INFO"):
+        if args.verbose or type == "ERROR":
+            print(f"  [{type}] {message}")
+
+    pool_settings = dict(config.get('ocr_pool') or {})
+    if args.workers is not None:
+        pool_settings['workers'] = args.workers
+    engine = OCREngine(logger=engine_log, pool_settings=pool_settings)
+    t = time.perf_counter()
+    if engine.pool is not None:
+        engine.pool.start()
+    else:
+        engine.get_reader()
+    print(f"OCR engine warm-up: {time.perf_counter() - t:.2f}s (not included below)")
+
+    origin = tuple(int(v) for v in args.origin.split(',')) if args.origin else None
+    t = time.perf_counter()
+    results, timings = replay(files, job_config, engine, options, origin)
+    elapsed = time.perf_counter() - t
+    if engine.pool is not None:
+        engine.pool.shutdown()
+
+    labels = {}
+    if args.labels:
+        with open(args.labels, 'r', encoding='utf-8') as f:
+            labels = json.load(f)
+
+    report = {
+        "job": job_name,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "ocr_mode": job_config.get('ocr_mode', 'batched'),
+        "frames": len(files),
+        "regions": len(job_config['regions']),
+        "frames_per_second": len(files) / elapsed if elapsed else 0.0,
+        "latency_ms": {stage: summarize(values) for stage, values in timings.items()},
+        "accuracy": accuracy(results, labels, [r['name'] for r in job_config['regions']]),
+        "results": results,
+    }
+    print_report(report)
+
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions, notes = compare(report, baseline, args.max_slowdown)
+        print(f"--- Diff against baseline from {baseline.get('created', '?')} ---")
+        for line in notes:
+            print(f"  {line}")
+        for line in regressions:
+            print(f"  REGRESSION: {line}")
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Baseline saved to {args.baseline}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
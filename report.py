@@ -0,0 +1,121 @@
+import re
+
+# --- Report Validation & Caption ---
+# Turns one job's OCR readings into the report caption, or rejects them. Each job
+# can override the checks ('validation') and the caption template ('caption').
+
+DEFAULT_VALIDATION = {
+    "title_region": "Title",
+    "title_contains": "overall index",
+    "required": ["DC", "AWS", "TAP"],
+}
+
+DEFAULT_CAPTION = (
+    "BC BLĐ: Hiện tại {active} TB đang hoạt động, "
+    "tốc độ gió {aws} m/s, "
+    "công suất phát {tap} MW."
+)
+
+
+class ValidationError(ValueError):
+    """The readings must not be sent; the saved window is probably wrong."""
+
+
+class _TemplateFields(dict):
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def format_caption(template, fields):
+    """Fills a caption template from fields; unknown {placeholders} are left as written."""
+    return template.format_map(_TemplateFields(fields))
+
+
+def validation_settings(job_config):
+    validation = dict(DEFAULT_VALIDATION)
+    validation.update(job_config.get('validation') or {})
+    return validation
+
+
+def device_count(fields, key):
+    """A device count field as an int (0 when empty); raises ValidationError for non-whole numbers."""
+    text = fields.get(key) or ""
+    if not text:
+        return 0
+    # Same format as the numeric regions' OCR check; "12.0" is still a whole count
+    if not re.fullmatch(r"\d+(\.\d+)?", text) or not float(text).is_integer():
+        raise ValidationError(f"{key.upper()} is not a device count (found '{text}').")
+    return int(float(text))
+
+
+def report_fields(ocr_res):
+    """
+    Caption fields: every region's text under its lower-cased name, plus F and M
+    as integers (0 when not found) and active = DC - F - M.
+    """
+    fields = {name.lower(): text.strip() for name, text in ocr_res.items()}
+    fields.setdefault("deg", "")
+    f_val = device_count(fields, "f")
+    m_val = device_count(fields, "m")
+    fields["f"], fields["m"] = f_val, m_val
+    if fields.get("dc"):
+        fields["active"] = device_count(fields, "dc") - f_val - m_val
+    return fields
+
+
+def build_report(ocr_res, job_config, options=None):
+    """
+    Validates the readings against job_config 'validation' and formats its 'caption'.
+    options come from the schedule entry: require_deg and caption_suffix.
+    Returns (caption, fields); raises ValidationError.
+    """
+    validation = validation_settings(job_config)
+    options = options or {}
+
+    # 1. Validate Title
+    title_region = validation.get('title_region')
+    expected = (validation.get('title_contains') or "").lower()
+    if title_region and expected:
+        title_text = ocr_res.get(title_region, "").lower()
+        if expected not in title_text:
+            raise ValidationError(f"'{expected}' not found in {title_region} (found '{title_text}').")
+
+    # 2. Validate Data Values (DC, AWS, TAP by default)
+    required = list(validation.get('required') or [])
+    if options.get('require_deg'):
+        required.append("DEG")
+    missing = [name for name in required if not ocr_res.get(name, "").strip()]
+    if missing:
+        found = ", ".join(f"{name}='{ocr_res.get(name, '').strip()}'" for name in required)
+        raise ValidationError(f"Missing or unrecognized data ({found}).")
+
+    # 3. F and M default to 0; active devices = DC - F - M
+    fields = report_fields(ocr_res)
+    caption = format_caption(job_config.get('caption') or DEFAULT_CAPTION, fields)
+    if options.get('caption_suffix'):
+        caption += format_caption(options['caption_suffix'], fields)
+    return caption, fields
+
+
+# --- Job Configs ---
+# Each entry of config 'jobs' is one monitored dashboard (window, regions, validation,
+# caption, recipients, schedule) and is merged over the top-level keys. Without 'jobs'
+# the top-level keys form a single job named 'default'. Delivery goes through one
+# WPPConnect session and outbox for all jobs, so those keys are top-level only.
+DEFAULT_JOB = "default"
+SHARED_KEYS = ("wpp_base_url", "wpp_session", "wpp_secret_key", "wpp_http", "wpp_token_ttl_hours",
+               "outbox", "delivery")
+
+
+def load_jobs(config):
+    """Returns {job name: merged job config}; raises ValueError for per-job shared keys."""
+    jobs = {}
+    for item in config.get('jobs') or [{"name": DEFAULT_JOB}]:
+        shared = [key for key in SHARED_KEYS if key in item]
+        if shared:
+            raise ValueError(f"Job '{item['name']}' sets {', '.join(shared)}; these are shared by all jobs "
+                             f"and only allowed at the top level of the config.")
+        job_config = {k: v for k, v in config.items() if k != 'jobs'}
+        job_config.update(item)
+        jobs[item['name']] = job_config
+    return jobs
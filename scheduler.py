@@ -0,0 +1,203 @@
+import heapq
+import random
+import threading
+import itertools
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+# --- Event-Driven Job Scheduler ---
+# A heap of (due time, entry) items. The loop sleeps exactly until the earliest item is
+# due (or until something new is scheduled), so there is no periodic polling.
+
+# Reproduces the historical behaviour: every hour at a random minute 0-10, retry every
+# 5 minutes on failure, and the 22:00 report additionally requires the DEG value.
+DEFAULT_SCHEDULE = [
+    {"name": "hourly", "hours": "0-21,23", "minute": 0, "jitter_minutes": 10, "retry_minutes": 5},
+    {"name": "evening", "hours": [22], "minute": 0, "jitter_minutes": 10, "retry_minutes": 5,
+     "require_deg": True, "caption_suffix": " Sản lượng đầu cực đến 22h đạt {deg} MWh."},
+]
+
+# Upper bound on a single sleep, so wall-clock jumps (system sleep, DST) are noticed
+MAX_SLEEP_SECONDS = 300
+
+
+def parse_hours(spec):
+    """'*', '0-21,23' or a list of ints -> sorted list of hours."""
+    if spec in (None, "*"):
+        return list(range(24))
+    if isinstance(spec, int):
+        return [spec]
+    if isinstance(spec, str):
+        hours = set()
+        for part in spec.split(','):
+            part = part.strip()
+            if '-' in part:
+                start, end = part.split('-')
+                hours.update(range(int(start), int(end) + 1))
+            elif part:
+                hours.add(int(part))
+        spec = hours
+    hours = sorted(set(int(h) for h in spec))
+    if not hours or hours[0] < 0 or hours[-1] > 23:
+        raise ValueError(f"Invalid schedule hours: {spec}")
+    return hours
+
+
+class ScheduleEntry:
+    """
+    One cron-like schedule line: hours, base minute, jitter window, retry policy and job
+    options. job names the configured job (dashboard) the entry runs.
+    """
+
+    def __init__(self, name, hours="*", minute=0, jitter_minutes=0, retry_minutes=5, max_retries=None,
+                 job=None, **options):
+        self.name = f"{job}/{name}" if job else name
+        self.job = job
+        self.hours = parse_hours(hours)
+        self.minute = minute
+        self.jitter_minutes = jitter_minutes
+        self.retry_minutes = retry_minutes
+        self.max_retries = max_retries
+        self.options = options
+
+    @classmethod
+    def from_config(cls, item):
+        return cls(**item)
+
+    def base_times_after(self, now):
+        """Yields this entry's un-jittered run times (hour:minute) from now's hour onwards."""
+        day = now.replace(minute=0, second=0, microsecond=0)
+        for _ in range(2):  # today and tomorrow cover every hour set
+            for hour in self.hours:
+                base = day.replace(hour=hour) + timedelta(minutes=self.minute)
+                if base + timedelta(minutes=self.jitter_minutes) > now:
+                    yield base
+            day = day.replace(hour=0) + timedelta(days=1)
+
+    def next_run(self, now, allow_current=True):
+        """
+        Next run time: a random moment inside the jitter window, never in the past.
+        With allow_current=False, a window that has already opened is skipped.
+        """
+        for base in self.base_times_after(now):
+            if not allow_current and base <= now:
+                continue
+            window_end = base + timedelta(minutes=self.jitter_minutes)
+            earliest = max(base, now + timedelta(seconds=1))
+            if earliest > window_end:
+                continue
+            span = (window_end - earliest).total_seconds()
+            return earliest + timedelta(seconds=random.uniform(0, span))
+        raise RuntimeError(f"Schedule entry '{self.name}' has no upcoming run")
+
+    def slot_for(self, when):
+        """The scheduled (un-jittered) time a run at when belongs to: the latest one at or before when."""
+        day = when.replace(hour=0, minute=0, second=0, microsecond=0)
+        for _ in range(2):  # today and yesterday cover every hour set
+            for hour in reversed(self.hours):
+                base = day.replace(hour=hour) + timedelta(minutes=self.minute)
+                if base <= when:
+                    return base
+            day -= timedelta(days=1)
+        return None
+
+    def next_base(self, now):
+        return next(b for b in self.base_times_after(now) if b > now)
+
+
+def load_schedule(config, job=None):
+    """Schedule entries of a (job) config, bound to the given job name."""
+    return [ScheduleEntry.from_config(dict(item, job=job)) for item in (config.get('schedule') or DEFAULT_SCHEDULE)]
+
+
+class Scheduler:
+    """
+    Runs run_job(entry) for each entry when due; run_job returns the success flag, or
+    a Future resolving to it (the entry is then rescheduled once it resolves). On
+    failure the entry is retried after its retry_minutes (at most max_retries times)
+    as long as the retry falls before the next regular run of any entry of the same
+    job; otherwise its next regular run is used.
+    """
+
+    def __init__(self, entries, run_job, logger, metrics=None):
+        self.entries = entries
+        self.run_job = run_job
+        self.log = logger
+        self.metrics = metrics
+        self._heap = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._counter = itertools.count()  # Tie-breaker for equal due times
+        self._stopped = False
+
+    def submit(self, entry, at, attempt=0):
+        """Schedules entry at the given datetime (thread-safe); wakes the loop if needed."""
+        with self._lock:
+            heapq.heappush(self._heap, (at, next(self._counter), entry, attempt))
+        self._wake.set()
+
+    def schedule_initial(self, now=None):
+        now = now or datetime.now()
+        for entry in self.entries:
+            at = entry.next_run(now)
+            self.submit(entry, at)
+            self.log(f"First '{entry.name}' run scheduled at: {at.strftime('%Y-%m-%d %H:%M:%S')}", "INFO")
+
+    def next_boundary(self, now, job=None):
+        """Earliest regular (un-jittered) run time after now of any entry of the job."""
+        return min(entry.next_base(now) for entry in self.entries if entry.job == job)
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def run_forever(self):
+        while not self._stopped:
+            with self._lock:
+                head = self._heap[0] if self._heap else None
+            if head is None:
+                self._wake.wait(MAX_SLEEP_SECONDS)
+                self._wake.clear()
+                continue
+
+            delay = (head[0] - datetime.now()).total_seconds()
+            if delay > 0:
+                self._wake.wait(min(delay, MAX_SLEEP_SECONDS))
+                self._wake.clear()
+                continue
+
+            with self._lock:
+                at, _, entry, attempt = heapq.heappop(self._heap)
+            lateness = (datetime.now() - at).total_seconds()
+            self.log(f"Running '{entry.name}' (attempt {attempt + 1}, {lateness:.2f}s after due time)", "DEBUG")
+            try:
+                success = self.run_job(entry)
+            except Exception as e:
+                self.log(f"Scheduled job '{entry.name}' crashed: {e}", "ERROR")
+                success = False
+            if isinstance(success, Future):
+                # Pipelined job: reschedule once its run has finished
+                success.add_done_callback(lambda f, e=entry, a=attempt: self.reschedule(e, a, f.result()))
+                continue
+            self.reschedule(entry, attempt, success)
+
+    def reschedule(self, entry, attempt, success, now=None):
+        now = now or datetime.now()
+        if not success:
+            retry_at = now + timedelta(minutes=entry.retry_minutes)
+            retries_left = entry.max_retries is None or attempt < entry.max_retries
+            if retries_left and retry_at < self.next_boundary(now, entry.job):
+                self.submit(entry, retry_at, attempt + 1)
+                if self.metrics is not None:
+                    self.metrics.incr("job_retries", job=entry.job, entry=entry.name)
+                self.log(f"Job '{entry.name}' failed. Retrying in {entry.retry_minutes} minutes at: "
+                         f"{retry_at.strftime('%H:%M:%S')}", "WARNING")
+                return
+            self.log(f"Job '{entry.name}' failed; giving up until its next regular run.", "WARNING")
+            if self.metrics is not None:
+                self.metrics.incr("job_gave_up", job=entry.job, entry=entry.name)
+
+        at = entry.next_run(now, allow_current=False)
+        self.submit(entry, at)
+        self.log(f"Next '{entry.name}' run scheduled at: {at.strftime('%Y-%m-%d %H:%M:%S')}",
+                 "SUCCESS" if success else "INFO")
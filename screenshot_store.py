@@ -0,0 +1,200 @@
+import os
+import re
+import json
+import shutil
+import threading
+from datetime import datetime, timedelta
+
+# --- Screenshot Store ---
+# Archived screenshots and debug crops go into one subdirectory per day
+# (screenshots/2026-01-31/...). Each partition has a manifest.jsonl listing its files and
+# sizes, appended as files are written, so the store knows its size per day without
+# listing or stat-ing old files. A background thread drops whole partitions once they
+# are older than the retention period or the store exceeds its size quota; the cost of
+# pruning depends on the number of days kept, not on the number of files.
+
+DEFAULT_SETTINGS = {"max_bytes": 2_000_000_000, "prune_interval_seconds": 3600}
+MANIFEST = "manifest.jsonl"
+PARTITION_FORMAT = "%Y-%m-%d"
+_PARTITION_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def read_manifest(directory):
+    """{file name: manifest entry} of a partition directory ({} without a manifest)."""
+    entries = {}
+    try:
+        with open(os.path.join(directory, MANIFEST), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    entries[entry['file']] = entry
+                except (ValueError, KeyError, TypeError):
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+class ScreenshotStore:
+    """Date-partitioned image archive under root with retention and size-quota pruning."""
+
+    def __init__(self, root, retention_days=3, max_bytes=2_000_000_000, prune_interval=3600,
+                 logger=None, metrics=None):
+        self.root = root
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self.prune_interval = prune_interval
+        self.log = logger or (lambda message, type="INFO": print(message))
+        self.metrics = metrics
+        self._sizes = None  # {partition: bytes}, loaded from the manifests on first use
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls, settings, root, retention_days=3, logger=None, metrics=None):
+        s = dict(DEFAULT_SETTINGS)
+        s.update(settings or {})
+        return cls(root, retention_days, s['max_bytes'], s['prune_interval_seconds'], logger, metrics)
+
+    def update_limits(self, retention_days, settings=None):
+        """Applies reloaded config values; pruning runs again if they got stricter."""
+        s = dict(DEFAULT_SETTINGS)
+        s.update(settings or {})
+        stricter = retention_days < self.retention_days or s['max_bytes'] < self.max_bytes
+        self.retention_days, self.max_bytes = retention_days, s['max_bytes']
+        self.prune_interval = s['prune_interval_seconds']
+        if stricter:
+            self._wake.set()
+
+    # --- Writing ---
+    def path_for(self, name, when=None):
+        """Base path (without extension) for an artifact captured at when (default now)."""
+        partition = (when or datetime.now()).strftime(PARTITION_FORMAT)
+        directory = os.path.join(self.root, partition)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name)
+
+    def record(self, path, meta=None):
+        """
+        Adds a written file to its partition's manifest (DebugImageWriter on_saved callback).
+        meta (e.g. the capture's screen origin) is stored in the file's manifest line.
+        """
+        directory, file_name = os.path.split(path)
+        partition = os.path.basename(directory)
+        if not _PARTITION_RE.match(partition):
+            return
+        size = os.path.getsize(path)
+        entry = dict(meta or {})
+        entry.update({"file": file_name, "bytes": size, "ts": datetime.now().timestamp()})
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            sizes = self._load_sizes()
+            with open(os.path.join(directory, MANIFEST), 'a', encoding='utf-8') as f:
+                f.write(line)
+            sizes[partition] = sizes.get(partition, 0) + size
+            over_quota = sum(sizes.values()) > self.max_bytes
+        if over_quota:
+            self._wake.set()
+
+    # --- Sizes ---
+    def _load_sizes(self):
+        # Called with the lock held; reads one manifest per partition, once per process
+        if self._sizes is None:
+            self._sizes = {p: self._partition_size(p) for p in self.partitions()}
+        return self._sizes
+
+    def _partition_size(self, partition):
+        directory = os.path.join(self.root, partition)
+        manifest = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest):
+            total = 0
+            with open(manifest, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        total += json.loads(line)['bytes']
+                    except (ValueError, KeyError):
+                        continue
+            return total
+        # Partition without a manifest (e.g. copied in by hand): measure it once and write one
+        lines = [json.dumps({"file": e.name, "bytes": e.stat().st_size, "ts": e.stat().st_mtime}) + "\n"
+                 for e in os.scandir(directory) if e.is_file()]
+        with open(manifest, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        return sum(json.loads(line)['bytes'] for line in lines)
+
+    def partitions(self):
+        """Partition names, oldest first."""
+        return sorted(e.name for e in os.scandir(self.root) if e.is_dir() and _PARTITION_RE.match(e.name))
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(self._load_sizes().values())
+
+    # --- Pruning ---
+    def prune(self, now=None):
+        """
+        Drops partitions older than retention_days, then the oldest partitions while the
+        store is over max_bytes (today's partition is never dropped). Returns the names dropped.
+        """
+        now = now or datetime.now()
+        cutoff = (now - timedelta(days=self.retention_days)).strftime(PARTITION_FORMAT)
+        today = now.strftime(PARTITION_FORMAT)
+        with self._lock:
+            sizes = self._load_sizes()
+            doomed = [p for p in sorted(sizes) if p < cutoff]
+            total = sum(sizes[p] for p in sizes if p not in doomed)
+            for partition in sorted(sizes):
+                if total <= self.max_bytes or partition >= today:
+                    break
+                if partition not in doomed:
+                    doomed.append(partition)
+                    total -= sizes[partition]
+            freed = sum(sizes.pop(partition) for partition in doomed)
+
+        for partition in doomed:
+            shutil.rmtree(os.path.join(self.root, partition), ignore_errors=True)
+        if doomed:
+            self.log(f"Pruned {len(doomed)} screenshot partition(s) ({freed / 1e6:.1f} MB): {', '.join(doomed)}.", "SUCCESS")
+            if self.metrics is not None:
+                self.metrics.incr("screenshot_partitions_pruned", len(doomed))
+        if total > self.max_bytes:
+            self.log(f"Screenshots use {total / 1e6:.1f} MB, above the {self.max_bytes / 1e6:.1f} MB quota, "
+                     f"all of it from today.", "WARNING")
+        return doomed
+
+    def migrate_flat_files(self):
+        """Moves images saved directly under root (before partitioning) into their day's partition."""
+        self.total_bytes()  # Load the partition sizes before new files arrive
+        moved = 0
+        for entry in list(os.scandir(self.root)):
+            if not entry.is_file() or entry.name == MANIFEST:
+                continue
+            when = datetime.fromtimestamp(entry.stat().st_mtime)
+            target = self.path_for(entry.name, when)
+            os.replace(entry.path, target)
+            self.record(target)
+            moved += 1
+        if moved:
+            self.log(f"Moved {moved} screenshot(s) into date partitions.", "DEBUG")
+
+    def start(self):
+        """Starts the background pruner (migrates old flat files first)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="screenshot-pruner", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            self.migrate_flat_files()
+        except OSError as e:
+            self.log(f"Screenshot migration error: {e}", "WARNING")
+        while True:
+            try:
+                self.prune()
+            except OSError as e:
+                self.log(f"Screenshot pruning error: {e}", "WARNING")
+            self._wake.wait(self.prune_interval)
+            self._wake.clear()
@@ -0,0 +1,247 @@
+import time
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# --- WPPConnect Session Monitor (dashboard) ---
+# One monitor per (server, session) polls the session status in the background, and
+# the QR code while one is waiting to be scanned. Results are cached for a short TTL
+# and concurrent requests for the same endpoint share one upstream call, so browsers
+# reading /api/session/status, /api/session/qr or the /api/session/events stream
+# never multiply the load on the WPPConnect server. The poller stops after idle_seconds
+# without viewers and restarts on the next request. The QR image is kept as bytes with a
+# content hash, so browsers download it once per new code (ETag / If-None-Match).
+# Upstream calls run on a small shared thread pool: a request waits at most
+# wait_seconds for one, then gets the last known answer (or UpstreamTimeout), so a slow
+# WPPConnect server never holds more server threads than the pool has workers.
+
+DEFAULT_SETTINGS = {
+    "poll_seconds": 3,             # Status poll interval while not connected
+    "connected_poll_seconds": 30,  # ... and once the session is connected
+    "cache_ttl_seconds": 3,        # Requests within this age are served from the cache
+    "idle_seconds": 60,            # Stop polling this long after the last viewer left
+    "wait_seconds": 5,             # Longest a request waits for an upstream answer
+    "upstream_workers": 8,         # Shared pool for upstream status/QR calls (all sessions)
+    "connect_timeout_seconds": 3,  # Per-route upstream timeouts (connect, then read)
+    "status_timeout_seconds": 10,
+    "qr_timeout_seconds": 15,
+    "start_timeout_seconds": 15,
+    "logout_timeout_seconds": 10,
+}
+
+QR_STATES = ("QRCODE", "DISCONNECTED")
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+class UpstreamTimeout(Exception):
+    """No answer from WPPConnect within wait_seconds and nothing cached to fall back on."""
+
+
+def get_upstream_pool(workers=8):
+    """Returns the process-wide executor for upstream calls (created on first use)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wpp-upstream")
+        return _POOL
+
+
+def session_state(body):
+    """The state field of a status-session response (its name varies between versions)."""
+    if not isinstance(body, dict):
+        return None
+    return body.get('status') or body.get('state') or body.get('statusSession')
+
+
+def fetch_status(client, timeout=10):
+    """Upstream status-session call as (JSON body, HTTP status)."""
+    try:
+        response = client.request("GET", "status-session", timeout=timeout)
+        return response.json(), response.status_code
+    except Exception as e:
+        return {"success": False, "message": str(e)}, 500
+
+
+class QRCode:
+    """One qrcode-session answer: the decoded image (if any) and its ETag, or the error body."""
+
+    def __init__(self, body, status_code, image=None, mime=None):
+        self.body = body
+        self.status_code = status_code
+        self.image = image
+        self.mime = mime
+        self.etag = hashlib.sha256(image).hexdigest()[:32] if image else None
+
+    def data_url(self):
+        return f"data:{self.mime};base64,{base64.b64encode(self.image).decode('ascii')}" if self.image else None
+
+
+def decode_data_url(value):
+    """(bytes, mime) of a 'data:image/png;base64,...' string (plain base64 is taken as PNG)."""
+    header, _, data = value.partition(',') if value.startswith('data:') else ("data:image/png;base64", "", value)
+    mime = header[5:].split(';')[0] or "image/png"
+    return base64.b64decode(data), mime
+
+
+def fetch_qr(client, log, timeout=15):
+    """Upstream qrcode-session call as a QRCode; JSON answers carrying a data URL are decoded too."""
+    try:
+        response = client.request("GET", "qrcode-session", timeout=timeout)
+        content_type = response.headers.get('Content-Type', '')
+        log(f"QR response status: {response.status_code} ({content_type})", "DEBUG")
+        if 'image' in content_type:
+            return QRCode(None, 200, response.content, content_type.split(';')[0])
+        try:
+            body = response.json()
+        except Exception:
+            log(f"QR Raw text: {response.text[:100]}...", "DEBUG")
+            return QRCode({"success": False, "message": "Unexpected response format", "raw": response.text[:200]}, 500)
+        qr = body.get('base64') or body.get('qrcode') if isinstance(body, dict) else None
+        if qr:
+            try:
+                return QRCode(body, response.status_code, *decode_data_url(qr))
+            except ValueError:
+                pass
+        return QRCode(body, response.status_code)
+    except Exception as e:
+        log(f"QR exception: {e}", "DEBUG")
+        return QRCode({"success": False, "message": str(e)}, 500)
+
+
+class SessionMonitor:
+    def __init__(self, client, settings=None, logger=None):
+        s = dict(DEFAULT_SETTINGS)
+        s.update(settings or {})
+        self.client = client
+        self.settings = s
+        self.log = logger or (lambda message, type="INFO": print(message))
+        self.version = 0
+        self.snapshot = {"version": 0, "status_code": None, "status": None, "state": None, "qr_etag": None}
+        self.upstream_calls = 0
+        self._cache = {}     # endpoint -> (monotonic time, (body, status))
+        self._inflight = {}  # endpoint -> Future of the upstream call in progress
+        self._pool = get_upstream_pool(s['upstream_workers'])
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._thread = None
+        self._subscribers = 0
+        self._last_access = time.monotonic()
+
+    def timeout(self, route):
+        """requests timeout (connect, read) for an upstream route: status, qr, start or logout."""
+        return self.settings['connect_timeout_seconds'], self.settings[f'{route}_timeout_seconds']
+
+    # --- Cached, coalesced upstream calls ---
+    def _get(self, endpoint, fetch, max_age, wait=None):
+        with self._lock:
+            cached = self._cache.get(endpoint)
+            if cached is not None and time.monotonic() - cached[0] <= max_age:
+                return cached[1]
+            flight = self._inflight.get(endpoint)
+            if flight is None:  # Otherwise someone else is already asking upstream
+                flight = self._inflight[endpoint] = self._pool.submit(self._refresh, endpoint, fetch)
+                self.upstream_calls += 1
+        try:
+            return flight.result(timeout=wait)
+        except FutureTimeout:
+            if cached is not None:
+                return cached[1]  # Upstream is slow: last known answer, the call keeps running
+            raise UpstreamTimeout(f"No {endpoint} answer from WPPConnect within {wait} s") from None
+
+    def _refresh(self, endpoint, fetch):
+        try:
+            result = fetch()
+            with self._lock:
+                self._cache[endpoint] = (time.monotonic(), result)
+        finally:
+            with self._lock:
+                self._inflight.pop(endpoint, None)
+        self._publish()
+        return result
+
+    def _fetch_status(self):
+        return fetch_status(self.client, self.timeout("status"))
+
+    def _fetch_qr(self):
+        return fetch_qr(self.client, self.log, self.timeout("qr"))
+
+    def status(self, max_age=None):
+        """
+        (status-session body, HTTP status), at most max_age (default: cache TTL) seconds old,
+        or older if upstream does not answer within wait_seconds.
+        """
+        self._last_access = time.monotonic()
+        self.ensure_polling()
+        max_age = self.settings['cache_ttl_seconds'] if max_age is None else max_age
+        return self._get("status", self._fetch_status, max_age, self.settings['wait_seconds'])
+
+    def qr(self, max_age=None):
+        """The QRCode, at most max_age seconds old (same fallback as status())."""
+        self._last_access = time.monotonic()
+        self.ensure_polling()
+        max_age = self.settings['cache_ttl_seconds'] if max_age is None else max_age
+        return self._get("qr", self._fetch_qr, max_age, self.settings['wait_seconds'])
+
+    def invalidate(self):
+        """Drops the cache and polls right away (after start/logout)."""
+        with self._lock:
+            self._cache.clear()
+        self._wake.set()
+
+    # --- Change notification ---
+    def _publish(self):
+        with self._lock:
+            status = self._cache.get("status", (0, (None, None)))[1]
+            qr = self._cache.get("qr", (0, None))[1]
+            state = session_state(status[0])
+            qr_etag = qr.etag if qr is not None and state in QR_STATES else None
+            current = {"status_code": status[1], "status": status[0], "state": state, "qr_etag": qr_etag}
+            if current == {k: v for k, v in self.snapshot.items() if k != "version"}:
+                return
+            self.version += 1
+            self.snapshot = {"version": self.version, **current}
+            self._changed.notify_all()
+
+    def wait_for_change(self, version, timeout):
+        """The snapshot once its version differs from version (or the current one after timeout)."""
+        with self._changed:
+            self._last_access = time.monotonic()
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.snapshot
+
+    def subscribe(self):
+        with self._lock:
+            self._subscribers += 1
+        self.ensure_polling()
+
+    def unsubscribe(self):
+        with self._lock:
+            self._subscribers -= 1
+            self._last_access = time.monotonic()
+
+    # --- Background poller ---
+    def ensure_polling(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll, name=f"session-{self.client.session}",
+                                                daemon=True)
+                self._thread.start()
+
+    def _poll(self):
+        while True:
+            with self._lock:
+                idle = time.monotonic() - self._last_access > self.settings['idle_seconds']
+                if self._subscribers <= 0 and idle:
+                    self._thread = None
+                    return
+            body, status_code = self._get("status", self._fetch_status, 0)
+            state = session_state(body)
+            if status_code == 200 and state in QR_STATES:
+                self._get("qr", self._fetch_qr, 0)
+            interval = self.settings['connected_poll_seconds' if state == 'CONNECTED' else 'poll_seconds']
+            self._wake.wait(interval)
+            self._wake.clear()
@@ -0,0 +1,122 @@
+import time
+
+from outbox import DeliveryWorker, Outbox, backoff_delay
+from wpp_client import ImagePayload
+
+PAYLOAD = ImagePayload("image/png", b"aGVsbG8=")
+
+
+def quiet(message, type="INFO"):
+    pass
+
+
+class FakeClient:
+    """Stands in for WPPConnectClient: fails the first `failures` sends per recipient."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    def send_image_result(self, recipient, payload, caption):
+        self.sent.append(recipient)
+        if self.sent.count(recipient) <= self.failures:
+            return False, "HTTP 500"
+        return True, None
+
+    def log(self, message, type="INFO"):
+        pass
+
+
+def make_outbox(tmp_path, **kwargs):
+    return Outbox(str(tmp_path / "outbox.db"), **kwargs)
+
+
+def test_backoff_grows_with_equal_jitter_up_to_the_cap():
+    for attempts, full in [(1, 10), (2, 20), (3, 40), (10, 100)]:
+        for _ in range(20):
+            assert full / 2 <= backoff_delay(attempts, 10, 100) <= full
+
+
+def test_enqueue_dedupes_per_report_and_recipient(tmp_path):
+    outbox = make_outbox(tmp_path)
+    assert outbox.enqueue("r1", PAYLOAD, [("a", "cap"), ("b", "cap")]) == 2
+    assert outbox.enqueue("r1", PAYLOAD, [("a", "cap"), ("c", "cap")]) == 1
+    assert outbox.report_status("r1") == {"a": "pending", "b": "pending", "c": "pending"}
+
+
+def test_failed_send_is_retried_after_backoff_then_given_up(tmp_path):
+    outbox = make_outbox(tmp_path, max_attempts=3, base_backoff=10, max_backoff=100)
+    outbox.enqueue("r1", PAYLOAD, [("a", "cap")])
+    delivery_id, _, _, _, attempts, created_at = outbox.due()[0]
+
+    before = time.time()
+    status, next_at = outbox.mark_failed(delivery_id, attempts, "HTTP 500", created_at)
+    assert status == "pending"
+    assert before + 5 <= next_at <= time.time() + 10
+    assert outbox.due() == []  # Not due again until the backoff has passed
+
+    outbox.mark_failed(delivery_id, 1, "HTTP 500", created_at)
+    status, _ = outbox.mark_failed(delivery_id, 2, "HTTP 500", created_at)
+    assert status == "failed"
+    assert outbox.report_status("r1") == {"a": "failed"}
+
+
+def test_retry_past_max_age_gives_up(tmp_path):
+    outbox = make_outbox(tmp_path, base_backoff=60, max_age=30)
+    outbox.enqueue("r1", PAYLOAD, [("a", "cap")])
+    delivery_id, _, _, _, attempts, created_at = outbox.due()[0]
+    status, _ = outbox.mark_failed(delivery_id, attempts, "timeout", created_at)
+    assert status == "failed"
+
+
+def test_expire_stale_gives_up_old_pending_deliveries(tmp_path):
+    outbox = make_outbox(tmp_path, max_age=60)
+    outbox.enqueue("old", PAYLOAD, [("a", "cap")])
+    outbox.enqueue("new", PAYLOAD, [("a", "cap")])
+    with outbox._connect() as db:
+        db.execute("UPDATE deliveries SET created_at = ? WHERE report_id = 'old'", (time.time() - 120,))
+    assert outbox.expire_stale() == [("old", "a")]
+    assert outbox.report_status("old") == {"a": "failed"}
+    assert outbox.report_status("new") == {"a": "pending"}
+
+
+def test_prune_drops_old_finished_reports_only(tmp_path):
+    outbox = make_outbox(tmp_path, retention_days=1)
+    outbox.enqueue("done", PAYLOAD, [("a", "cap")])
+    outbox.enqueue("waiting", PAYLOAD, [("a", "cap")])
+    outbox.mark_sent(outbox.due()[0][0])
+    old = time.time() - 2 * 86400
+    with outbox._connect() as db:
+        db.execute("UPDATE deliveries SET created_at = ?", (old,))
+        db.execute("UPDATE reports SET created_at = ?", (old,))
+    outbox.prune()
+    assert outbox.load_payload("done") is None
+    assert outbox.load_payload("waiting") is not None
+    assert outbox.report_status("waiting") == {"a": "pending"}
+
+
+def test_worker_retries_failed_sends_and_reports_each_status(tmp_path):
+    outbox = make_outbox(tmp_path, base_backoff=0, max_backoff=0)
+    outbox.enqueue("r1", PAYLOAD, [("a", "cap")])
+    client = FakeClient(failures=1)
+    statuses = []
+    worker = DeliveryWorker(outbox, lambda: client, quiet, rate_per_second=0,
+                            on_status=lambda *args: statuses.append(args))
+    worker.deliver_due()
+    worker.deliver_due()
+    assert client.sent == ["a", "a"]
+    assert statuses == [("r1", "a", "pending", "HTTP 500"), ("r1", "a", "sent", None)]
+    assert outbox.report_status("r1") == {"a": "sent"}
+
+
+def test_worker_prunes_on_a_timer(tmp_path, monkeypatch):
+    outbox = make_outbox(tmp_path, prune_interval=0.05)
+    calls = []
+    monkeypatch.setattr(outbox, "prune", lambda: calls.append(time.monotonic()))
+    worker = DeliveryWorker(outbox, FakeClient, quiet)
+    worker.start()
+    try:
+        time.sleep(0.3)
+    finally:
+        worker.stop()
+    assert len(calls) >= 3
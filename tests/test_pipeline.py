@@ -0,0 +1,92 @@
+import threading
+
+from pipeline import Pipeline
+
+
+class Recorder:
+    def __init__(self):
+        self.lines = []
+
+    def __call__(self, message, type="INFO"):
+        self.lines.append((type, message))
+
+
+def stage(name, calls, result=None, error=None):
+    """Handler recording its calls; returns result (default: the run) or raises error."""
+    def handler(run):
+        calls.append((name, run.label))
+        if error is not None:
+            raise error
+        return run if result is None else result
+    return handler
+
+
+def test_run_passes_every_stage_and_succeeds():
+    calls, finished = [], []
+    pipeline = Pipeline([(name, stage(name, calls)) for name in ("capture", "ocr", "deliver")], Recorder(),
+                        on_finish=lambda run, result: finished.append((run.label, result)))
+    assert pipeline.submit("plant1", is_test=True).result(timeout=5) is True
+    assert calls == [("capture", "plant1"), ("ocr", "plant1"), ("deliver", "plant1")]
+    assert finished == [("plant1", True)]
+
+
+def test_false_result_ends_the_run_without_later_stages():
+    calls, finished = [], []
+    pipeline = Pipeline([("capture", stage("capture", calls)), ("ocr", stage("ocr", calls, result=False)),
+                         ("deliver", stage("deliver", calls))], Recorder(),
+                        on_finish=lambda run, result: finished.append(result))
+    assert pipeline.submit("plant1").result(timeout=5) is False
+    assert calls == [("capture", "plant1"), ("ocr", "plant1")]
+    assert finished == [False]
+
+
+def test_exception_fails_the_run_and_the_stage_keeps_working():
+    calls, log = [], Recorder()
+    failing = {"bad"}
+
+    def ocr(run):
+        calls.append(("ocr", run.label))
+        if run.label in failing:
+            raise RuntimeError("reader crashed")
+        return run
+
+    pipeline = Pipeline([("capture", stage("capture", calls)), ("ocr", ocr), ("deliver", stage("deliver", calls))],
+                        log)
+    assert pipeline.submit("bad").result(timeout=5) is False
+    assert ("ERROR", "Job 'bad' failed in ocr stage: reader crashed") in log.lines
+    assert ("deliver", "bad") not in calls
+    assert pipeline.submit("good").result(timeout=5) is True
+
+
+def test_fields_and_timings_travel_with_the_run():
+    seen = {}
+
+    def deliver(run):
+        seen.update(slot=run.slot, stages=sorted(run.timings))
+        return True
+
+    pipeline = Pipeline([("capture", lambda run: run), ("deliver", deliver)], Recorder())
+    assert pipeline.submit("plant1", slot="10:00").result(timeout=5) is True
+    assert seen == {"slot": "10:00", "stages": ["capture"]}
+
+
+def test_finish_hook_errors_do_not_block_the_result():
+    def broken_hook(run, result):
+        raise ValueError("hook")
+
+    log = Recorder()
+    pipeline = Pipeline([("capture", lambda run: run)], log, on_finish=broken_hook)
+    assert pipeline.submit("plant1").result(timeout=5) is True
+    assert any(type == "ERROR" and "finish hook" in message for type, message in log.lines)
+
+
+def test_stage_with_several_workers_runs_in_parallel():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def ocr(run):
+        barrier.wait()  # Only returns once both runs are in the stage at the same time
+        return run
+
+    pipeline = Pipeline([("ocr", ocr)], Recorder(), workers={"ocr": 2})
+    futures = [pipeline.submit(f"plant{i}") for i in range(2)]
+    assert [f.result(timeout=5) for f in futures] == [True, True]
@@ -0,0 +1,79 @@
+from PIL import Image, ImageDraw
+
+from capture import CaptureBackend, frame_difference, preview_signature, wait_until_ready
+
+REGIONS = [{"name": "DC", "x": 0, "y": 0, "width": 64, "height": 32}]
+
+
+def rendered(step):
+    """A dashboard preview: blank at step 0, then a bar that grows until step 3."""
+    image = Image.new("RGB", (64, 32), "white")
+    if step:
+        ImageDraw.Draw(image).rectangle((0, 8, 16 * min(step, 3), 24), fill="black")
+    return image
+
+
+class FakeBackend(CaptureBackend):
+    """Returns one preview per call from a list, repeating the last one."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.calls = 0
+
+    def grab_preview(self, regions, hwnd=None):
+        frame = self.frames[min(self.calls, len(self.frames) - 1)]
+        self.calls += 1
+        return frame
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def wait(backend, clock, **settings):
+    return wait_until_ready(backend, REGIONS, settings=settings, sleep=clock.sleep, clock=clock)
+
+
+def test_ready_once_consecutive_previews_stop_changing():
+    backend = FakeBackend([rendered(step) for step in range(5)])
+    clock = FakeClock()
+    ready, previews, diff = wait(backend, clock, stable_frames=2, interval_seconds=0.1)
+    # Steps 3, 4 and 5 look the same: two stable comparisons after the bar stops growing
+    assert ready
+    assert previews == 6
+    assert diff == 0.0
+    assert clock.sleeps == [0.1] * 5
+
+
+def test_blank_previews_never_count_as_ready():
+    clock = FakeClock()
+    ready, previews, _diff = wait(FakeBackend([rendered(0)]), clock, timeout_seconds=1.0, interval_seconds=0.25)
+    assert not ready
+    assert previews == 5
+    assert clock.now == 1.0
+
+
+def test_gives_up_at_the_timeout_while_still_changing():
+    frames = [rendered(step % 2 + 1) for step in range(100)]
+    ready, previews, diff = wait(FakeBackend(frames), FakeClock(), timeout_seconds=0.5, interval_seconds=0.1)
+    assert not ready
+    assert previews == 6
+    assert diff > 2.0
+
+
+def test_frame_difference_of_signatures():
+    a = preview_signature(rendered(1), 32)
+    b = preview_signature(rendered(3), 32)
+    assert a.size == (32, 16)
+    assert frame_difference(a, a) == 0.0
+    assert frame_difference(a, b) > 0
+    assert frame_difference(a, preview_signature(rendered(1), 16)) == 255.0
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from scheduler import ScheduleEntry, Scheduler, parse_hours
+
+
+def quiet(message, type="INFO"):
+    pass
+
+
+def test_parse_hours():
+    assert parse_hours("0-2,23") == [0, 1, 2, 23]
+    assert parse_hours("*") == list(range(24))
+    assert parse_hours(5) == [5]
+    with pytest.raises(ValueError):
+        parse_hours([24])
+
+
+def test_next_run_falls_inside_the_jitter_window():
+    entry = ScheduleEntry("hourly", hours="*", minute=0, jitter_minutes=10)
+    now = datetime(2026, 1, 31, 9, 30)
+    for _ in range(50):
+        at = entry.next_run(now)
+        assert datetime(2026, 1, 31, 10, 0) <= at <= datetime(2026, 1, 31, 10, 10)
+
+
+def test_next_run_uses_the_open_window_unless_skipped():
+    entry = ScheduleEntry("hourly", hours="*", minute=0, jitter_minutes=10)
+    now = datetime(2026, 1, 31, 10, 4)
+    at = entry.next_run(now)
+    assert now < at <= datetime(2026, 1, 31, 10, 10)
+    at = entry.next_run(now, allow_current=False)
+    assert datetime(2026, 1, 31, 11, 0) <= at <= datetime(2026, 1, 31, 11, 10)
+
+
+def test_next_run_rolls_over_to_tomorrow():
+    entry = ScheduleEntry("evening", hours=[22], minute=0, jitter_minutes=0)
+    assert entry.next_run(datetime(2026, 1, 31, 22, 30)) == datetime(2026, 2, 1, 22, 0)
+
+
+def test_slot_for_returns_the_scheduled_time_of_a_late_run():
+    entry = ScheduleEntry("hourly", hours="0-21,23", minute=0, jitter_minutes=10)
+    assert entry.slot_for(datetime(2026, 1, 31, 10, 59)) == datetime(2026, 1, 31, 10, 0)
+    # 22:00 is not in this entry's hours, so a 22:30 run still belongs to 21:00
+    assert entry.slot_for(datetime(2026, 1, 31, 22, 30)) == datetime(2026, 1, 31, 21, 0)
+    assert entry.slot_for(datetime(2026, 2, 1, 0, 0, 5)) == datetime(2026, 2, 1, 0, 0)
+
+
+def test_failed_run_is_retried_before_the_next_regular_run():
+    entry = ScheduleEntry("hourly", hours="*", minute=0, jitter_minutes=10, retry_minutes=5, job="plant")
+    scheduler = Scheduler([entry], lambda e: True, quiet)
+    now = datetime(2026, 1, 31, 10, 5)
+    scheduler.reschedule(entry, 0, False, now=now)
+    at, _, queued, attempt = scheduler._heap[0]
+    assert (at, queued, attempt) == (now + timedelta(minutes=5), entry, 1)
+
+
+def test_retry_past_the_next_regular_run_waits_for_it():
+    entry = ScheduleEntry("hourly", hours="*", minute=0, jitter_minutes=10, retry_minutes=5, job="plant")
+    scheduler = Scheduler([entry], lambda e: True, quiet)
+    scheduler.reschedule(entry, 0, False, now=datetime(2026, 1, 31, 10, 57))
+    at, _, _, attempt = scheduler._heap[0]
+    assert attempt == 0
+    assert datetime(2026, 1, 31, 11, 0) <= at <= datetime(2026, 1, 31, 11, 10)
+
+
+def test_max_retries_limits_the_retries():
+    entry = ScheduleEntry("hourly", hours="*", minute=0, retry_minutes=1, max_retries=2, job="plant")
+    scheduler = Scheduler([entry], lambda e: True, quiet)
+    scheduler.reschedule(entry, 2, False, now=datetime(2026, 1, 31, 10, 5))
+    at, _, _, attempt = scheduler._heap[0]
+    assert (at, attempt) == (datetime(2026, 1, 31, 11, 0), 0)
@@ -1,14 +1,17 @@
 import os
 import sys
+import time
 import threading
-import queue
 from datetime import datetime
 from PIL import Image, ImageDraw
 import pystray
 from pystray import MenuItem as item
+from logs import DEFAULT_SETTINGS as LOG_DEFAULTS, format_emoji, tail_records
+from log_store import LogRing, LogHistory
 
 # Global variables
-log_queue = queue.Queue(maxsize=100)
+LOG_RING = LogRing(capacity=5000)  # Recent console lines, numbered for the log viewer
+VIEWER_MAX_LINES = 2000  # Lines kept in the viewer's text widget
 bot_thread = None
 stop_event = threading.Event()
 original_print = print
@@ -38,17 +41,62 @@ def custom_print(*args, **kwargs):
     # Call original print
     original_print(*args, **kwargs)
     
-    # Capture to queue
-    message = ' '.join(str(arg) for arg in args)
+    # Capture to the ring buffer (the oldest lines are overwritten)
+    LOG_RING.append(' '.join(str(arg) for arg in args))
+
+def log_settings():
+    """The 'logging' settings from config.json over the defaults"""
+    import json
+    settings = dict(LOG_DEFAULTS)
     try:
-        log_queue.put_nowait(message)
-    except queue.Full:
-        # Remove oldest and add new
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json'), 'r', encoding='utf-8') as f:
+            settings.update(json.load(f).get('logging') or {})
+    except (OSError, ValueError):
+        pass
+    return settings
+
+def bot_log_path():
+    """Path of the bot's structured log (config 'logging.dir', default logs/bot.jsonl)."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    settings = log_settings()
+    directory = settings['dir'] if os.path.isabs(settings['dir']) else os.path.join(base_dir, settings['dir'])
+    return os.path.join(directory, 'bot.jsonl')
+
+def parse_search_time(text, now=None):
+    """
+    Search bound from the viewer: '' -> None, '2h' / '30m' -> that long ago,
+    'HH:MM' -> today at that time, 'YYYY-MM-DD HH:MM' -> that moment. Returns epoch seconds.
+    """
+    text = text.strip()
+    if not text:
+        return None
+    now = now or datetime.now()
+    if text[-1] in "hm" and text[:-1].replace('.', '', 1).isdigit():
+        seconds = float(text[:-1]) * (3600 if text[-1] == 'h' else 60)
+        return now.timestamp() - seconds
+    for fmt in ("%Y-%m-%d %H:%M", "%H:%M"):
         try:
-            log_queue.get_nowait()
-            log_queue.put_nowait(message)
-        except:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if fmt == "%H:%M":
+            parsed = now.replace(hour=parsed.hour, minute=parsed.minute, second=0, microsecond=0)
+        return parsed.timestamp()
+    raise ValueError(f"Unrecognized time '{text}' (use 2h, 30m, HH:MM or YYYY-MM-DD HH:MM)")
+
+def follow_bot_log():
+    """Follows the bot's JSONL log and queues each record's console line"""
+    path = bot_log_path()
+    # Start with the tail of the existing history (a partial first line is skipped)
+    offset = max(0, os.path.getsize(path) - 65536) if os.path.exists(path) else 0
+    while not stop_event.is_set():
+        try:
+            records, offset = tail_records(path, offset)
+            for record in records:
+                custom_print(format_emoji(record))
+        except OSError:
             pass
+        stop_event.wait(0.5)
 
 def run_bot():
     """Run the bot in a separate thread"""
@@ -67,9 +115,10 @@ def run_bot():
         env['PYTHONIOENCODING'] = 'utf-8'
         env['PYTHONUNBUFFERED'] = '1'  # Force unbuffered output
         
-        # Run main.py as a subprocess with -u flag for unbuffered
+        # Run main.py as a subprocess with -u flag for unbuffered. Its log records are
+        # read from the JSONL log; stdout only carries other output (e.g. tracebacks)
         process = subprocess.Popen(
-            [python_exe, '-u', main_script],  # -u for unbuffered output
+            [python_exe, '-u', main_script, '--no-console'],  # -u for unbuffered output
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
@@ -115,7 +164,7 @@ def show_logs(icon, item):
     auto_scroll_check = tk.Checkbutton(control_frame, text="Auto-scroll", variable=auto_scroll_var)
     auto_scroll_check.pack(side=tk.LEFT)
     
-    # Clear button
+    # Clear button (only clears the view; new lines keep arriving)
     def clear_logs():
         text_area.config(state=tk.NORMAL)
         text_area.delete(1.0, tk.END)
@@ -129,84 +178,94 @@ def show_logs(icon, item):
     status_label = tk.Label(control_frame, text="● Live", fg="green", font=("Segoe UI", 9, "bold"))
     status_label.pack(side=tk.RIGHT)
     
+    # Search bar: text and time range over the bot's log history on disk
+    search_frame = tk.Frame(window)
+    search_frame.pack(fill=tk.X, padx=10)
+    tk.Label(search_frame, text="Search:").pack(side=tk.LEFT)
+    search_text = tk.Entry(search_frame, width=30)
+    search_text.pack(side=tk.LEFT, padx=5)
+    tk.Label(search_frame, text="From:").pack(side=tk.LEFT)
+    search_from = tk.Entry(search_frame, width=16)
+    search_from.insert(0, "24h")
+    search_from.pack(side=tk.LEFT, padx=5)
+    tk.Label(search_frame, text="To:").pack(side=tk.LEFT)
+    search_to = tk.Entry(search_frame, width=16)
+    search_to.pack(side=tk.LEFT, padx=5)
+    
+    history = LogHistory(bot_log_path(), log_settings()['backups'])
+    
+    def search_logs(event=None):
+        try:
+            since = parse_search_time(search_from.get())
+            until = parse_search_time(search_to.get())
+        except ValueError as e:
+            status_label.config(text=str(e), fg="red")
+            return
+        status_label.config(text="● Live", fg="green")
+        t = time.perf_counter()
+        records = history.search(since, until, search_text.get().strip() or None, limit=1000)
+        elapsed = time.perf_counter() - t
+        
+        results = tk.Toplevel(window)
+        results.title(f"Log search - {len(records)} result(s) in {elapsed * 1000:.0f} ms")
+        results.geometry("900x500")
+        results_area = scrolledtext.ScrolledText(results, wrap=tk.WORD, font=("Consolas", 9),
+                                                 bg="#1e1e1e", fg="#d4d4d4")
+        results_area.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+        if records:
+            results_area.insert(tk.END, '\n'.join(format_emoji(r) for r in records) + '\n')
+        else:
+            results_area.insert(tk.END, "No matching log records.\n")
+        results_area.config(state=tk.DISABLED)
+        results_area.see(tk.END)
+    
+    search_btn = tk.Button(search_frame, text="Search", command=search_logs)
+    search_btn.pack(side=tk.LEFT, padx=5)
+    search_text.bind('<Return>', search_logs)
+    
     # Create scrolled text widget
     text_area = scrolledtext.ScrolledText(window, wrap=tk.WORD, width=100, height=30, 
                                           font=("Consolas", 9), bg="#1e1e1e", fg="#d4d4d4")
     text_area.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
     
-    # Track displayed logs count
-    displayed_count = [0]
+    # Sequence number of the last line shown
+    last_seq = [0]
+    
+    def show_new_lines():
+        """Append the lines logged since last_seq; returns whether anything was added"""
+        entries, _missed = LOG_RING.since(last_seq[0], limit=VIEWER_MAX_LINES)
+        if not entries:
+            return False
+        # Lines overwritten in the ring or beyond the widget's limit
+        missed = entries[0][0] - last_seq[0] - 1
+        lines = []
+        if missed and last_seq[0]:
+            lines.append(f"... {missed} older line(s) skipped ...")
+        lines.extend(entry for _seq, entry in entries)
+        last_seq[0] = entries[-1][0]
+        
+        text_area.config(state=tk.NORMAL)
+        text_area.insert(tk.END, '\n'.join(lines) + '\n')
+        # Keep the widget bounded; drop the oldest lines
+        excess = int(text_area.index('end-1c').split('.')[0]) - 1 - VIEWER_MAX_LINES
+        if excess > 0:
+            text_area.delete('1.0', f'{excess + 1}.0')
+        text_area.config(state=tk.DISABLED)
+        return True
     
     def update_logs():
-        """Update logs from queue"""
+        """Update logs from the ring buffer"""
         if not window.winfo_exists():
             return
         
-        # Get all current logs
-        all_logs = []
-        temp_queue = []
-        
-        while not log_queue.empty():
-            try:
-                log = log_queue.get_nowait()
-                all_logs.append(log)
-                temp_queue.append(log)
-            except:
-                break
-        
-        # Put them back
-        for log in temp_queue:
-            try:
-                log_queue.put_nowait(log)
-            except:
-                pass
-        
-        # Check if there are new logs
-        if len(all_logs) > displayed_count[0]:
-            # Enable editing
-            text_area.config(state=tk.NORMAL)
-            
-            # Add only new logs
-            new_logs = all_logs[displayed_count[0]:]
-            for log in new_logs:
-                text_area.insert(tk.END, log + '\n')
-            
-            displayed_count[0] = len(all_logs)
-            
-            # Auto-scroll if enabled
-            if auto_scroll_var.get():
-                text_area.see(tk.END)
-            
-            # Disable editing
-            text_area.config(state=tk.DISABLED)
+        if show_new_lines() and auto_scroll_var.get():
+            text_area.see(tk.END)
         
         # Schedule next update (500ms)
         window.after(500, update_logs)
     
     # Initial display
-    all_logs = []
-    temp_queue = []
-    
-    while not log_queue.empty():
-        try:
-            log = log_queue.get_nowait()
-            all_logs.append(log)
-            temp_queue.append(log)
-        except:
-            break
-    
-    # Put them back
-    for log in temp_queue:
-        try:
-            log_queue.put_nowait(log)
-        except:
-            pass
-    
-    # Display initial logs
-    if all_logs:
-        text_area.insert(tk.END, '\n'.join(all_logs) + '\n')
-        displayed_count[0] = len(all_logs)
-    else:
+    if not show_new_lines():
         text_area.insert(tk.END, "Waiting for logs...\n")
     
     text_area.config(state=tk.DISABLED)
@@ -240,6 +299,7 @@ if __name__ == "__main__":
     # Start bot in separate thread
     bot_thread = threading.Thread(target=run_bot, daemon=True)
     bot_thread.start()
+    threading.Thread(target=follow_bot_log, daemon=True).start()
     
     # Setup and run system tray
     icon = setup_tray()
@@ -0,0 +1,418 @@
+import io
+import os
+import json
+import time
+import base64
+import threading
+import contextlib
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from report import format_caption
+
+# --- Shared WPPConnect Client ---
+# One pooled keep-alive HTTP session per process and one on-disk token store shared
+# by main.py, dashboard.py and get_groups.py.
+
+TOKEN_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wpp_tokens.json')
+DEFAULT_TOKEN_TTL_HOURS = 24
+
+_HTTP_SESSION = None
+_HTTP_LOCK = threading.Lock()
+_TOKEN_STORE = None
+
+
+def _default_log(message, type="INFO"):
+    print(f"[{type}] {message}")
+
+
+def get_http_session(pool_size=10, retries=2):
+    """
+    Returns the process-wide requests.Session (created on first use).
+    Connection errors are retried for every method; 502/503/504 responses only for
+    idempotent methods, so a send is never posted twice by the adapter.
+    """
+    global _HTTP_SESSION
+    with _HTTP_LOCK:
+        if _HTTP_SESSION is None:
+            retry = Retry(total=retries, connect=retries, read=0, status=retries, backoff_factor=0.5,
+                          status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET", "HEAD"}),
+                          raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _HTTP_SESSION = session
+        return _HTTP_SESSION
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Exclusive lock held across processes while the block runs (path is created if missing)."""
+    with open(path, 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after ~10 s; keep waiting
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class TokenStore:
+    """
+    Bearer tokens per (base_url, session), persisted to a JSON file with an expiry time.
+    The file is shared by several processes: every change re-reads it and writes it back
+    under a file lock, and a token missing from memory is looked up on disk again.
+    """
+
+    def __init__(self, path=TOKEN_STORE_PATH, ttl_hours=DEFAULT_TOKEN_TTL_HOURS):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._load()
+
+    @staticmethod
+    def _key(base_url, session):
+        return f"{base_url.rstrip('/')}|{session}"
+
+    def _read(self):
+        # Called with the file lock held
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with _file_lock(self.path + ".lock"):
+            self._tokens = self._read()
+
+    def _update(self, key, entry=None, only_if_token=None):
+        """
+        Sets key to entry (None removes it) in the file's current content, so tokens
+        written by other processes survive. only_if_token: remove only that token.
+        """
+        with _file_lock(self.path + ".lock") if self.path else contextlib.nullcontext():
+            tokens = self._read() if self.path else dict(self._tokens)
+            if entry is not None:
+                tokens[key] = entry
+            elif only_if_token is None or tokens.get(key, {}).get('token') == only_if_token:
+                tokens.pop(key, None)
+            if self.path:
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(tokens, f, indent=4)
+                os.replace(tmp_path, self.path)
+            self._tokens = tokens
+
+    def _valid(self, key):
+        entry = self._tokens.get(key)
+        if entry and entry.get('expires_at', 0) > time.time():
+            return entry['token']
+        return None
+
+    def get(self, base_url, session):
+        key = self._key(base_url, session)
+        with self._lock:
+            token = self._valid(key)
+            if token is None and self.path:
+                self._load()  # Another process may have generated one meanwhile
+                token = self._valid(key)
+            return token
+
+    def set(self, base_url, session, token):
+        with self._lock:
+            self._update(self._key(base_url, session), {"token": token, "expires_at": time.time() + self.ttl})
+
+    def invalidate(self, base_url, session):
+        """Drops the token this process holds (a newer one written by another process is kept)."""
+        key = self._key(base_url, session)
+        with self._lock:
+            held = self._tokens.get(key)
+            if held is not None:
+                self._update(key, only_if_token=held.get('token'))
+
+
+def get_token_store(path=TOKEN_STORE_PATH, ttl_hours=DEFAULT_TOKEN_TTL_HOURS):
+    """Returns the process-wide token store (created on first use)."""
+    global _TOKEN_STORE
+    with _HTTP_LOCK:
+        if _TOKEN_STORE is None:
+            _TOKEN_STORE = TokenStore(path, ttl_hours)
+        return _TOKEN_STORE
+
+
+# --- Report Image Payload ---
+IMAGE_MIME_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
+
+# format -> (PIL format name, mime type)
+PAYLOAD_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "jpg": ("JPEG", "image/jpeg"),
+                   "webp": ("WEBP", "image/webp"), "png": ("PNG", "image/png")}
+
+
+class ImagePayload:
+    """An encoded report image kept as base64 bytes, ready to splice into request bodies."""
+
+    def __init__(self, mime, b64, image_size=None):
+        self.mime = mime
+        self.b64 = b64
+        self.image_size = image_size
+
+    @classmethod
+    def from_file(cls, file_path):
+        with open(file_path, "rb") as img:
+            b64 = base64.b64encode(img.read())
+        return cls(IMAGE_MIME_TYPES.get(os.path.splitext(file_path)[1].lower(), "image/png"), b64)
+
+    def json_body(self, fields):
+        """
+        JSON request body with the image as a 'base64' data URI. The other fields are
+        serialized normally and the image bytes are spliced in, avoiding a str copy
+        of the whole image and a second pass through json.dumps.
+        """
+        head = json.dumps(fields, ensure_ascii=False)[:-1].encode('utf-8')
+        return b"".join([head, b', "base64": "data:', self.mime.encode('ascii'), b';base64,', self.b64, b'"}'])
+
+
+def encode_image_payload(image, settings=None):
+    """
+    Encodes a PIL image in memory per the 'report_image' settings
+    (format, quality, max_bytes). When max_bytes is set, quality is lowered and
+    then the image is downscaled until the encoded size fits.
+    """
+    from PIL import Image
+    settings = settings or {}
+    fmt = settings.get('format', 'jpeg').lower()
+    if fmt not in PAYLOAD_FORMATS:
+        raise ValueError(f"Unknown report_image format: {fmt}")
+    pil_format, mime = PAYLOAD_FORMATS[fmt]
+    quality = settings.get('quality', 80)
+    min_quality = settings.get('min_quality', 40)
+    max_bytes = settings.get('max_bytes')
+    if pil_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+
+    while True:
+        buffer = io.BytesIO()
+        if pil_format == "PNG":
+            image.save(buffer, format="PNG", compress_level=settings.get('compress_level', 6))
+        else:
+            image.save(buffer, format=pil_format, quality=quality)
+        size = buffer.tell()
+        if not max_bytes or size <= max_bytes or min(image.size) < 200:
+            break
+        if pil_format != "PNG" and quality > min_quality:
+            quality = max(min_quality, quality - 15)
+        else:
+            image = image.resize((int(image.size[0] * 0.75), int(image.size[1] * 0.75)), Image.Resampling.LANCZOS)
+
+    return ImagePayload(mime, base64.b64encode(buffer.getbuffer()), image.size)
+
+
+# --- WPPConnect Client ---
+class WPPConnectClient:
+    def __init__(self, base_url, session, secret_key, http=None, token_store=None, logger=None):
+        self.base_url = base_url.rstrip('/')
+        self.session = session
+        self.secret_key = secret_key
+        self.http = http or get_http_session()
+        self.tokens = token_store or get_token_store()
+        self.log = logger or _default_log
+        self._token_lock = threading.Lock()
+
+    @property
+    def token(self):
+        return self.tokens.get(self.base_url, self.session)
+
+    def _generate_token(self):
+        if not self.secret_key:
+            return False
+        self.log(f"Generating access token for session: {self.session}...", "DEBUG")
+        url = f"{self.base_url}/api/{self.session}/{self.secret_key}/generate-token"
+        try:
+            response = self.http.post(url, timeout=20)
+            if response.status_code in [200, 201]:
+                token = response.json().get('token')
+                if token:
+                    self.tokens.set(self.base_url, self.session, token)
+                    self.log("Token generated successfully.", "SUCCESS")
+                    return True
+            self.log(f"Failed to generate token: {response.text}", "ERROR")
+        except Exception as e:
+            self.log(f"Token generation error: {e}", "ERROR")
+        return False
+
+    def ensure_token(self, force=False):
+        """Returns a valid token, generating one if none is stored (or if forced)."""
+        with self._token_lock:  # Concurrent senders share one generate-token call
+            if force:
+                self.tokens.invalidate(self.base_url, self.session)
+            if not self.token:
+                self._generate_token()
+            return self.token
+
+    def request(self, method, endpoint, timeout=15, **kwargs):
+        """
+        Calls /api/<session>/<endpoint> with the stored token. A 401 invalidates the
+        token, regenerates it once and repeats the call. Network errors propagate.
+        """
+        url = f"{self.base_url}/api/{self.session}/{endpoint}"
+        headers = {"Content-Type": "application/json"}
+        headers.update(kwargs.pop('headers', {}))
+        token = self.ensure_token()
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        res = self.http.request(method, url, headers=headers, timeout=timeout, **kwargs)
+        if res.status_code == 401 and self.secret_key: # Token might be expired
+            token = self.ensure_token(force=True)
+            if token:
+                headers["Authorization"] = f"Bearer {token}"
+                res = self.http.request(method, url, headers=headers, timeout=timeout, **kwargs)
+        return res
+
+    def send_image(self, phone_number, image, caption="", settings=None):
+        """image: an ImagePayload, an in-memory PIL image, or a file path. Returns True on success."""
+        return self.send_image_result(phone_number, image, caption, settings)[0]
+
+    def send_image_result(self, phone_number, image, caption="", settings=None):
+        """Like send_image, but returns (success, error) with the HTTP status or exception on failure."""
+        if not self.ensure_token():
+            return False, "no token"
+
+        is_group = "@g.us" in phone_number
+        chat_id = phone_number if is_group else f"{phone_number.replace('+', '')}"
+
+        try:
+            if isinstance(image, ImagePayload):
+                payload = image
+            elif isinstance(image, str):
+                payload = ImagePayload.from_file(image)
+            else:
+                payload = encode_image_payload(image, settings)
+        except Exception as e:
+            self.log(f"Image encoding error: {e}", "ERROR")
+            return False, f"image encoding error: {e}"
+
+        body = payload.json_body({"phone": chat_id, "caption": caption, "isGroup": is_group})
+
+        self.log(f"Sending image to {phone_number} ({len(body) / 1024:.0f} KiB)...", "ACTION")
+        try:
+            res = self.request("POST", "send-image", data=body, timeout=45)
+            if res.status_code in [200, 201]:
+                self.log("Message sent successfully!", "SUCCESS")
+                return True, None
+            self.log(f"Send failed: {res.status_code} - {res.text}", "ERROR")
+            return False, f"HTTP {res.status_code}: {res.text[:200]}"
+        except Exception as e:
+            self.log(f"WPPConnect exception: {e}", "ERROR")
+            return False, f"{type(e).__name__}: {e}"
+
+
+# --- Multi-Recipient Delivery ---
+class RateLimiter:
+    """Spaces calls at least 1/per_second seconds apart, across threads."""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class DeliveryResult:
+    def __init__(self, recipient, success, elapsed, caption, error=None):
+        self.recipient = recipient
+        self.success = success
+        self.elapsed = elapsed
+        self.caption = caption
+        self.error = error  # HTTP status/body or exception of a failed send
+
+    def __repr__(self):
+        return f"DeliveryResult({self.recipient!r}, success={self.success}, elapsed={self.elapsed:.2f}s)"
+
+
+def resolve_recipients(config):
+    """
+    Recipients from config 'recipients' (chat ids, or {"id": ..., "caption": ...} objects
+    whose caption template may use {caption} and the report fields), falling back to
+    the single 'phone_number'.
+    """
+    entries = config.get('recipients') or [config['phone_number']]
+    recipients = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"id": entry}
+        recipients.append(entry)
+    return recipients
+
+
+def recipient_caption(recipient, caption, fields=None):
+    template = recipient.get('caption')
+    if not template:
+        return caption
+    # {caption} is always the report caption, even if a region is named 'caption'
+    values = dict(fields or {})
+    values['caption'] = caption
+    return format_caption(template, values)
+
+
+def send_concurrently(client, sends, max_workers=4, rate_per_second=2.0):
+    """
+    Runs (recipient_id, payload, caption) sends on a capped worker pool, rate limited
+    across workers. Returns one DeliveryResult per send, in input order; a slow or
+    failing chat does not hold up the others.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    limiter = RateLimiter(rate_per_second)
+
+    def deliver(send):
+        recipient_id, payload, caption = send
+        limiter.wait()
+        start = time.perf_counter()
+        try:
+            success, error = client.send_image_result(recipient_id, payload, caption)
+        except Exception as e:
+            client.log(f"Delivery to {recipient_id} failed: {e}", "ERROR")
+            success, error = False, f"{type(e).__name__}: {e}"
+        return DeliveryResult(recipient_id, success, time.perf_counter() - start, caption, error)
+
+    if not sends:
+        return []
+    workers = max(1, min(max_workers, len(sends)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wpp-send") as pool:
+        return list(pool.map(deliver, sends))
+
+
+def deliver_to_recipients(client, recipients, payload, caption, fields=None, max_workers=4, rate_per_second=2.0):
+    """Sends one already-encoded payload to every recipient concurrently (see send_concurrently)."""
+    sends = [(r['id'], payload, recipient_caption(r, caption, fields)) for r in recipients]
+    return send_concurrently(client, sends, max_workers, rate_per_second)